@@ -9,7 +9,12 @@ Ele é responsável por:
 """
 
 import os
+import time
+import logging
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+
+from utils.versions import SHARED_DIR
 
 # [1] Criação da Instância da Aplicação
 # '__name__' é passado para que o Flask saiba onde procurar recursos
@@ -39,6 +44,46 @@ app.config['UPLOAD_FOLDER_PERFIS'] = UPLOAD_FOLDER_PERFIS
 
 # Garante que a pasta de perfis também exista
 os.makedirs(app.config['UPLOAD_FOLDER_PERFIS'], exist_ok=True)
+# ------------------------------------------------
+# --- Cache de Bytecode dos Templates (Jinja) ---
+# Cada worker compilava os templates na primeira vez que eram usados, o que
+# deixava lentas as primeiras requisições após um deploy. O bytecode
+# compilado fica em disco (JINJA_CACHE_DIR, por padrão no diretório
+# compartilhado): os próximos workers só carregam, sem recompilar. Cada
+# entrada guarda um checksum do código-fonte do template: se o .html mudou,
+# o checksum não bate e o Jinja recompila (e regrava a entrada). Um template
+# já carregado na memória do worker segue a verificação de atualização do
+# loader (`auto_reload`), como antes.
+# Precisa ser configurado ANTES do primeiro uso de `app.jinja_env`.
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR') or os.path.join(SHARED_DIR, 'jinja')
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+# A extensão `{% cache %}` (utils/fragment_cache.py) guarda trechos já
+# renderizados do base.html (ex: o menu lateral por perfil).
+app.jinja_options = {
+    **app.jinja_options,
+    'bytecode_cache': FileSystemBytecodeCache(JINJA_CACHE_DIR),
+    'extensions': [*app.jinja_options.get('extensions', ()), 'utils.fragment_cache.FragmentCacheExtension'],
+}
+
+
+def precompile_templates():
+    """
+    Carrega todos os templates no ambiente Jinja (e no cache de bytecode).
+
+    Com TEMPLATES_PRECOMPILE=1 roda na inicialização: a primeira requisição
+    de cada worker já encontra os templates prontos. Com `gunicorn --preload`,
+    os workers herdam os templates carregados pelo processo mestre.
+
+    :return: Quantidade de templates carregados.
+    """
+    inicio = time.perf_counter()
+    nomes = app.jinja_env.list_templates(extensions=['html'])
+    for nome in nomes:
+        app.jinja_env.get_template(nome)
+    logging.info(f"⚡ {len(nomes)} templates pré-compilados em {time.perf_counter() - inicio:.2f}s.")
+    return len(nomes)
+
+
 # ------------------------------------------------
 # [3] Importação Tardia (Circular Import Handling)
 # O módulo 'routes' é importado no final do arquivo, e não no topo.
@@ -46,4 +91,11 @@ os.makedirs(app.config['UPLOAD_FOLDER_PERFIS'], exist_ok=True)
 # O 'routes.py' precisa importar o objeto 'app' (definido acima) para
 # poder criar os decorators (ex: @app.route('/')), portanto, 'app'
 # deve ser totalmente criado antes que 'routes' seja importado.
-from app import routes
\ No newline at end of file
+from app import routes
+# Comandos de linha de comando (ex: `flask db-budget`), importados pelo mesmo motivo.
+from app import commands
+
+# Pré-compilação opcional dos templates (depois das rotas: filtros e
+# globais registrados por elas precisam existir ao compilar).
+if os.environ.get('TEMPLATES_PRECOMPILE', '0') == '1':
+    precompile_templates()
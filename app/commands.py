@@ -0,0 +1,114 @@
+"""
+Comandos de linha de comando (Flask CLI) da aplicação.
+
+    flask --app run db-budget           # Verifica o orçamento de consultas por rota
+    flask --app run reload-permissions  # Recarrega a matriz de permissões em todos os workers
+    flask --app run prewarm-dashboards  # Pré-calcula os dashboards no cache (para cron)
+
+O `db-budget` roda TOTALMENTE offline: o banco é substituído por um
+`RecordingDatabase` (utils/query_budget.py) e cada rota é chamada pelo
+test client do Flask. Se alguma rota responder com um status diferente do
+esperado ou passar do orçamento, o comando termina com código de saída 1.
+Os mesmos orçamentos rodam no pytest (tests/test_query_budget.py).
+"""
+
+import sys
+
+import click
+
+from app import app
+from app.routes import aquecer_dashboards, dashboard_cache
+from utils.cache import SQLiteCache
+from utils.permissions import permissions
+from utils.query_budget import Budget, run_budgets
+
+# Sessões simuladas para cada perfil.
+SESSAO_ADMIN = {'colaborador_id': 1, 'colaborador_nome': 'Admin', 'colaborador_perfil': 'Administrador',
+                'colaborador_setor_id': 1}
+SESSAO_GESTOR = {'colaborador_id': 2, 'colaborador_nome': 'Gestor', 'colaborador_perfil': 'Gestor',
+                 'colaborador_setor_id': 1}
+SESSAO_COLABORADOR = {'colaborador_id': 3, 'colaborador_nome': 'Colaborador', 'colaborador_perfil': 'Colaborador',
+                      'colaborador_setor_id': 1}
+
+# Orçamento de consultas por rota.
+# Ao otimizar uma rota, REDUZA o número aqui para travar o ganho.
+BUDGETS = [
+    Budget('historico', '/historico', SESSAO_ADMIN, max_queries=5),
+    # Com as listas dos filtros já no cache de dados de referência.
+    Budget('historico (referência em cache)', '/historico', SESSAO_ADMIN, max_queries=2, warmup=True),
+    # O escopo do gestor (setores gerenciados) também vem do cache.
+    Budget('historico gestor (escopo em cache)', '/historico', SESSAO_GESTOR, max_queries=2, warmup=True),
+    Budget('registrar_atividade', '/registrar', SESSAO_COLABORADOR, max_queries=5),
+    Budget('registrar_atividade (referência em cache)', '/registrar', SESSAO_COLABORADOR, max_queries=4,
+           warmup=True),
+    Budget('dashboard admin (cache miss)', '/dashboard?data_inicio=2000-01-01&data_fim=2000-01-02',
+           SESSAO_ADMIN, max_queries=10),
+    # Com cache, só a lista de gestores (fora do cache) vai ao banco.
+    Budget('dashboard admin (cache hit)', '/dashboard', SESSAO_ADMIN, max_queries=1, warmup=True),
+    Budget('dashboard gestor (cache hit)', '/dashboard', SESSAO_GESTOR, max_queries=0, warmup=True),
+    Budget('api_kanban_master', '/api/kanban/master', SESSAO_ADMIN, max_queries=1),
+    # "Não encontrado": redireciona para o histórico sem carregar o formulário.
+    # O `permission_required` lê o perfil do escopo do usuário (2 consultas) e a matriz (1).
+    Budget('editar_atividade (não encontrada)', '/editar_atividade/999', SESSAO_ADMIN, max_queries=4,
+           status=302, responses={
+               'FROM colaboradores AS c': {'id': 1, 'nome_perfil': 'Administrador', 'status': 'Ativo', 'setor_id': 1},
+               'FROM perfil_permissoes': [{'perfil': 'Administrador', 'permissao': 'editar_atividade'}],
+               'FROM atividades WHERE id': None,
+           }),
+    # Rotas `async def` (async_db).
+    Budget('api_notificacoes_contar', '/api/notificacoes/contar', SESSAO_COLABORADOR, max_queries=1),
+    Budget('api_notificacoes_listar', '/api/notificacoes/listar', SESSAO_COLABORADOR, max_queries=1),
+    Budget('api_atividades_hoje_por_setor', '/api/atividades-hoje-por-setor', SESSAO_ADMIN, max_queries=1),
+]
+
+
+@app.cli.command('db-budget')
+@click.option('--verbose', '-v', is_flag=True, help='Lista as consultas de cada rota.')
+def db_budget(verbose):
+    """Verifica (offline) o orçamento de consultas de cada rota."""
+    resultados = run_budgets(app, BUDGETS)
+
+    for r in resultados:
+        marca = '✅' if r.ok else '❌'
+        limite_linhas = f"/{r.budget.max_rows}" if r.budget.max_rows is not None else ''
+        click.echo(f"{marca} {r.budget.name}: {r.queries}/{r.budget.max_queries} consultas, "
+                   f"{r.rows}{limite_linhas} linhas (HTTP {r.status_code})")
+        if verbose or not r.ok:
+            for call in r.calls:
+                click.echo(f"      [{call.kind}] {call.sql[:120]}")
+
+    falhas = [r for r in resultados if not r.ok]
+    if falhas:
+        click.echo(f"\n{len(falhas)} rota(s) fora do orçamento.", err=True)
+        sys.exit(1)
+    click.echo("\nTodas as rotas dentro do orçamento.")
+
+
+@app.cli.command('reload-permissions')
+def reload_permissions():
+    """Invalida a matriz de permissões (após alterar 'perfil_permissoes')."""
+    permissions.invalidate()
+    click.echo("Matriz de permissões invalidada: os workers a recarregam na próxima verificação.")
+
+
+@app.cli.command('prewarm-dashboards')
+@click.option('--data-inicio', help='Início do período (YYYY-MM-DD). Padrão: últimos 7 dias.')
+@click.option('--data-fim', help='Fim do período (YYYY-MM-DD).')
+def prewarm_dashboards(data_inicio, data_fim):
+    """Pré-calcula o dashboard do Administrador e de cada Gestor ativo, com relatório de tempos."""
+    if not isinstance(dashboard_cache, SQLiteCache):
+        click.echo("⚠️ CACHE_BACKEND não é 'sqlite': o cache deste processo some ao terminar o comando "
+                   "(serve apenas para medir os tempos).", err=True)
+
+    relatorio = aquecer_dashboards(data_inicio, data_fim)
+
+    click.echo(f"Período: {relatorio['data_inicio']} a {relatorio['data_fim']}")
+    for item in relatorio['itens']:
+        marca = '✅' if item['ok'] else '❌'
+        click.echo(f"{marca} {item['segundos']:7.2f}s  {item['nome']}  [{item['chave']}]")
+
+    falhas = [i for i in relatorio['itens'] if not i['ok']]
+    click.echo(f"\nTotal: {len(relatorio['itens'])} dashboard(s) em {relatorio['segundos']:.2f}s.")
+    if falhas:
+        click.echo(f"{len(falhas)} dashboard(s) com falha.", err=True)
+        sys.exit(1)
@@ -7,10 +7,66 @@ seguindo o princípio DRY (Don't Repeat Yourself).
 Decorators são usados para "embrulhar" as rotas (endpoints) no 'routes.py'
 e verificar as credenciais do usuário na 'session' antes de executar
 a lógica principal da rota.
+
+Os decorators funcionam tanto em rotas síncronas quanto em rotas
+`async def` (ver `_embrulhar`).
+
+Aqui também fica o `conditional_get`, que responde 304 (Not Modified) às
+APIs de consulta quando os dados não mudaram.
 """
 
+import os
+import time
+import hashlib
+import inspect
 from functools import wraps
-from flask import session, flash, redirect, url_for
+from flask import session, flash, redirect, url_for, request, make_response, g
+
+from utils import versions
+from utils.permissions import permissions
+from utils.user_scope import user_scopes
+
+# Validade máxima de um ETag (segundos): cobre alterações feitas fora da
+# aplicação, que não incrementam os carimbos de versão. Mesmo padrão do
+# REFERENCE_DATA_TTL (utils/reference_data.py).
+ETAG_TTL = float(os.environ.get('ETAG_TTL', 300))
+
+# Cache-Control por classe de endpoint.
+# - Listas de referência (tipos de atendimento/cliente): o navegador reusa
+#   por 1 minuto sem perguntar; depois revalida (304).
+# - Dados que mudam com o dia a dia (colaboradores ativos, contagens):
+#   revalida sempre, o que custa só o 304.
+CACHE_REFERENCIA = 'private, max-age=60'
+CACHE_REVALIDAR = 'private, no-cache'
+
+
+def _embrulhar(f, verificar):
+    """
+    Aplica a verificação `verificar` antes da rota `f`.
+
+    `verificar()` devolve a resposta de negação (ex: um redirect) ou None
+    para liberar o acesso. Se a rota for `async def`, o embrulho também é
+    uma corrotina; caso contrário o Flask receberia uma corrotina de uma
+    função síncrona e não a executaria.
+    """
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_async(*args, **kwargs):
+            negado = verificar()
+            if negado is not None:
+                return negado
+            return await f(*args, **kwargs)
+
+        return decorated_async
+
+    @wraps(f)  # Preserva os metadados da função original (ex: __name__)
+    def decorated_function(*args, **kwargs):
+        negado = verificar()
+        if negado is not None:
+            return negado
+        return f(*args, **kwargs)
+
+    return decorated_function
 
 
 def login_required(f):
@@ -22,8 +78,7 @@ def login_required(f):
     página de login.
     """
 
-    @wraps(f)  # Preserva os metadados da função original (ex: __name__)
-    def decorated_function(*args, **kwargs):
+    def verificar():
         # A presença de 'colaborador_id' na sessão é a
         # principal validação de que o usuário está logado.
         if 'colaborador_id' not in session:
@@ -31,9 +86,9 @@ def login_required(f):
             return redirect(url_for('login'))
 
         # Usuário está logado, permite a execução da rota.
-        return f(*args, **kwargs)
+        return None
 
-    return decorated_function
+    return _embrulhar(f, verificar)
 
 
 def admin_required(f):
@@ -44,8 +99,7 @@ def admin_required(f):
     Redireciona para a 'index' (home) se a permissão for negada.
     """
 
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
+    def verificar():
         # A verificação é estrita: apenas 'Administrador' pode passar.
         if session.get('colaborador_perfil') != 'Administrador':
             flash('Acesso negado. Você não tem permissão para acessar esta página.', 'danger')
@@ -54,9 +108,9 @@ def admin_required(f):
             return redirect(url_for('index'))
 
         # Usuário é Admin, permite a execução.
-        return f(*args, **kwargs)
+        return None
 
-    return decorated_function
+    return _embrulhar(f, verificar)
 
 
 def gestor_required(f):
@@ -68,8 +122,7 @@ def gestor_required(f):
     pode acessar todas as áreas de um Gestor.
     """
 
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
+    def verificar():
         # Lógica de hierarquia: Admins podem fazer tudo que Gestores podem.
         allowed_profiles = ['Gestor', 'Administrador']
 
@@ -78,6 +131,110 @@ def gestor_required(f):
             return redirect(url_for('index'))
 
         # Usuário é Gestor ou Admin, permite a execução.
-        return f(*args, **kwargs)
+        return None
+
+    return _embrulhar(f, verificar)
+
+
+def permission_required(permissao, mensagem='Acesso negado. Você não tem permissão para acessar esta página.',
+                        redirect_to='index'):
+    """
+    Decorator de Autorização Granular (tabela 'perfil_permissoes').
+
+    Verifica se o perfil do usuário logado possui a permissão `permissao`
+    (ex: 'excluir_atividade'). A resposta vem da matriz de permissões em
+    memória (utils/permissions.py), sem consulta ao banco por requisição.
+
+    O perfil NÃO é o da sessão (gravado no login): vem do escopo do usuário
+    (utils/user_scope.py), por 'colaborador_id'. Assim, trocar o perfil de
+    alguém (ou inativá-lo) vale na próxima requisição, sem novo login.
+
+    :param permissao: Nome da permissão (tabela 'permissoes').
+    :param mensagem: Mensagem exibida quando o acesso é negado.
+    :param redirect_to: Endpoint para onde o usuário é redirecionado.
+
+    Uso (depois do @login_required):
+        @permission_required('editar_atividade', 'Você não tem permissão...', redirect_to='historico')
+    """
+
+    def decorator(f):
+        def verificar():
+            escopo = user_scopes.get(session['colaborador_id']) if 'colaborador_id' in session else None
+            # Usuário inativado (ou inexistente) não tem permissão nenhuma.
+            ativo = escopo is not None and escopo.status == 'Ativo'
+            if not ativo or not permissions.can(escopo.perfil, permissao):
+                flash(mensagem, 'danger')
+                return redirect(url_for(redirect_to))
+
+            # O perfil possui a permissão, permite a execução.
+            return None
+
+        return _embrulhar(f, verificar)
+
+    return decorator
+
+
+def _etag(tabelas):
+    """
+    ETag da requisição atual: URL + usuário + carimbos de versão + janela de ETAG_TTL.
+
+    O usuário entra no hash porque a mesma URL pode responder coisas diferentes
+    conforme quem pede (escopo, permissões): um ETag obtido por um usuário
+    nunca valida a resposta de outro no mesmo navegador.
+    """
+    carimbos = [versions.current(t) for t in tabelas]
+    janela = int(time.time() // ETAG_TTL)
+    base = f"{request.full_path}|{session.get('colaborador_id')}|{carimbos}|{janela}"
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()[:20]
+
+
+def uncacheable():
+    """
+    Marca a resposta da requisição atual como não cacheável (ver `conditional_get`).
+
+    Para as APIs que, por contrato com o front-end, respondem `200 []` quando
+    o banco falha: sem a marca, a lista vazia ganharia o ETag da versão atual
+    e o navegador a reusaria (304) até a próxima alteração das tabelas.
+    """
+    g.uncacheable = True
+
+
+def conditional_get(*tabelas, cache_control=CACHE_REVALIDAR):
+    """
+    Decorator de Validação de Resposta (ETag / If-None-Match).
+
+    O ETag vem dos carimbos de versão (utils/versions.py) das `tabelas` das
+    quais a resposta depende, não do conteúdo: se o navegador já tem a
+    versão atual, a rota responde 304 SEM executá-la (nenhuma consulta ao
+    banco). O ETag é por usuário (ver `_etag`). As rotas que alteram essas tabelas já incrementam os carimbos
+    (via `reference_data.invalidate`).
+
+    :param tabelas: Carimbos de versão dos quais a resposta depende.
+    :param cache_control: Cabeçalho Cache-Control (CACHE_REFERENCIA ou CACHE_REVALIDAR).
+
+    Uso (depois do @login_required, para que a autenticação venha antes):
+        @conditional_get('tipos_atendimento', cache_control=CACHE_REFERENCIA)
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = _etag(tabelas)
+
+            if request.if_none_match.contains(etag):
+                resposta = make_response('', 304)
+            else:
+                resposta = make_response(f(*args, **kwargs))
+                # Erros (e falhas marcadas com `uncacheable`) não recebem ETag:
+                # a próxima chamada tenta de novo.
+                if resposta.status_code != 200 or g.pop('uncacheable', False):
+                    resposta.headers['Cache-Control'] = 'no-store'
+                    return resposta
+
+            resposta.set_etag(etag)
+            resposta.headers['Cache-Control'] = cache_control
+            return resposta
+
+        return decorated_function
 
-    return decorated_function
\ No newline at end of file
+    return decorator
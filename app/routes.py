@@ -4,15 +4,27 @@ Descrição: Módulo principal de roteamento e lógica de negócios (views) da a
 """
 import os
 from functools import wraps
-from flask import session, flash, redirect, url_for, render_template, request, jsonify,current_app
+from flask import session, flash, redirect, url_for, render_template, request, jsonify,current_app, make_response
 from app import app
-from utils.db import Database
+from utils.db import Database, slow_query_log, pool_esgotado_na_requisicao
+from utils.db_async import async_db
+from utils.reference_data import reference_data
+from utils.user_scope import user_scopes
+from utils.cache import SingleFlight, create_cache, get_or_build
+from utils.scheduler import PeriodicJob
+from utils.versions import SHARED_DIR
+from utils import fragment_cache
+from utils.pool import PoolExhaustedError
+from utils import query_stats
 import bcrypt
 from datetime import date, datetime, timedelta
 import uuid
 import math
+import time
 import json
-from app.decorators import admin_required, login_required, gestor_required
+from contextlib import closing
+from app.decorators import (admin_required, login_required, gestor_required, permission_required, conditional_get,
+                            uncacheable, CACHE_REFERENCIA)
 from werkzeug.utils import secure_filename
 # --- CONFIGURAÇÕES DE ARQUIVOS (CONSTANTES) ---
 # Define quais arquivos sistema aceita (Segurança)
@@ -169,6 +181,8 @@ def perfil():
                 # Atualiza Banco
                 query_update = "UPDATE colaboradores SET foto_perfil = %s WHERE id = %s"
                 db.execute_query(query_update, (caminho_banco, colaborador_id))
+                user_scopes.invalidate(colaborador_id)  # O cartão do perfil guarda a foto
+                fragment_cache.invalidate_user(colaborador_id)  # Fragmentos do base.html (cabeçalho)
 
                 # Atualiza Sessão (Para a foto aparecer no menu imediatamente)
                 session['colaborador_foto'] = caminho_banco
@@ -184,34 +198,13 @@ def perfil():
             flash('Arquivo inválido. Use apenas PNG, JPG ou JPEG.', 'danger')
 
     # 2. EXIBIÇÃO DA PÁGINA (GET)
-    query = """
-            SELECT 
-                c.id, 
-                c.nome, 
-                c.email, 
-                c.usuario, 
-                c.foto_perfil,
-                p.nome AS nome_perfil,
-                c.status, 
-                s.nome_setor,
-                gestor.nome AS nome_gestor
-            FROM 
-                colaboradores AS c
-            JOIN 
-                setores AS s ON c.setor_id = s.id
-            JOIN 
-                perfis AS p ON c.perfil_id = p.id
-            LEFT JOIN 
-                colaboradores AS gestor ON s.gestor_id = gestor.id
-            WHERE 
-                c.id = %s
-        """
-    colaborador = db.execute_query(query, (colaborador_id,), fetch='one')
+    # O cartão (perfil, setor e gestor do setor) vem do escopo do usuário em cache.
+    escopo = user_scopes.get(colaborador_id)
 
-    if not colaborador:
+    if not escopo:
         return redirect(url_for('logout'))
 
-    return render_template('perfil.html', colaborador=colaborador)
+    return render_template('perfil.html', colaborador=escopo.cartao)
 
 
 @app.route('/alterar-senha', methods=['GET', 'POST'])
@@ -314,25 +307,24 @@ def registrar_atividade():
     # [2] Lógica de Exibição (GET)
     # Busca dados para popular o formulário e os cards de estatísticas
 
-    # Popula o <select> de tipos de atendimento
-    query_tipos = "SELECT id, nome FROM tipos_atendimento ORDER BY nome"
-    tipos_atendimento = db.execute_query(query_tipos, fetch='all') or []
-
     # Busca informações do colaborador logado para exibição
     query_colaborador = "SELECT c.nome, s.nome_setor, p.nome AS perfil FROM colaboradores c JOIN setores s ON c.setor_id = s.id JOIN perfis p ON c.perfil_id = p.id WHERE c.id = %s"
-    colaborador_info = db.execute_query(query_colaborador, (colaborador_id,), fetch='one')
-
-    # Busca estatísticas pessoais para os cards de performance
-    stats_hoje = db.execute_query(
-        "SELECT COUNT(*) AS total FROM atividades WHERE colaborador_id = %s AND DATE(data_atendimento) = CURDATE()",
-        (colaborador_id,), fetch='one')['total']
-    stats_mes = db.execute_query(
-        "SELECT COUNT(*) AS total FROM atividades WHERE colaborador_id = %s AND MONTH(data_atendimento) = MONTH(CURDATE()) AND YEAR(data_atendimento) = YEAR(CURDATE())",
-        (colaborador_id,), fetch='one')['total']
-    stats_semana = db.execute_query(
-        "SELECT COUNT(*) AS total FROM atividades WHERE colaborador_id = %s AND YEARWEEK(data_atendimento, 1) = YEARWEEK(CURDATE(), 1)",
-        (colaborador_id,), fetch='one')['total']
-    stats = {'hoje': stats_hoje, 'semana': stats_semana, 'mes': stats_mes}
+
+    # Popula o <select> de tipos de atendimento (cache de dados de referência)
+    tipos_atendimento = reference_data.get('tipos_atendimento')
+
+    # As consultas são independentes: rodam em paralelo (db.gather).
+    colaborador_info, stats_hoje, stats_mes, stats_semana = db.gather(
+        (query_colaborador, (colaborador_id,), 'one'),
+        # Estatísticas pessoais para os cards de performance
+        ("SELECT COUNT(*) AS total FROM atividades WHERE colaborador_id = %s AND DATE(data_atendimento) = CURDATE()",
+         (colaborador_id,), 'one'),
+        ("SELECT COUNT(*) AS total FROM atividades WHERE colaborador_id = %s AND MONTH(data_atendimento) = MONTH(CURDATE()) AND YEAR(data_atendimento) = YEAR(CURDATE())",
+         (colaborador_id,), 'one'),
+        ("SELECT COUNT(*) AS total FROM atividades WHERE colaborador_id = %s AND YEARWEEK(data_atendimento, 1) = YEARWEEK(CURDATE(), 1)",
+         (colaborador_id,), 'one'),
+    )
+    stats = {'hoje': stats_hoje['total'], 'semana': stats_semana['total'], 'mes': stats_mes['total']}
 
     data_atual = date.today().isoformat()
 
@@ -345,6 +337,9 @@ def registrar_atividade():
 
 @app.route('/editar_atividade/<int:id>', methods=['GET', 'POST'])
 @login_required  # Usuário deve estar logado
+# [1] Verificação de Permissão Granular: o perfil do usuário precisa da
+# permissão 'editar_atividade' (matriz de 'perfil_permissoes' em memória).
+@permission_required('editar_atividade', 'Você não tem permissão para editar atividades.', redirect_to='historico')
 def editar_atividade(id):
     """
     Processa a edição de uma atividade existente.
@@ -353,22 +348,6 @@ def editar_atividade(id):
     GET: Exibe o formulário de edição pré-preenchido.
     POST: Valida e atualiza a atividade no banco.
     """
-    user_id = session['colaborador_id']
-
-    # [1] Verificação de Permissão Granular
-    # Esta é uma verificação de autorização mais complexa que um simples decorator.
-    # Ela consulta se o perfil do usuário tem a permissão específica 'editar_atividade'.
-    query_permissao = """
-        SELECT 1 FROM perfil_permissoes pp
-        JOIN colaboradores c ON c.perfil_id = pp.perfil_id
-        JOIN permissoes p ON p.id = pp.permissao_id
-        WHERE c.id = %s AND p.nome = 'editar_atividade'
-    """
-    permissao = db.execute_query(query_permissao, (user_id,), fetch='one')
-
-    if not permissao:
-        flash('Você não tem permissão para editar atividades.', 'danger')
-        return redirect(url_for('historico'))
 
     # [2] Lógica de Atualização (POST)
     if request.method == 'POST':
@@ -402,33 +381,21 @@ def editar_atividade(id):
         flash('Atividade não encontrada.', 'danger')
         return redirect(url_for('historico'))
 
-    tipos_atendimento = db.execute_query("SELECT id, nome FROM tipos_atendimento ORDER BY nome", fetch='all')
+    tipos_atendimento = reference_data.get('tipos_atendimento')
 
     return render_template('editar_atividade.html', atividade=atividade, tipos_atendimento=tipos_atendimento)
 
 
 @app.route('/excluir/<int:id>', methods=['GET', 'POST'])
 @login_required  # Usuário deve estar logado
+# [1] Verificação de Permissão Granular (similar à edição)
+@permission_required('excluir_atividade', 'Você não tem permissão para excluir atividades.', redirect_to='historico')
 def excluir_atividade(id):
     """
     Processa a exclusão de uma atividade individual.
     GET: Exibe uma página de confirmação (boa prática de UX).
     POST: Executa a exclusão.
     """
-    user_id = session['colaborador_id']
-
-    # [1] Verificação de Permissão Granular (similar à edição)
-    query_permissao = """
-        SELECT 1 FROM perfil_permissoes pp
-        JOIN colaboradores c ON c.perfil_id = pp.perfil_id
-        JOIN permissoes p ON p.id = pp.permissao_id
-        WHERE c.id = %s AND p.nome = 'excluir_atividade'
-    """
-    permissao = db.execute_query(query_permissao, (user_id,), fetch='one')
-
-    if not permissao:
-        flash('Você não tem permissão para excluir atividades.', 'danger')
-        return redirect(url_for('historico'))
 
     # [2] Lógica de Exclusão (POST)
     if request.method == 'POST':
@@ -459,25 +426,13 @@ def excluir_atividade(id):
 
 @app.route('/excluir-massa', methods=['POST'])
 @login_required  # Usuário deve estar logado
+# [1] Verificação de Permissão (reutiliza a mesma permissão de exclusão)
+@permission_required('excluir_atividade', 'Você não tem permissão para excluir atividades.', redirect_to='historico')
 def excluir_massa():
     """
     Processa a exclusão de múltiplas atividades de uma só vez (bulk delete).
     Esta rota só aceita POST por segurança.
     """
-    user_id = session['colaborador_id']
-
-    # [1] Verificação de Permissão (reutiliza a mesma permissão de exclusão)
-    query_permissao = """
-        SELECT 1 FROM perfil_permissoes pp
-        JOIN colaboradores c ON c.perfil_id = pp.perfil_id
-        JOIN permissoes p ON p.id = pp.permissao_id
-        WHERE c.id = %s AND p.nome = 'excluir_atividade'
-    """
-    permissao = db.execute_query(query_permissao, (user_id,), fetch='one')
-
-    if not permissao:
-        flash('Você não tem permissão para excluir atividades.', 'danger')
-        return redirect(url_for('historico'))
 
     # [2] Coleta a lista de IDs do formulário
     # request.form.getlist() é usado para coletar múltiplos valores
@@ -524,10 +479,11 @@ def historico():
     offset = (page - 1) * PER_PAGE
 
     # [2] Busca de Dados para Menus <select>
-    # Carrega os dados que preenchem os formulários de filtro no HTML.
-    tipos_atendimento = db.execute_query("SELECT nome FROM tipos_atendimento ORDER BY nome", fetch='all') or []
-    lista_colaboradores = db.execute_query("SELECT id, nome FROM colaboradores ORDER BY nome", fetch='all') or []
-    lista_setores = db.execute_query("SELECT id, nome_setor FROM setores ORDER BY nome_setor", fetch='all') or []
+    # Carrega os dados que preenchem os formulários de filtro no HTML
+    # (do cache de dados de referência, sem ida ao banco na maioria das vezes).
+    tipos_atendimento = reference_data.get('tipos_atendimento')
+    lista_colaboradores = reference_data.get('colaboradores')
+    lista_setores = reference_data.get('setores')
 
     # [3] Construção de Query Dinâmica e Segura
 
@@ -554,12 +510,12 @@ def historico():
         params.append(user_id)
 
     elif user_profile == 'Gestor':
-        # Gestor só pode ver atividades de colaboradores dos setores que ele gerencia.
-        query_setores_gestor = "SELECT id FROM setores WHERE gestor_id = %s"
-        setores_do_gestor = db.execute_query(query_setores_gestor, (user_id,), fetch='all')
+        # Gestor só pode ver atividades de colaboradores dos setores que ele gerencia
+        # (escopo do usuário em cache, sem consulta por requisição).
+        escopo = user_scopes.get(user_id)
+        ids_setores = escopo.ids_setores_gerenciados if escopo else []
 
-        if setores_do_gestor:
-            ids_setores = [s['id'] for s in setores_do_gestor]
+        if ids_setores:
             # Cria placeholders dinâmicos (%s, %s, ...) para a cláusula IN
             placeholders = ','.join(['%s'] * len(ids_setores))
             where_clauses.append(f"c.setor_id IN ({placeholders})")
@@ -675,18 +631,11 @@ def gestao_usuarios():
     usuarios = db.execute_query(query, tuple(params) if params else None, fetch='all') or []
 
     # [2] Busca de dados para os menus <select> de filtro e formulários
-    perfis = db.execute_query("SELECT id, nome FROM perfis ORDER BY nome", fetch='all') or []
-    setores = db.execute_query("SELECT id, nome_setor FROM setores ORDER BY nome_setor", fetch='all') or []
-
-    # Lógica para buscar as opções do campo ENUM 'cargo' diretamente do BD
-    cargos_query = db.execute_query("SHOW COLUMNS FROM colaboradores LIKE 'cargo'", fetch='one')
-    if cargos_query:
-        import re
-        cargo_type = cargos_query['Type']  # Ex: "enum('Op1','Op2')"
-        cargo_options = re.findall(r"'(.*?)'", cargo_type)
-        cargos = [{'cargo': cargo} for cargo in cargo_options]
-    else:
-        cargos = []
+    perfis = reference_data.get('perfis')
+    setores = reference_data.get('setores')
+
+    # Opções do campo ENUM 'cargo' (SHOW COLUMNS, guardado no cache de referência)
+    cargos = reference_data.get('cargos')
 
     return render_template('gestao_usuarios.html',
                            usuarios=usuarios,
@@ -739,6 +688,8 @@ def editar_usuario(id):
                 params = (nome, usuario, email, setor_id, perfil_id, cargo, status, id)
 
             db.execute_query(query, params)
+            reference_data.invalidate('colaboradores')  # O nome aparece nas listas de colaboradores
+            fragment_cache.invalidate_user(id)  # Fragmentos do base.html guardados para ele
             flash('Usuário atualizado com sucesso!', 'success')
             return redirect(url_for('gestao_usuarios'))
         except Exception as e:
@@ -763,16 +714,9 @@ def editar_usuario(id):
         return redirect(url_for('gestao_usuarios'))
 
     # Busca dados para os menus <select>
-    perfis = db.execute_query("SELECT id, nome FROM perfis ORDER BY nome", fetch='all') or []
-    setores = db.execute_query("SELECT id, nome_setor FROM setores ORDER BY nome_setor", fetch='all') or []
-    cargos_query = db.execute_query("SHOW COLUMNS FROM colaboradores LIKE 'cargo'", fetch='one')
-    if cargos_query:
-        import re
-        cargo_type = cargos_query['Type']
-        cargo_options = re.findall(r"'(.*?)'", cargo_type)
-        cargos = [{'cargo': cargo} for cargo in cargo_options]
-    else:
-        cargos = []
+    perfis = reference_data.get('perfis')
+    setores = reference_data.get('setores')
+    cargos = reference_data.get('cargos')
 
     return render_template('editar_usuario.html',
                            usuario=usuario,
@@ -808,6 +752,7 @@ def novo_usuario():
         """
         params = (nome, usuario, email, setor_id, perfil_id, cargo, status, senha_hash)
         db.execute_query(query, params)
+        reference_data.invalidate('colaboradores')
 
         flash('Usuário criado com sucesso!', 'success')
     except Exception as e:
@@ -833,6 +778,7 @@ def gestao_tipos_atividades():
             try:
                 query = "INSERT INTO tipos_atendimento (nome) VALUES (%s)"
                 db.execute_query(query, (nome_atividade,))
+                reference_data.invalidate('tipos_atendimento')
                 flash('Tipo de atividade criado com sucesso!', 'success')
             except Exception as e:
                 flash(f'Erro ao criar tipo de atividade: {e}', 'danger')
@@ -870,6 +816,7 @@ def editar_tipo_atividade(id):
             try:
                 query = "UPDATE tipos_atendimento SET nome = %s WHERE id = %s"
                 db.execute_query(query, (nome_atividade, id))
+                reference_data.invalidate('tipos_atendimento')
                 flash('Tipo de atividade atualizado com sucesso!', 'success')
                 return redirect(url_for('gestao_tipos_atividades'))
             except Exception as e:
@@ -907,6 +854,7 @@ def gestao_setores():
             try:
                 query = "INSERT INTO setores (nome_setor, gestor_id) VALUES (%s, %s)"
                 db.execute_query(query, (nome_setor, gestor_id))
+                reference_data.invalidate('setores')
                 flash('Setor criado com sucesso!', 'success')
             except Exception as e:
                 flash(f'Erro ao criar setor: {e}', 'danger')
@@ -923,8 +871,7 @@ def gestao_setores():
     setores = db.execute_query(query_setores, fetch='all') or []
 
     # Busca todos os colaboradores para o <select> de 'Gestor'
-    query_colaboradores = "SELECT id, nome FROM colaboradores ORDER BY nome"
-    colaboradores = db.execute_query(query_colaboradores, fetch='all') or []
+    colaboradores = reference_data.get('colaboradores')
 
     return render_template('gestao_setores.html', setores=setores, colaboradores=colaboradores)
 
@@ -948,6 +895,7 @@ def editar_setor(id):
             try:
                 query = "UPDATE setores SET nome_setor = %s, gestor_id = %s WHERE id = %s"
                 db.execute_query(query, (nome_setor, gestor_id, id))
+                reference_data.invalidate('setores')
                 flash('Setor atualizado com sucesso!', 'success')
                 return redirect(url_for('gestao_setores'))
             except Exception as e:
@@ -961,8 +909,7 @@ def editar_setor(id):
         flash('Setor não encontrado.', 'danger')
         return redirect(url_for('gestao_setores'))
 
-    query_colaboradores = "SELECT id, nome FROM colaboradores ORDER BY nome"
-    colaboradores = db.execute_query(query_colaboradores, fetch='all') or []
+    colaboradores = reference_data.get('colaboradores')
 
     return render_template('editar_setor.html', setor=setor, colaboradores=colaboradores)
 
@@ -973,13 +920,70 @@ def editar_setor(id):
 
 # [1] Configuração do Cache do Dashboard
 # -----------------------------------------------------------------------------
-# Define um cache in-memory para o dashboard, reduzindo a carga no banco de dados
-# em requisições repetidas.
-dashboard_cache = {
-    'Administrador': {'data': None, 'last_updated': None},
-    'Gestor': {}  # O cache do Gestor é por ID (ex: 'Gestor': {'12': {...}, '15': {...}})
-}
+# Cache do dashboard (utils/cache.py), reduzindo a carga no banco de dados em
+# requisições repetidas. Limitado em tamanho (LRU) e em tempo (TTL); com
+# CACHE_BACKEND=sqlite é compartilhado entre os workers do Gunicorn.
+# Passado o TTL, a entrada ainda é servida por DASHBOARD_STALE_MINUTES
+# enquanto uma thread a recalcula (0 desliga: a requisição espera o banco).
 CACHE_DURATION_MINUTES = 60  # Define o tempo de vida do cache (em minutos)
+DASHBOARD_STALE_MINUTES = int(os.environ.get('DASHBOARD_STALE_MINUTES', 60))
+DASHBOARD_CACHE_MAX_ENTRIES = int(os.environ.get('DASHBOARD_CACHE_MAX_ENTRIES', 500))
+dashboard_cache = create_cache('dashboard', max_entries=DASHBOARD_CACHE_MAX_ENTRIES,
+                               ttl=CACHE_DURATION_MINUTES * 60, stale_ttl=DASHBOARD_STALE_MINUTES * 60)
+dashboard_flight = SingleFlight('dashboard')
+
+# Pré-aquecimento (ver `aquecer_dashboards`): com DASHBOARD_PREWARM=1, UM
+# worker (o que detém a trava em APP_SHARED_DIR/locks) recalcula os
+# dashboards do período padrão dentro da janela DASHBOARD_PREWARM_START-END
+# (a primeira rodada antes do expediente) e depois a cada
+# CACHE_DURATION_MINUTES. Requer CACHE_BACKEND=sqlite: com o cache em
+# memória, só o worker líder teria os dashboards prontos. Alternativa sem
+# thread no app: `flask --app run prewarm-dashboards` num cron.
+DASHBOARD_PREWARM = os.environ.get('DASHBOARD_PREWARM', '0') == '1'
+DASHBOARD_PREWARM_START = os.environ.get('DASHBOARD_PREWARM_START', '07:00')
+DASHBOARD_PREWARM_END = os.environ.get('DASHBOARD_PREWARM_END', '19:00')
+
+# Gestores ativos: seletor "Ver como" do Administrador e lista do pré-aquecimento.
+QUERY_GESTORES_DISPONIVEIS = """
+    SELECT c.id, c.nome, s.nome_setor as setor
+    FROM colaboradores c
+    JOIN perfis p ON c.perfil_id = p.id
+    LEFT JOIN setores s ON c.setor_id = s.id
+    WHERE p.nome = 'Gestor' AND c.status = 'Ativo'
+    ORDER BY c.nome;
+"""
+
+
+def periodo_dashboard(data_inicio_str, data_fim_str, hoje=None):
+    """
+    Normaliza o período do dashboard para datas 'YYYY-MM-DD' válidas.
+
+    Sem as duas datas (ou com alguma inválida), usa o padrão: últimos 7 dias.
+    Datas invertidas são trocadas. Como a chave do cache usa as datas já
+    normalizadas, o padrão e o mesmo período informado explicitamente
+    compartilham a entrada.
+
+    :return: Tupla (data_inicio, data_fim) em texto.
+    """
+    hoje = hoje or date.today()
+    try:
+        inicio = datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
+        fim = datetime.strptime(data_fim_str, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        inicio, fim = hoje - timedelta(days=7), hoje
+    if inicio > fim:
+        inicio, fim = fim, inicio
+    return inicio.strftime('%Y-%m-%d'), fim.strftime('%Y-%m-%d')
+
+
+def chave_dashboard(perfil, user_id, data_inicio, data_fim):
+    """
+    Chave do dashboard no cache. Inclui as DATAS (já normalizadas), para que
+    um filtro antigo não apareça quando a data muda; o Gestor tem uma
+    entrada por usuário e os demais perfis compartilham a do perfil.
+    """
+    base_key = f"Gestor:{user_id}" if perfil == 'Gestor' else perfil
+    return f"{base_key}_{data_inicio}_{data_fim}"
 
 
 def get_dados_extras_setor(db, setor_id):
@@ -1020,307 +1024,369 @@ def get_dados_extras_setor(db, setor_id):
     return dados
 
 
-# [2] Rota Principal do Dashboard
-# -----------------------------------------------------------------------------
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    """
-    Rota de BI (Business Intelligence) da aplicação.
-    Agora suporta Filtros de Data Dinâmicos.
+def montar_dashboard(perfil, user_id, data_inicio, data_fim):
     """
+    Consulta o banco e monta os dados do dashboard (Etapas 4 e 5).
 
-    # --- [0] Captura e Tratamento de Datas (FILTROS) ---
-    data_inicio_str = request.args.get('data_inicio')
-    data_fim_str = request.args.get('data_fim')
-    hoje = date.today()
-
-    # Se o usuário não escolheu datas, define o padrão (Dia 1 do mês até hoje)
-    if data_inicio_str and data_fim_str:
-        data_inicio = data_inicio_str
-        data_fim = data_fim_str
-    else:
-        data_7_dias_atras = hoje - timedelta(days=7)
-        data_inicio = data_7_dias_atras.strftime('%Y-%m-%d')
-        data_fim = hoje.strftime('%Y-%m-%d')
+    Não usa `request` nem `session`: além da rota, é chamada em segundo plano
+    para recalcular uma entrada vencida do cache (stale-while-revalidate).
 
-    # Objeto para devolver ao HTML (preenche os inputs)
-    filtros = {'data_inicio': data_inicio, 'data_fim': data_fim}
+    :param perfil: 'Administrador' ou 'Gestor' (já resolvido pela personificação).
+    :param user_id: ID do colaborador (usado no perfil Gestor).
+    :param data_inicio: Data inicial 'YYYY-MM-DD' (ver `periodo_dashboard`).
+    :param data_fim: Data final 'YYYY-MM-DD'.
+    :return: Dicionário com kpis, dados_extras, gráfico e filtros.
+    """
+    # --- [Etapa 4: Coleta de Dados (Banco de Dados)] ---
+    app.logger.info(f"Gerando dashboard via BANCO para {perfil}:{user_id} ({data_inicio} a {data_fim}).")
+    kpis = {}
+    dados_extras = {}
+    labels_grafico = []
+    datasets_grafico = []
 
-    # --- [Etapa 1: Lógica de Personificação] ---
-    perfil_original = session.get('colaborador_perfil')
-    user_id_original = session.get('colaborador_id')
-    view_as_user_id = request.args.get('view_as_user_id')
-    is_impersonating = False
+    # Top 5 Colaboradores (Agora obedece o filtro de data).
+    # Montada antes do fork para entrar no gather de cada perfil (Etapa 5 é o fallback).
+    query_base_top_colab = """
+        SELECT c.id, c.nome, COUNT(a.id) AS total_atividades 
+        FROM atividades a 
+        JOIN colaboradores c ON a.colaborador_id = c.id 
+        WHERE DATE(a.data_atendimento) BETWEEN %s AND %s
+    """
+    query_ordem_top_colab = " GROUP BY c.id, c.nome ORDER BY total_atividades DESC LIMIT 5;"
 
-    if perfil_original == 'Administrador' and view_as_user_id:
-        query_gestor_alvo = "SELECT c.id, p.nome as perfil_nome FROM colaboradores c JOIN perfis p ON c.perfil_id = p.id WHERE c.id = %s"
-        gestor_alvo = db.execute_query(query_gestor_alvo, (view_as_user_id,), fetch='one')
-        if gestor_alvo and gestor_alvo['perfil_nome'] == 'Gestor':
-            perfil = 'Gestor'
-            user_id = gestor_alvo['id']
-            is_impersonating = True
-        else:
-            perfil = perfil_original
-            user_id = user_id_original
-    else:
-        perfil = perfil_original
-        user_id = user_id_original
+    # --- LÓGICA FORK: ADMINISTRADOR ---
+    if perfil == 'Administrador':
+        # Ranking Setor (Com Filtro de Data)
+        query_setor_top = """
+            SELECT s.nome_setor, COUNT(a.id) AS total_atividades 
+            FROM atividades a 
+            JOIN colaboradores c ON a.colaborador_id = c.id 
+            JOIN setores s ON c.setor_id = s.id 
+            WHERE DATE(a.data_atendimento) BETWEEN %s AND %s 
+            GROUP BY s.nome_setor 
+            ORDER BY total_atividades DESC LIMIT 1;
+        """
 
-    # --- [Etapa 2: Cláusula de Guarda] ---
-    if perfil_original == 'Colaborador':
-        flash('Você não tem permissão para acessar o dashboard.', 'warning')
-        return redirect(url_for('index'))
+        # Listas Globais
+        query_colab_setor = "SELECT s.id, s.nome_setor, COUNT(c.id) AS total_colaboradores FROM colaboradores c JOIN setores s ON c.setor_id = s.id WHERE c.status = 'Ativo' GROUP BY s.id, s.nome_setor ORDER BY total_colaboradores DESC;"
 
-    # --- [Etapa 3: Verificação de Cache Inteligente] ---
-    now = datetime.now()
+        # Volume por setor, KPI de tempo real)
+        query_top_atividades = """
+            SELECT ta.nome, COUNT(a.id) AS total 
+            FROM atividades a 
+            JOIN tipos_atendimento ta ON a.tipo_atendimento_id = ta.id 
+            WHERE DATE(a.data_atendimento) BETWEEN %s AND %s 
+            GROUP BY ta.id, ta.nome 
+            ORDER BY total DESC LIMIT 5;
+        """
 
-    # ATENÇÃO: A chave do cache agora inclui as DATAS.
-    # Isso impede que um filtro antigo apareça quando você muda a data.
-    base_key = str(user_id) if perfil == 'Gestor' else perfil
-    cache_key = f"{base_key}_{data_inicio}_{data_fim}"
+        # --- CORREÇÃO: Usando a tabela 'atividades' e fazendo o JOIN correto via colaboradores ---
+        query_vol_setor = """
+                        SELECT s.nome_setor, COUNT(a.id) as total
+                        FROM setores s
+                        LEFT JOIN colaboradores c ON s.id = c.setor_id
+                        LEFT JOIN atividades a 
+                            ON c.id = a.colaborador_id 
+                            AND a.data_atendimento >= %s 
+                            AND a.data_atendimento <= %s
+                        GROUP BY s.id, s.nome_setor
+                        ORDER BY total DESC
+                    """
 
-    cache_data_source = dashboard_cache['Gestor'] if perfil == 'Gestor' else dashboard_cache
-    cache_entry = cache_data_source.get(cache_key)
+        fim_ajustado = f"{data_fim} 23:59:59" if len(data_fim) == 10 else data_fim
 
-    if not is_impersonating and cache_entry and cache_entry.get('data') and \
-            (now < cache_entry.get('last_updated') + timedelta(minutes=CACHE_DURATION_MINUTES)):
-        print(f"INFO: Servindo dashboard via CACHE ({cache_key}).")
-        template_data = cache_entry['data']
+        # GRÁFICO ADMIN (Dinâmico)
+        query_grafico = """
+            SELECT DATE(a.data_atendimento) as dia, s.nome_setor, COUNT(a.id) as total 
+            FROM atividades a 
+            JOIN colaboradores c ON a.colaborador_id = c.id 
+            JOIN setores s ON c.setor_id = s.id 
+            WHERE DATE(a.data_atendimento) BETWEEN %s AND %s 
+            GROUP BY dia, s.nome_setor 
+            ORDER BY dia ASC, s.nome_setor ASC;
+        """
 
-    else:
-        # --- [Etapa 4: Coleta de Dados (Banco de Dados)] ---
-        print(f"INFO: Gerando dashboard via BANCO para {cache_key}.")
-        kpis = {}
-        dados_extras = {}
-        labels_grafico = []
-        datasets_grafico = []
-
-        # --- LÓGICA FORK: ADMINISTRADOR ---
-        if perfil == 'Administrador':
+        # As consultas são independentes: rodam em paralelo (db.gather) e o
+        # tempo total passa a ser o da mais lenta, não a soma de todas.
+        # O gráfico usa row_format='tuple': só pivotamos os valores, sem um dict por linha.
+        (total_atividades, atividades_hoje, total_colaboradores,
+         dados_extras['setor_mais_ativo'], dados_extras['colaboradores_por_setor'],
+         dados_extras['top_atividades'], dados_extras['volume_por_setor'],
+         dados_brutos_grafico, dados_extras['top_colaboradores_mes']) = db.gather(
             # KPIs Globais (Respeitando o filtro de data para o Total)
-            kpis['total_atividades'] = db.execute_query(
-                "SELECT COUNT(id) AS total FROM atividades WHERE DATE(data_atendimento) BETWEEN %s AND %s",
-                (data_inicio, data_fim), fetch='one')['total']
-
+            ("SELECT COUNT(id) AS total FROM atividades WHERE DATE(data_atendimento) BETWEEN %s AND %s",
+             (data_inicio, data_fim), 'one'),
             # Atividades "Hoje" continua sendo HOJE (independente do filtro, pois é um KPI de tempo real)
-            kpis['atividades_hoje'] = db.execute_query(
-                "SELECT COUNT(id) AS total FROM atividades WHERE DATE(data_atendimento) = CURDATE()",
-                fetch='one')['total']
-
-            kpis['total_colaboradores'] = db.execute_query(
-                "SELECT COUNT(id) AS total FROM colaboradores WHERE status = 'Ativo'",
-                fetch='one')['total']
-
-            # Ranking Setor (Com Filtro de Data)
-            query_setor_top = """
-                SELECT s.nome_setor, COUNT(a.id) AS total_atividades 
-                FROM atividades a 
-                JOIN colaboradores c ON a.colaborador_id = c.id 
-                JOIN setores s ON c.setor_id = s.id 
-                WHERE DATE(a.data_atendimento) BETWEEN %s AND %s 
-                GROUP BY s.nome_setor 
-                ORDER BY total_atividades DESC LIMIT 1;
-            """
-            dados_extras['setor_mais_ativo'] = db.execute_query(query_setor_top, (data_inicio, data_fim), fetch='one')
-
-            # Listas Globais
-            query_colab_setor = "SELECT s.id, s.nome_setor, COUNT(c.id) AS total_colaboradores FROM colaboradores c JOIN setores s ON c.setor_id = s.id WHERE c.status = 'Ativo' GROUP BY s.id, s.nome_setor ORDER BY total_colaboradores DESC;"
-            dados_extras['colaboradores_por_setor'] = db.execute_query(query_colab_setor, fetch='all')
-
-            # Volume por setor, KPI de tempo real)
-            query_top_atividades = """
-                SELECT ta.nome, COUNT(a.id) AS total 
-                FROM atividades a 
-                JOIN tipos_atendimento ta ON a.tipo_atendimento_id = ta.id 
-                WHERE DATE(a.data_atendimento) BETWEEN %s AND %s 
-                GROUP BY ta.id, ta.nome 
-                ORDER BY total DESC LIMIT 5;
-            """
-            dados_extras['top_atividades'] = db.execute_query(query_top_atividades, (data_inicio, data_fim),
-                                                              fetch='all')
-
-            # --- CORREÇÃO: Usando a tabela 'atividades' e fazendo o JOIN correto via colaboradores ---
-            query_vol_setor = """
-                            SELECT s.nome_setor, COUNT(a.id) as total
-                            FROM setores s
-                            LEFT JOIN colaboradores c ON s.id = c.setor_id
-                            LEFT JOIN atividades a 
-                                ON c.id = a.colaborador_id 
-                                AND a.data_atendimento >= %s 
-                                AND a.data_atendimento <= %s
-                            GROUP BY s.id, s.nome_setor
-                            ORDER BY total DESC
-                        """
-
-            fim_ajustado = f"{data_fim} 23:59:59" if len(data_fim) == 10 else data_fim
+            ("SELECT COUNT(id) AS total FROM atividades WHERE DATE(data_atendimento) = CURDATE()", None, 'one'),
+            ("SELECT COUNT(id) AS total FROM colaboradores WHERE status = 'Ativo'", None, 'one'),
+            (query_setor_top, (data_inicio, data_fim), 'one'),
+            (query_colab_setor, None, 'all'),
+            (query_top_atividades, (data_inicio, data_fim), 'all'),
+            (query_vol_setor, (data_inicio, fim_ajustado), 'all'),
+            (query_grafico, (data_inicio, data_fim), 'all', 'tuple'),
+            (query_base_top_colab + query_ordem_top_colab, (data_inicio, data_fim), 'all'),
+        )
+        kpis['total_atividades'] = total_atividades['total']
+        kpis['atividades_hoje'] = atividades_hoje['total']
+        kpis['total_colaboradores'] = total_colaboradores['total']
+
+        # Processamento do Gráfico Admin
+        if dados_brutos_grafico:
+            # Gera eixo X baseado no intervalo selecionado
+            dt_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
+            dt_fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
+            delta_days = (dt_fim - dt_inicio).days
+
+            # Labels garantem que todos os dias apareçam, mesmo sem dados
+            labels_grafico = [(dt_inicio + timedelta(days=i)).strftime('%d/%m') for i in range(delta_days + 1)]
+
+            setores = sorted({nome_setor for _, nome_setor, _ in dados_brutos_grafico})
+            dados_por_setor = {setor: [0] * len(labels_grafico) for setor in setores}
+            posicao_dia = {label: i for i, label in enumerate(labels_grafico)}
+
+            for dia, nome_setor, total in dados_brutos_grafico:
+                idx = posicao_dia.get(dia.strftime('%d/%m'))
+                if idx is not None:
+                    dados_por_setor[nome_setor][idx] = total
+
+            cores = ['rgba(255, 99, 132, 0.7)', 'rgba(54, 162, 235, 0.7)', 'rgba(255, 206, 86, 0.7)',
+                     'rgba(75, 192, 192, 0.7)', 'rgba(153, 102, 255, 0.7)', 'rgba(255, 159, 64, 0.7)']
+
+            for i, setor in enumerate(setores):
+                datasets_grafico.append({
+                    'label': setor,
+                    'data': dados_por_setor[setor],
+                    'backgroundColor': cores[i % len(cores)]
+                })
 
-            lista_vol_setores = db.execute_query(query_vol_setor, (data_inicio, fim_ajustado), fetch='all')
+    # --- LÓGICA FORK: GESTOR ---
+    elif perfil == 'Gestor':
+        escopo = user_scopes.get(user_id)
+        setor_gestor = escopo.setores_gerenciados[0] if escopo and escopo.setores_gerenciados else None
 
-            dados_extras['volume_por_setor'] = lista_vol_setores
+        if setor_gestor:
+            setor_id = setor_gestor['id']
+            dados_extras['setor_id_gestor'] = setor_id
+            dados_extras['setor_nome_gestor'] = setor_gestor['nome_setor']
 
-            # GRÁFICO ADMIN (Dinâmico)
+            # GRÁFICO GESTOR (Dinâmico)
             query_grafico = """
-                SELECT DATE(a.data_atendimento) as dia, s.nome_setor, COUNT(a.id) as total 
+                SELECT DATE(a.data_atendimento) as dia, c.nome as colaborador, COUNT(a.id) as total 
                 FROM atividades a 
                 JOIN colaboradores c ON a.colaborador_id = c.id 
-                JOIN setores s ON c.setor_id = s.id 
-                WHERE DATE(a.data_atendimento) BETWEEN %s AND %s 
-                GROUP BY dia, s.nome_setor 
-                ORDER BY dia ASC, s.nome_setor ASC;
+                WHERE c.setor_id = %s AND DATE(a.data_atendimento) BETWEEN %s AND %s 
+                GROUP BY dia, colaborador 
+                ORDER BY dia ASC, colaborador ASC;
             """
-            dados_brutos_grafico = db.execute_query(query_grafico, (data_inicio, data_fim), fetch='all')
 
-            # Processamento do Gráfico Admin
+            # KPIs do Setor e gráfico em paralelo (consultas independentes).
+            (total_setor, hoje_setor, colaboradores_setor, dados_brutos_grafico,
+             dados_extras['top_colaboradores_mes']) = db.gather(
+                # KPIs do Setor (Com Filtro de Data)
+                ("""SELECT COUNT(a.id) as total FROM atividades a 
+                   JOIN colaboradores c ON a.colaborador_id = c.id 
+                   WHERE c.setor_id = %s AND DATE(a.data_atendimento) BETWEEN %s AND %s""",
+                 (setor_id, data_inicio, data_fim), 'one'),
+                # Atividades "Hoje" mantém tempo real
+                ("""SELECT COUNT(a.id) as total FROM atividades a 
+                   JOIN colaboradores c ON a.colaborador_id = c.id 
+                   WHERE c.setor_id = %s AND DATE(a.data_atendimento) = CURDATE()""",
+                 (setor_id,), 'one'),
+                ("SELECT COUNT(id) as total FROM colaboradores WHERE setor_id = %s AND status='Ativo'",
+                 (setor_id,), 'one'),
+                (query_grafico, (setor_id, data_inicio, data_fim), 'all', 'tuple'),
+                (query_base_top_colab + " AND c.setor_id = %s" + query_ordem_top_colab,
+                 (data_inicio, data_fim, setor_id), 'all'),
+            )
+            kpis['total_atividades_setor'] = total_setor['total']
+            kpis['atividades_hoje_setor'] = hoje_setor['total']
+            kpis['total_colaboradores_setor'] = colaboradores_setor['total']
+
+            # OBS: A função get_dados_extras_setor() é externa.
+            # Se ela usar queries fixas de mês, ela pode não obedecer o filtro.
+            if 'get_dados_extras_setor' in globals():
+                dados_extras.update(get_dados_extras_setor(db, setor_id))
+
+            # Processamento do Gráfico Gestor
             if dados_brutos_grafico:
-                # Gera eixo X baseado no intervalo selecionado
                 dt_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
                 dt_fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
                 delta_days = (dt_fim - dt_inicio).days
 
-                # Labels garantem que todos os dias apareçam, mesmo sem dados
                 labels_grafico = [(dt_inicio + timedelta(days=i)).strftime('%d/%m') for i in range(delta_days + 1)]
 
-                setores = sorted(list(set([d['nome_setor'] for d in dados_brutos_grafico])))
-                dados_por_setor = {setor: [0] * len(labels_grafico) for setor in setores}
+                colaboradores = sorted({colaborador for _, colaborador, _ in dados_brutos_grafico})
+                dados_por_colab = {colab: [0] * len(labels_grafico) for colab in colaboradores}
+                posicao_dia = {label: i for i, label in enumerate(labels_grafico)}
 
-                for dado in dados_brutos_grafico:
-                    dia_str = dado['dia'].strftime('%d/%m')
-                    if dia_str in labels_grafico:
-                        idx = labels_grafico.index(dia_str)
-                        dados_por_setor[dado['nome_setor']][idx] = dado['total']
+                for dia, colaborador, total in dados_brutos_grafico:
+                    idx = posicao_dia.get(dia.strftime('%d/%m'))
+                    if idx is not None:
+                        dados_por_colab[colaborador][idx] = total
 
                 cores = ['rgba(255, 99, 132, 0.7)', 'rgba(54, 162, 235, 0.7)', 'rgba(255, 206, 86, 0.7)',
                          'rgba(75, 192, 192, 0.7)', 'rgba(153, 102, 255, 0.7)', 'rgba(255, 159, 64, 0.7)']
 
-                for i, setor in enumerate(setores):
+                for i, colaborador in enumerate(colaboradores):
                     datasets_grafico.append({
-                        'label': setor,
-                        'data': dados_por_setor[setor],
+                        'label': colaborador,
+                        'data': dados_por_colab[colaborador],
                         'backgroundColor': cores[i % len(cores)]
                     })
+        else:
+            kpis.update({'total_atividades_setor': 0, 'atividades_hoje_setor': 0, 'total_colaboradores_setor': 0})
+            dados_extras['setor_nome_gestor'] = "Nenhum Setor"
 
-        # --- LÓGICA FORK: GESTOR ---
-        elif perfil == 'Gestor':
-            query_setor = "SELECT id, nome_setor FROM setores WHERE gestor_id = %s"
-            setor_gestor = db.execute_query(query_setor, (user_id,), fetch='one')
+    # --- [Etapa 5: Consultas de Refinamento (Comum)] ---
 
-            if setor_gestor:
-                setor_id = setor_gestor['id']
-                dados_extras['setor_id_gestor'] = setor_id
-                dados_extras['setor_nome_gestor'] = setor_gestor['nome_setor']
+    # Top 5 Colaboradores: normalmente já veio no gather do perfil; aqui só
+    # sobra o caso do gestor sem setor (ranking geral, como antes).
+    if 'top_colaboradores_mes' not in dados_extras:
+        dados_extras['top_colaboradores_mes'] = db.execute_query(query_base_top_colab + query_ordem_top_colab,
+                                                                 (data_inicio, data_fim), fetch='all')
 
-                # KPIs do Setor (Com Filtro de Data)
-                kpis['total_atividades_setor'] = db.execute_query(
-                    """SELECT COUNT(a.id) as total FROM atividades a 
-                       JOIN colaboradores c ON a.colaborador_id = c.id 
-                       WHERE c.setor_id = %s AND DATE(a.data_atendimento) BETWEEN %s AND %s""",
-                    (setor_id, data_inicio, data_fim), fetch='one')['total']
+    # Texto do período para exibição
+    try:
+        dt_inicio_fmt = datetime.strptime(data_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')
+        dt_fim_fmt = datetime.strptime(data_fim, '%Y-%m-%d').strftime('%d/%m/%Y')
+        dados_extras['mes_referencia'] = f"De {dt_inicio_fmt} até {dt_fim_fmt}"
+    except:
+        dados_extras['mes_referencia'] = "Período Selecionado"
 
-                # Atividades "Hoje" mantém tempo real
-                kpis['atividades_hoje_setor'] = db.execute_query(
-                    """SELECT COUNT(a.id) as total FROM atividades a 
-                       JOIN colaboradores c ON a.colaborador_id = c.id 
-                       WHERE c.setor_id = %s AND DATE(a.data_atendimento) = CURDATE()""",
-                    (setor_id,), fetch='one')['total']
-
-                kpis['total_colaboradores_setor'] = db.execute_query(
-                    "SELECT COUNT(id) as total FROM colaboradores WHERE setor_id = %s AND status='Ativo'",
-                    (setor_id,), fetch='one')['total']
-
-                # OBS: A função get_dados_extras_setor() é externa.
-                # Se ela usar queries fixas de mês, ela pode não obedecer o filtro.
-                if 'get_dados_extras_setor' in globals():
-                    dados_extras.update(get_dados_extras_setor(db, setor_id))
-
-                # GRÁFICO GESTOR (Dinâmico)
-                query_grafico = """
-                    SELECT DATE(a.data_atendimento) as dia, c.nome as colaborador, COUNT(a.id) as total 
-                    FROM atividades a 
-                    JOIN colaboradores c ON a.colaborador_id = c.id 
-                    WHERE c.setor_id = %s AND DATE(a.data_atendimento) BETWEEN %s AND %s 
-                    GROUP BY dia, colaborador 
-                    ORDER BY dia ASC, colaborador ASC;
-                """
-                dados_brutos_grafico = db.execute_query(query_grafico, (setor_id, data_inicio, data_fim), fetch='all')
-
-                # Processamento do Gráfico Gestor
-                if dados_brutos_grafico:
-                    dt_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-                    dt_fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
-                    delta_days = (dt_fim - dt_inicio).days
-
-                    labels_grafico = [(dt_inicio + timedelta(days=i)).strftime('%d/%m') for i in range(delta_days + 1)]
-
-                    colaboradores = sorted(list(set([d['colaborador'] for d in dados_brutos_grafico])))
-                    dados_por_colab = {colab: [0] * len(labels_grafico) for colab in colaboradores}
-
-                    for dado in dados_brutos_grafico:
-                        dia_str = dado['dia'].strftime('%d/%m')
-                        if dia_str in labels_grafico:
-                            idx = labels_grafico.index(dia_str)
-                            dados_por_colab[dado['colaborador']][idx] = dado['total']
-
-                    cores = ['rgba(255, 99, 132, 0.7)', 'rgba(54, 162, 235, 0.7)', 'rgba(255, 206, 86, 0.7)',
-                             'rgba(75, 192, 192, 0.7)', 'rgba(153, 102, 255, 0.7)', 'rgba(255, 159, 64, 0.7)']
-
-                    for i, colaborador in enumerate(colaboradores):
-                        datasets_grafico.append({
-                            'label': colaborador,
-                            'data': dados_por_colab[colaborador],
-                            'backgroundColor': cores[i % len(cores)]
-                        })
-            else:
-                kpis.update({'total_atividades_setor': 0, 'atividades_hoje_setor': 0, 'total_colaboradores_setor': 0})
-                dados_extras['setor_nome_gestor'] = "Nenhum Setor"
+    filtros = {'data_inicio': data_inicio, 'data_fim': data_fim}
+    return {
+        'kpis': kpis,
+        'dados_extras': dados_extras,
+        'labels_grafico': labels_grafico,
+        'datasets_grafico': datasets_grafico,
+        'filtros': filtros  # Importante para o HTML não esquecer a data
+    }
 
-        # --- [Etapa 5: Consultas de Refinamento (Comum)] ---
 
-        # Top 5 Colaboradores (Agora obedece o filtro de data)
-        query_base_top_colab = """
-            SELECT c.id, c.nome, COUNT(a.id) AS total_atividades 
-            FROM atividades a 
-            JOIN colaboradores c ON a.colaborador_id = c.id 
-            WHERE DATE(a.data_atendimento) BETWEEN %s AND %s
-        """
-        params_top_colab = [data_inicio, data_fim]
+def aquecer_dashboards(data_inicio=None, data_fim=None):
+    """
+    Pré-calcula e grava no cache o dashboard do Administrador e de cada
+    Gestor ativo, para que ninguém espere uma geração "a frio".
+
+    Cada entrada é recalculada mesmo que ainda esteja fresca (a rodada
+    renova o TTL). Uma requisição do mesmo usuário durante a rodada espera
+    o cálculo em andamento, em vez de repeti-lo (`dashboard_flight`).
+
+    :param data_inicio: Período a aquecer (padrão: o do dashboard, últimos 7 dias).
+    :param data_fim: Ver `data_inicio`.
+    :return: Relatório {'data_inicio', 'data_fim', 'segundos', 'itens'}; cada
+             item é {'chave', 'nome', 'segundos', 'ok'}.
+    """
+    data_inicio, data_fim = periodo_dashboard(data_inicio, data_fim)
+    inicio_rodada = time.perf_counter()
+
+    gestores = db.execute_query(QUERY_GESTORES_DISPONIVEIS, fetch='all')
+    if gestores is None:
+        app.logger.error("❌ Não foi possível listar os gestores; aquecendo só a visão do Administrador.")
+        gestores = []
 
-        if perfil == 'Gestor' and 'setor_id' in locals() and setor_id:
-            query_base_top_colab += " AND c.setor_id = %s"
-            params_top_colab.append(setor_id)
+    alvos = [('Administrador', None, 'Administrador')]
+    alvos += [('Gestor', g['id'], f"{g['nome']} ({g['setor'] or 'sem setor'})") for g in gestores]
 
-        query_base_top_colab += " GROUP BY c.id, c.nome ORDER BY total_atividades DESC LIMIT 5;"
-        dados_extras['top_colaboradores_mes'] = db.execute_query(query_base_top_colab, tuple(params_top_colab),
-                                                                 fetch='all')
+    itens = []
+    for perfil, user_id, nome in alvos:
+        chave = chave_dashboard(perfil, user_id, data_inicio, data_fim)
 
-        # Texto do período para exibição
+        def construir():
+            template_data = montar_dashboard(perfil, user_id, data_inicio, data_fim)
+            dashboard_cache.set(chave, template_data)
+            return template_data
+
+        inicio = time.perf_counter()
         try:
-            dt_inicio_fmt = datetime.strptime(data_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')
-            dt_fim_fmt = datetime.strptime(data_fim, '%Y-%m-%d').strftime('%d/%m/%Y')
-            dados_extras['mes_referencia'] = f"De {dt_inicio_fmt} até {dt_fim_fmt}"
-        except:
-            dados_extras['mes_referencia'] = "Período Selecionado"
-
-        # --- [Etapa 6: Salvar no Cache] ---
-        template_data = {
-            'kpis': kpis,
-            'dados_extras': dados_extras,
-            'labels_grafico': labels_grafico,
-            'datasets_grafico': datasets_grafico,
-            'filtros': filtros  # Importante para o HTML não esquecer a data
-        }
-
-        if not is_impersonating:
-            if perfil == 'Gestor':
-                dashboard_cache['Gestor'][cache_key] = {'data': template_data, 'last_updated': now}
-            else:
-                dashboard_cache[perfil] = {'data': template_data, 'last_updated': now}
+            dashboard_flight.do(chave, construir)
+            ok = True
+        except Exception as e:
+            app.logger.error(f"❌ Falha ao aquecer o dashboard {chave}: {e}")
+            ok = False
+        itens.append({'chave': chave, 'nome': nome, 'segundos': time.perf_counter() - inicio, 'ok': ok})
+
+    segundos = time.perf_counter() - inicio_rodada
+    app.logger.info(f"🔥 {sum(i['ok'] for i in itens)}/{len(itens)} dashboards aquecidos em {segundos:.2f}s "
+                    f"({data_inicio} a {data_fim}).")
+    return {'data_inicio': data_inicio, 'data_fim': data_fim, 'segundos': segundos, 'itens': itens}
+
+
+dashboard_prewarm = PeriodicJob('dashboard-prewarm', aquecer_dashboards, interval=CACHE_DURATION_MINUTES * 60,
+                                start=DASHBOARD_PREWARM_START, end=DASHBOARD_PREWARM_END,
+                                lock_path=os.path.join(SHARED_DIR, 'locks', 'dashboard-prewarm.lock'))
+
+
+@app.before_request
+def iniciar_aquecimento_dashboard():
+    """Inicia o agendador de pré-aquecimento na primeira requisição de cada worker."""
+    if DASHBOARD_PREWARM:
+        dashboard_prewarm.ensure_started()
+
+
+# [2] Rota Principal do Dashboard
+# -----------------------------------------------------------------------------
+@app.route('/dashboard')
+@login_required
+def dashboard():
+    """
+    Rota de BI (Business Intelligence) da aplicação.
+    Agora suporta Filtros de Data Dinâmicos.
+    """
+
+    # --- [0] Captura e Tratamento de Datas (FILTROS) ---
+    # Se o usuário não escolheu datas (ou são inválidas), usa os últimos 7 dias.
+    data_inicio, data_fim = periodo_dashboard(request.args.get('data_inicio'), request.args.get('data_fim'))
+
+    # Objeto para devolver ao HTML (preenche os inputs)
+    filtros = {'data_inicio': data_inicio, 'data_fim': data_fim}
+
+    # --- [Etapa 1: Lógica de Personificação] ---
+    perfil_original = session.get('colaborador_perfil')
+    user_id_original = session.get('colaborador_id')
+    view_as_user_id = request.args.get('view_as_user_id')
+    is_impersonating = False
+
+    if perfil_original == 'Administrador' and view_as_user_id:
+        query_gestor_alvo = "SELECT c.id, p.nome as perfil_nome FROM colaboradores c JOIN perfis p ON c.perfil_id = p.id WHERE c.id = %s"
+        gestor_alvo = db.execute_query(query_gestor_alvo, (view_as_user_id,), fetch='one')
+        if gestor_alvo and gestor_alvo['perfil_nome'] == 'Gestor':
+            perfil = 'Gestor'
+            user_id = gestor_alvo['id']
+            is_impersonating = True
+        else:
+            perfil = perfil_original
+            user_id = user_id_original
+    else:
+        perfil = perfil_original
+        user_id = user_id_original
+
+    # --- [Etapa 2: Cláusula de Guarda] ---
+    if perfil_original == 'Colaborador':
+        flash('Você não tem permissão para acessar o dashboard.', 'warning')
+        return redirect(url_for('index'))
+
+    # --- [Etapa 3: Verificação de Cache Inteligente] ---
+    # A MESMA chave é usada na leitura, na gravação e no pré-aquecimento.
+    cache_key = chave_dashboard(perfil, user_id, data_inicio, data_fim)
+
+    # --- [Etapas 4 a 6: Geração (montar_dashboard) e Gravação no Cache] ---
+    # Só uma requisição por chave regenera o dashboard; as concorrentes esperam
+    # o resultado dela. Entrada vencida é servida na hora e recalculada em
+    # segundo plano (ver `get_or_build` em utils/cache.py).
+    if is_impersonating:
+        template_data = montar_dashboard(perfil, user_id, data_inicio, data_fim)
+    else:
+        template_data = get_or_build(dashboard_cache, cache_key,
+                                     lambda: montar_dashboard(perfil, user_id, data_inicio, data_fim),
+                                     dashboard_flight)
+        # Cópia rasa: a Etapa 7 acrescenta campos que não pertencem ao cache.
+        template_data = dict(template_data)
 
     # --- [Etapa 7: Preparação Final e Saída] ---
     gestores_disponiveis = []
     if perfil_original == 'Administrador':
-        query_gestores = "SELECT c.id, c.nome, s.nome_setor as setor FROM colaboradores c JOIN perfis p ON c.perfil_id = p.id LEFT JOIN setores s ON c.setor_id = s.id WHERE p.nome = 'Gestor' AND c.status = 'Ativo' ORDER BY c.nome;"
-        gestores_disponiveis = db.execute_query(query_gestores, fetch='all')
+        gestores_disponiveis = db.execute_query(QUERY_GESTORES_DISPONIVEIS, fetch='all')
 
     template_data['gestores_disponiveis'] = gestores_disponiveis
     template_data['is_impersonating'] = is_impersonating
@@ -1336,7 +1402,7 @@ def dashboard():
 # -----------------------------------------------------------------------------
 @app.route('/api/atividades-hoje-por-setor')
 @admin_required  # Apenas Admins podem ver dados de TODOS os setores
-def api_atividades_hoje_por_setor():
+async def api_atividades_hoje_por_setor():
     """
     Endpoint de API (JSON) que retorna a contagem de atividades de hoje,
     agrupada por setor. Usado pelo modal do dashboard do Admin (Estágio 1).
@@ -1350,13 +1416,13 @@ def api_atividades_hoje_por_setor():
         GROUP BY s.id, s.nome_setor
         ORDER BY total DESC;
     """
-    dados = db.execute_query(query, fetch='all') or []
+    dados = await async_db.execute_query(query, fetch='all') or []
     return jsonify(dados)
 
 
 @app.route('/api/atividades-hoje-por-colaborador/<int:setor_id>')
 @gestor_required  # Gestores (ou Admins) podem ver dados de colaboradores
-def api_atividades_hoje_por_colaborador(setor_id):
+async def api_atividades_hoje_por_colaborador(setor_id):
     """
     Endpoint de API (JSON) que retorna a contagem de atividades de hoje
     para CADA colaborador de um setor específico.
@@ -1374,74 +1440,10 @@ def api_atividades_hoje_por_colaborador(setor_id):
         GROUP BY c.id, c.nome
         ORDER BY total DESC, c.nome ASC;
     """
-    dados = db.execute_query(query, (setor_id,), fetch='all') or []
+    dados = await async_db.execute_query(query, (setor_id,), fetch='all') or []
     return jsonify(dados)
 
 
-# [4] Processador de Contexto Global (para Gamificação/Medalhas)
-# -----------------------------------------------------------------------------
-@app.context_processor
-def inject_user_medals():
-    """
-    Processador de Contexto do Flask.
-
-    Esta função é executada AUTOMATICAMENTE antes de renderizar QUALQUER template.
-    Seu objetivo é injetar dados globais (as medalhas) que o 'base.html'
-    (e, portanto, todas as páginas) precisa para exibir o ranking do colaborador.
-    """
-    medals_data = {'medalha_setor': None, 'medalha_geral': None}
-
-    # A lógica só é executada se o usuário logado for um 'Colaborador'
-    if 'colaborador_id' in session and session['colaborador_perfil'] == 'Colaborador':
-        user_id = session.get('colaborador_id')
-        user_setor_id = session.get('colaborador_setor_id')
-
-        if not user_setor_id:
-            return medals_data  # Retorna vazio se o colab não tiver setor
-
-        try:
-            # Query 1: Ranking do Colaborador DENTRO DO SEU SETOR (Mês Atual)
-            # RANK() é uma window function do SQL, eficiente para rankings.
-            query_rank_setor = """
-                SELECT user_rank FROM (
-                    SELECT c.id, RANK() OVER (ORDER BY COUNT(a.id) DESC) as user_rank
-                    FROM colaboradores c
-                    LEFT JOIN atividades a ON c.id = a.colaborador_id 
-                                           AND MONTH(a.data_atendimento) = MONTH(CURDATE()) 
-                                           AND YEAR(a.data_atendimento) = YEAR(CURDATE())
-                    WHERE c.setor_id = %s AND c.status = 'Ativo'
-                    GROUP BY c.id
-                ) as ranked_users
-                WHERE id = %s;
-            """
-            rank_setor_result = db.execute_query(query_rank_setor, (user_setor_id, user_id), fetch='one')
-            if rank_setor_result:
-                medals_data['medalha_setor'] = rank_setor_result['user_rank']
-
-            # Query 2: Ranking GERAL do Colaborador (Mês Atual)
-            query_rank_geral = """
-                SELECT user_rank FROM (
-                    SELECT c.id, RANK() OVER (ORDER BY COUNT(a.id) DESC) as user_rank
-                    FROM colaboradores c
-                    LEFT JOIN atividades a ON c.id = a.colaborador_id 
-                                           AND MONTH(a.data_atendimento) = MONTH(CURDATE()) 
-                                           AND YEAR(a.data_atendimento) = YEAR(CURDATE())
-                    WHERE c.status = 'Ativo'
-                    GROUP BY c.id
-                ) as ranked_users
-                WHERE id = %s;
-            """
-            rank_geral_result = db.execute_query(query_rank_geral, (user_id,), fetch='one')
-            if rank_geral_result:
-                medals_data['medalha_geral'] = rank_geral_result['user_rank']
-
-        except Exception as e:
-            print(f"ERRO AO CALCULAR MEDALHAS: {e}")
-
-    # O dicionário retornado é mesclado ao contexto do template globalmente.
-    return medals_data
-
-
 @app.route('/api/atividades-hoje-setor')
 @login_required
 def api_atividades_hoje_setor():
@@ -1508,12 +1510,30 @@ def api_atividades_hoje_setor():
 # Bloco 7: O NOVO SISTEMA DE CRM (Atendimentos)
 # (Este bloco é ADICIONADO ao sistema, não substitui nada por enquanto)
 # =============================================================================
+
+def registrar_historico(tx, atendimento_id, colaborador_id, descricoes, tipo_acao='Comentario'):
+    """
+    Grava uma ou mais linhas na linha do tempo do atendimento.
+
+    Todas as descrições vão em UM único INSERT multi-linha (`execute_many`),
+    dentro da transação recebida (`tx`), evitando uma ida ao banco por registro.
+
+    :param tx: A transação aberta com `db.transaction()`.
+    :param descricoes: Lista de textos a registrar (vazios são ignorados).
+    """
+    descricoes = [d for d in descricoes if d]
+    if not descricoes:
+        return 0
+
+    query = "INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao) VALUES (%s, %s, %s, %s)"
+    return tx.execute_many(query, [(atendimento_id, colaborador_id, tipo_acao, d) for d in descricoes]).rowcount
+
 @app.route('/crm/iniciar', methods=['GET', 'POST'])
 @login_required
 def crm_iniciar_atendimento():
     """
     Rota principal para "Iniciar Triagem" (O novo "Registrar Atividade").
-    [CORREÇÃO v5] - Corrige o bug de precisão de microsse segundos.
+    Os IDs do cliente e do atendimento vêm direto do INSERT (lastrowid).
     """
     colaborador_id = session['colaborador_id']
     colaborador_setor_id = session['colaborador_setor_id']
@@ -1546,90 +1566,57 @@ def crm_iniciar_atendimento():
                 return redirect(url_for('crm_iniciar_atendimento'))
 
             # --- Início da Transação ---
+            # Cliente + Atendimento + Histórico são gravados juntos:
+            # ou tudo entra no banco, ou nada entra (rollback automático).
+            with db.transaction() as tx:
+
+                # Passo 1: Encontrar ou Criar o Cliente
+                cliente_id = None
+                if identificador:
+                    query_cliente = "SELECT id FROM clientes WHERE identificador_principal = %s"
+                    cliente_existente = tx.execute(query_cliente, (identificador,), fetch='one')
+                    if cliente_existente:
+                        cliente_id = cliente_existente['id']
+
+                if not cliente_id:
+                    identificador_final = identificador
+                    if not identificador:
+                        query_last_id = "SELECT MAX(id) AS max_id FROM clientes"
+                        last_id = tx.execute(query_last_id, fetch='one')['max_id'] or 0
+                        identificador_final = f"INT-{last_id + 1:04d}"
+
+                    query_novo_cliente = """
+                        INSERT INTO clientes (tipo_id, nome, email, telefone, identificador_principal)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """
+                    params_cliente = (cliente_tipo_id, cliente_nome, cliente_email, cliente_telefone, identificador_final)
 
-            # Passo 1: Encontrar ou Criar o Cliente
-            cliente_id = None
-            if identificador:
-                query_cliente = "SELECT id FROM clientes WHERE identificador_principal = %s"
-                cliente_existente = db.execute_query(query_cliente, (identificador,), fetch='one')
-                if cliente_existente:
-                    cliente_id = cliente_existente['id']
-
-            if not cliente_id:
-                identificador_final = identificador
-                if not identificador:
-                    query_last_id = "SELECT MAX(id) AS max_id FROM clientes"
-                    last_id = db.execute_query(query_last_id, fetch='one')['max_id'] or 0
-                    identificador_final = f"INT-{last_id + 1:04d}"
-
-                query_novo_cliente = """
-                    INSERT INTO clientes (tipo_id, nome, email, telefone, identificador_principal)
-                    VALUES (%s, %s, %s, %s, %s)
-                """
-                params_cliente = (cliente_tipo_id, cliente_nome, cliente_email, cliente_telefone, identificador_final)
-
-                db.execute_query(query_novo_cliente, params_cliente, fetch=None)
-
-                # Busca o ID que acabamos de criar
-                cliente_id = db.execute_query(
-                    "SELECT id FROM clientes WHERE identificador_principal = %s",
-                    (identificador_final,),
-                    fetch='one'
-                )['id']
-
-            # Passo 2: Criar o Atendimento (A "Capa")
-            query_atendimento = """
-                INSERT INTO atendimentos
-                (titulo, status_fila, criador_id, responsavel_id, setor_responsavel_id, 
-                 cliente_id, origem_id, tipo_atendimento_id, 
-                 numero_atendimento_externo, observacao, nivel_complexidade, criado_em)
-                VALUES (%s, 'Triagem', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-
-            # [A CORREÇÃO (v5) ESTÁ AQUI]
-            # Remove os microsse segundos para garantir que o MySQL e o Python
-            # vejam o mesmo carimbo de data/hora.
-            timestamp_criacao = datetime.now().replace(microsecond=0)
+                    cliente_id = tx.insert(query_novo_cliente, params_cliente).lastrowid
 
-            params_atendimento = (
-                titulo, colaborador_id, colaborador_id, colaborador_setor_id,
-                cliente_id, origem_id, tipo_atendimento_id,
-                num_externo, observacao, nivel, timestamp_criacao
-            )
+                # Passo 2: Criar o Atendimento (A "Capa")
+                query_atendimento = """
+                    INSERT INTO atendimentos
+                    (titulo, status_fila, criador_id, responsavel_id, setor_responsavel_id, 
+                     cliente_id, origem_id, tipo_atendimento_id, 
+                     numero_atendimento_externo, observacao, nivel_complexidade, criado_em)
+                    VALUES (%s, 'Triagem', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """
 
-            db.execute_query(query_atendimento, params_atendimento, fetch=None)
+                timestamp_criacao = datetime.now().replace(microsecond=0)
 
-            # Busca o ID do atendimento que acabamos de criar,
-            # usando a chave única (criador + timestamp)
-            query_find_atendimento = """
-                SELECT id FROM atendimentos 
-                WHERE criador_id = %s AND criado_em = %s AND titulo = %s
-                ORDER BY id DESC LIMIT 1
-            """
-            atendimento_criado = db.execute_query(
-                query_find_atendimento,
-                (colaborador_id, timestamp_criacao, titulo),
-                fetch='one'
-            )
+                params_atendimento = (
+                    titulo, colaborador_id, colaborador_id, colaborador_setor_id,
+                    cliente_id, origem_id, tipo_atendimento_id,
+                    num_externo, observacao, nivel, timestamp_criacao
+                )
 
-            if not atendimento_criado:
-                # Se ainda falhar, tentamos o LAST_INSERT_ID() como fallback
-                # (embora seja propenso a falhas de pool)
-                atendimento_id_fallback = db.execute_query("SELECT LAST_INSERT_ID() AS id", fetch='one')['id']
-                if not (isinstance(atendimento_id_fallback, int) and atendimento_id_fallback > 0):
-                    raise Exception("Falha ao criar o atendimento (ID não encontrado após o INSERT).")
-                atendimento_id = atendimento_id_fallback
-            else:
-                atendimento_id = atendimento_criado['id']
+                # O ID vem direto do cursor do INSERT (sem buscar o registro de novo).
+                atendimento_id = tx.insert(query_atendimento, params_atendimento).lastrowid
+                if not atendimento_id:
+                    raise Exception("Falha ao criar o atendimento (ID não retornado pelo INSERT).")
 
-            # Passo 3: Criar o Primeiro Histórico (A "Descrição")
-            query_historico = """
-                INSERT INTO atendimento_historico
-                (atendimento_id, colaborador_id, tipo_acao, descricao)
-                VALUES (%s, %s, 'Criacao', %s)
-            """
-            params_historico = (atendimento_id, colaborador_id, descricao)
-            db.execute_query(query_historico, params_historico, fetch=None)
+                # Passo 3: Criar o Primeiro Histórico (A "Descrição")
+                registrar_historico(tx, atendimento_id, colaborador_id, [descricao], tipo_acao='Criacao')
 
             # --- Fim da Transação ---
 
@@ -1637,17 +1624,14 @@ def crm_iniciar_atendimento():
             return redirect(url_for('crm_fila_atendimento'))
 
         except Exception as e:
-            # (Seu db.py precisa de um db.rollback() aqui em caso de erro)
+            # O rollback já foi feito pelo db.transaction().
             flash(f'Erro ao iniciar atendimento: {e}', 'danger')
             return redirect(url_for('crm_iniciar_atendimento'))
 
     # [2] Lógica de Exibição (GET)
-    query_grupos = "SELECT id, nome FROM cliente_grupos ORDER BY nome"
-    cliente_grupos = db.execute_query(query_grupos, fetch='all') or []
-    query_origens = "SELECT id, nome FROM origens ORDER BY nome"
-    origens = db.execute_query(query_origens, fetch='all') or []
-    query_tipos = "SELECT id, nome FROM tipos_atendimento ORDER BY nome"
-    tipos_atendimento = db.execute_query(query_tipos, fetch='all') or []
+    cliente_grupos = reference_data.get('cliente_grupos')
+    origens = reference_data.get('origens')
+    tipos_atendimento = reference_data.get('tipos_atendimento')
 
     return render_template('crm_iniciar_atendimento.html',
                            cliente_grupos=cliente_grupos,
@@ -1659,14 +1643,16 @@ def crm_iniciar_atendimento():
 
 @app.route('/api/cliente-tipos/<int:grupo_id>')
 @login_required
+@conditional_get('cliente_tipos', 'cliente_grupos', cache_control=CACHE_REFERENCIA)
 def crm_get_cliente_tipos_por_grupo(grupo_id):
     """
     Rota de API (AJAX) que o formulário de triagem usará.
     Quando o usuário selecionar "Cliente Externo", esta rota é chamada
     para popular o segundo dropdown com "Estudante" e "Polo".
     """
-    query = "SELECT id, nome FROM cliente_tipos WHERE grupo_id = %s ORDER BY nome"
-    tipos = db.execute_query(query, (grupo_id,), fetch='all') or []
+    tipos = reference_data.cliente_tipos(grupo_id)
+    if not tipos:
+        uncacheable()  # Grupo sem tipos ou falha no banco: não vale um ETag
     return jsonify(tipos)
 
 
@@ -1704,10 +1690,10 @@ def crm_fila_atendimento():
     PER_PAGE = 25
     offset = (page - 1) * PER_PAGE
 
-    # [2] Busca de Dados para Menus <select> de FILTRO
-    tipos_atendimento = db.execute_query("SELECT id, nome FROM tipos_atendimento ORDER BY nome", fetch='all') or []
-    lista_colaboradores = db.execute_query("SELECT id, nome FROM colaboradores ORDER BY nome", fetch='all') or []
-    lista_setores = db.execute_query("SELECT id, nome_setor FROM setores ORDER BY nome_setor", fetch='all') or []
+    # [2] Busca de Dados para Menus <select> de FILTRO (cache de dados de referência)
+    tipos_atendimento = reference_data.get('tipos_atendimento')
+    lista_colaboradores = reference_data.get('colaboradores')
+    lista_setores = reference_data.get('setores')
 
     # [3] Construção de Query Dinâmica e Segura
     base_query_from = """
@@ -1730,9 +1716,8 @@ def crm_fila_atendimento():
         params.append(user_setor_id)
 
     elif user_profile == 'Gestor':
-        query_setores_gestor = "SELECT id FROM setores WHERE gestor_id = %s"
-        setores_do_gestor_raw = db.execute_query(query_setores_gestor, (user_id,), fetch='all')
-        setores_visiveis = {s['id'] for s in setores_do_gestor_raw}
+        escopo = user_scopes.get(user_id)
+        setores_visiveis = set(escopo.ids_setores_gerenciados) if escopo else set()
         setores_visiveis.add(user_setor_id)
         ids_setores = list(setores_visiveis)
 
@@ -1842,182 +1827,163 @@ def crm_detalhe_atendimento(atendimento_id):
             if not acao:
                 raise Exception("Ação não especificada.")
 
-            # --- AÇÃO 1: Comentário e/ou Status Interno ---
-            if acao == 'comentario':
-                descricao = request.form.get('descricao')
-                novo_status_interno = request.form.get('novo_status_interno')
+            # Todas as instruções de uma ação rodam na MESMA transação:
+            # uma conexão, um commit e rollback automático em caso de erro.
+            with db.transaction() as tx:
 
-                query_atual = "SELECT status_interno FROM atendimentos WHERE id = %s"
-                atendimento_atual = db.execute_query(query_atual, (atendimento_id,), fetch='one')
-                status_interno_antigo = atendimento_atual['status_interno']
+                # --- AÇÃO 1: Comentário e/ou Status Interno ---
+                if acao == 'comentario':
+                    descricao = request.form.get('descricao')
+                    novo_status_interno = request.form.get('novo_status_interno')
 
-                descricao_existe = bool(descricao)
-                status_mudou = novo_status_interno != status_interno_antigo
+                    query_atual = "SELECT status_interno FROM atendimentos WHERE id = %s"
+                    atendimento_atual = tx.execute(query_atual, (atendimento_id,), fetch='one')
+                    status_interno_antigo = atendimento_atual['status_interno']
 
-                if not descricao_existe and not status_mudou:
-                    flash('Nenhuma alteração detectada.', 'warning')
-                    return redirect(url_for('crm_detalhe_atendimento', atendimento_id=atendimento_id))
+                    descricao_existe = bool(descricao)
+                    status_mudou = novo_status_interno != status_interno_antigo
 
-                # Atualiza Status Interno
-                query_update_atendimento = """
-                    UPDATE atendimentos SET status_interno = %s, ultima_atualizacao = %s WHERE id = %s
-                """
-                db.execute_query(query_update_atendimento, (novo_status_interno, datetime.now(), atendimento_id),
-                                 fetch=None)
-
-                # Log Comentário
-                if descricao_existe:
-                    query_historico = """
-                        INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao)
-                        VALUES (%s, %s, 'Comentario', %s)
-                    """
-                    db.execute_query(query_historico, (atendimento_id, colaborador_id, descricao), fetch=None)
-
-                # Log Mudança Status
-                if status_mudou:
-                    log_status = f"[Status Interno alterado de '{status_interno_antigo}' para '{novo_status_interno}' por {colaborador_nome}.]"
-                    query_historico_status = """
-                        INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao)
-                        VALUES (%s, %s, 'Comentario', %s)
-                    """
-                    db.execute_query(query_historico_status, (atendimento_id, colaborador_id, log_status), fetch=None)
-
-                flash('Atendimento atualizado com sucesso!', 'success')
-
-            # --- AÇÃO 2: Comentar e Resolver (com PDS) ---
-            elif acao == 'resolver':
-                descricao = request.form.get('descricao')
-                gerar_pds_val = request.form.get('gerar_pds')
-                status_interno_final = 'Encerrado'
+                    if not descricao_existe and not status_mudou:
+                        flash('Nenhuma alteração detectada.', 'warning')
+                        return redirect(url_for('crm_detalhe_atendimento', atendimento_id=atendimento_id))
 
-                pds_gerar_flag = 1 if gerar_pds_val == '1' else 0
-                pds_status_val = 'Pendente' if pds_gerar_flag == 1 else 'Nao Aplicavel'
-
-                if descricao:
-                    query_hist_desc = "INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao) VALUES (%s, %s, 'Comentario', %s)"
-                    db.execute_query(query_hist_desc, (atendimento_id, colaborador_id, descricao), fetch=None)
+                    # Atualiza Status Interno
+                    query_update_atendimento = """
+                        UPDATE atendimentos SET status_interno = %s, ultima_atualizacao = %s WHERE id = %s
+                    """
+                    tx.execute(query_update_atendimento, (novo_status_interno, datetime.now(), atendimento_id))
 
-                pds_log_msg = 'Sim' if pds_gerar_flag == 1 else 'Nao'
-                hist_msg_res = f"[ATENDIMENTO RESOLVIDO] {colaborador_nome} resolveu o ticket. Gerar PDS: {pds_log_msg}."
-                query_hist_res = "INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao) VALUES (%s, %s, 'Comentario', %s)"
-                db.execute_query(query_hist_res, (atendimento_id, colaborador_id, hist_msg_res), fetch=None)
+                    # Log Comentário + Log Mudança Status (um único INSERT multi-linha)
+                    logs = []
+                    if descricao_existe:
+                        logs.append(descricao)
+                    if status_mudou:
+                        logs.append(f"[Status Interno alterado de '{status_interno_antigo}' para '{novo_status_interno}' por {colaborador_nome}.]")
+                    registrar_historico(tx, atendimento_id, colaborador_id, logs)
 
-                query_resolver = """
-                    UPDATE atendimentos
-                    SET status_fila = 'Resolvido', status_interno = %s, pds_gerar = %s, pds_status = %s, ultima_atualizacao = %s
-                    WHERE id = %s
-                """
-                db.execute_query(query_resolver,
-                                 (status_interno_final, pds_gerar_flag, pds_status_val, datetime.now(), atendimento_id),
-                                 fetch=None)
+                    flash('Atendimento atualizado com sucesso!', 'success')
 
-                if pds_gerar_flag == 1:
-                    novo_token = str(uuid.uuid4())
-                    query_criar_pds = "INSERT INTO pesquisas_satisfacao (atendimento_id, token, status, criado_em) VALUES (%s, %s, 'Pendente', %s)"
-                    db.execute_query(query_criar_pds, (atendimento_id, novo_token, datetime.now()), fetch=None)
+                # --- AÇÃO 2: Comentar e Resolver (com PDS) ---
+                elif acao == 'resolver':
+                    descricao = request.form.get('descricao')
+                    gerar_pds_val = request.form.get('gerar_pds')
+                    status_interno_final = 'Encerrado'
 
-                flash('Atendimento resolvido com sucesso!', 'success')
+                    pds_gerar_flag = 1 if gerar_pds_val == '1' else 0
+                    pds_status_val = 'Pendente' if pds_gerar_flag == 1 else 'Nao Aplicavel'
 
-            # --- AÇÃO 3: Mudar Status (Macro) ---
-            elif acao == 'mudar_status':
-                novo_status = request.form.get('novo_status')
-                if not novo_status: raise Exception("Novo status não foi selecionado.")
+                    logs = []
+                    if descricao:
+                        logs.append(descricao)
 
-                query_status_atual = "SELECT status_fila FROM atendimentos WHERE id = %s"
-                atendimento_atual = db.execute_query(query_status_atual, (atendimento_id,), fetch='one')
-                status_antigo = atendimento_atual['status_fila']
+                    pds_log_msg = 'Sim' if pds_gerar_flag == 1 else 'Nao'
+                    logs.append(f"[ATENDIMENTO RESOLVIDO] {colaborador_nome} resolveu o ticket. Gerar PDS: {pds_log_msg}.")
+                    registrar_historico(tx, atendimento_id, colaborador_id, logs)
 
-                if status_antigo == novo_status:
-                    flash('O atendimento já está com este status.', 'warning')
-                    return redirect(url_for('crm_detalhe_atendimento', atendimento_id=atendimento_id))
-
-                if novo_status in ['Resolvido', 'Fechado', 'Cancelado']:
-                    novo_token = str(uuid.uuid4())
-                    query_update_status = """
+                    query_resolver = """
                         UPDATE atendimentos
-                        SET status_fila = %s, status_interno = 'Encerrado', pds_status = 'Pendente', pds_gerar = 1, ultima_atualizacao = %s
+                        SET status_fila = 'Resolvido', status_interno = %s, pds_gerar = %s, pds_status = %s, ultima_atualizacao = %s
                         WHERE id = %s
                     """
-                    db.execute_query(query_update_status, (novo_status, datetime.now(), atendimento_id), fetch=None)
-
-                    query_criar_pds = "INSERT INTO pesquisas_satisfacao (atendimento_id, token, status, criado_em) VALUES (%s, %s, 'Pendente', %s)"
-                    db.execute_query(query_criar_pds, (atendimento_id, novo_token, datetime.now()), fetch=None)
-                else:
-                    query_update_status = "UPDATE atendimentos SET status_fila = %s, ultima_atualizacao = %s WHERE id = %s"
-                    db.execute_query(query_update_status, (novo_status, datetime.now(), atendimento_id), fetch=None)
+                    tx.execute(query_resolver,
+                               (status_interno_final, pds_gerar_flag, pds_status_val, datetime.now(), atendimento_id))
+
+                    if pds_gerar_flag == 1:
+                        novo_token = str(uuid.uuid4())
+                        query_criar_pds = "INSERT INTO pesquisas_satisfacao (atendimento_id, token, status, criado_em) VALUES (%s, %s, 'Pendente', %s)"
+                        tx.execute(query_criar_pds, (atendimento_id, novo_token, datetime.now()))
+
+                    flash('Atendimento resolvido com sucesso!', 'success')
+
+                # --- AÇÃO 3: Mudar Status (Macro) ---
+                elif acao == 'mudar_status':
+                    novo_status = request.form.get('novo_status')
+                    if not novo_status: raise Exception("Novo status não foi selecionado.")
+
+                    query_status_atual = "SELECT status_fila FROM atendimentos WHERE id = %s"
+                    atendimento_atual = tx.execute(query_status_atual, (atendimento_id,), fetch='one')
+                    status_antigo = atendimento_atual['status_fila']
+
+                    if status_antigo == novo_status:
+                        flash('O atendimento já está com este status.', 'warning')
+                        return redirect(url_for('crm_detalhe_atendimento', atendimento_id=atendimento_id))
+
+                    if novo_status in ['Resolvido', 'Fechado', 'Cancelado']:
+                        novo_token = str(uuid.uuid4())
+                        query_update_status = """
+                            UPDATE atendimentos
+                            SET status_fila = %s, status_interno = 'Encerrado', pds_status = 'Pendente', pds_gerar = 1, ultima_atualizacao = %s
+                            WHERE id = %s
+                        """
+                        tx.execute(query_update_status, (novo_status, datetime.now(), atendimento_id))
 
-                descricao_log = f"[MUDANÇA DE STATUS] Status alterado de '{status_antigo}' para '{novo_status}' por {colaborador_nome}."
-                query_historico_status = "INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao) VALUES (%s, %s, 'Comentario', %s)"
-                db.execute_query(query_historico_status, (atendimento_id, colaborador_id, descricao_log), fetch=None)
+                        query_criar_pds = "INSERT INTO pesquisas_satisfacao (atendimento_id, token, status, criado_em) VALUES (%s, %s, 'Pendente', %s)"
+                        tx.execute(query_criar_pds, (atendimento_id, novo_token, datetime.now()))
+                    else:
+                        query_update_status = "UPDATE atendimentos SET status_fila = %s, ultima_atualizacao = %s WHERE id = %s"
+                        tx.execute(query_update_status, (novo_status, datetime.now(), atendimento_id))
 
-                flash(f'Status atualizado para "{novo_status}" com sucesso!', 'success')
+                    descricao_log = f"[MUDANÇA DE STATUS] Status alterado de '{status_antigo}' para '{novo_status}' por {colaborador_nome}."
+                    registrar_historico(tx, atendimento_id, colaborador_id, [descricao_log])
 
-            # --- AÇÃO 4: Encaminhar ---
-            elif acao == 'encaminhar':
-                novo_setor_id = request.form.get('encaminhar_setor')
-                if not novo_setor_id: raise Exception("Nenhum setor de destino selecionado.")
+                    flash(f'Status atualizado para "{novo_status}" com sucesso!', 'success')
 
-                query_setor_novo = "SELECT nome_setor FROM setores WHERE id = %s"
-                setor_novo_obj = db.execute_query(query_setor_novo, (novo_setor_id,), fetch='one')
-                novo_setor_nome = setor_novo_obj['nome_setor'] if setor_novo_obj else "Setor Desconhecido"
+                # --- AÇÃO 4: Encaminhar ---
+                elif acao == 'encaminhar':
+                    novo_setor_id = request.form.get('encaminhar_setor')
+                    if not novo_setor_id: raise Exception("Nenhum setor de destino selecionado.")
 
-                query_setor_antigo = "SELECT s.nome_setor FROM atendimentos a JOIN setores s ON a.setor_responsavel_id = s.id WHERE a.id = %s"
-                setor_antigo_obj = db.execute_query(query_setor_antigo, (atendimento_id,), fetch='one')
-                setor_antigo_nome = setor_antigo_obj['nome_setor'] if setor_antigo_obj else "Setor Anterior"
+                    query_setor_novo = "SELECT nome_setor FROM setores WHERE id = %s"
+                    setor_novo_obj = tx.execute(query_setor_novo, (novo_setor_id,), fetch='one')
+                    novo_setor_nome = setor_novo_obj['nome_setor'] if setor_novo_obj else "Setor Desconhecido"
 
-                query_update_encaminhar = """
-                    UPDATE atendimentos
-                    SET status_fila = 'Em fila', sector_responsavel_id = %s, responsavel_id = criador_id, ultima_atualizacao = %s
-                    WHERE id = %s
-                """
-                # OBS: Ajustei sector_responsavel_id para setor_responsavel_id caso seja erro de digitação
-                query_update_encaminhar = query_update_encaminhar.replace("sector_responsavel_id",
-                                                                          "setor_responsavel_id")
+                    query_setor_antigo = "SELECT s.nome_setor FROM atendimentos a JOIN setores s ON a.setor_responsavel_id = s.id WHERE a.id = %s"
+                    setor_antigo_obj = tx.execute(query_setor_antigo, (atendimento_id,), fetch='one')
+                    setor_antigo_nome = setor_antigo_obj['nome_setor'] if setor_antigo_obj else "Setor Anterior"
 
-                db.execute_query(query_update_encaminhar, (novo_setor_id, datetime.now(), atendimento_id), fetch=None)
+                    query_update_encaminhar = """
+                        UPDATE atendimentos
+                        SET status_fila = 'Em fila', setor_responsavel_id = %s, responsavel_id = criador_id, ultima_atualizacao = %s
+                        WHERE id = %s
+                    """
+                    tx.execute(query_update_encaminhar, (novo_setor_id, datetime.now(), atendimento_id))
 
-                descricao_log = f"[ENCAMINHADO] {colaborador_nome} encaminhou o atendimento do setor '{setor_antigo_nome}' para '{novo_setor_nome}'."
-                query_historico_encaminhar = "INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao) VALUES (%s, %s, 'Comentario', %s)"
-                db.execute_query(query_historico_encaminhar, (atendimento_id, colaborador_id, descricao_log),
-                                 fetch=None)
+                    descricao_log = f"[ENCAMINHADO] {colaborador_nome} encaminhou o atendimento do setor '{setor_antigo_nome}' para '{novo_setor_nome}'."
+                    registrar_historico(tx, atendimento_id, colaborador_id, [descricao_log])
 
-                flash(f'Atendimento encaminhado para "{novo_setor_nome}"!', 'success')
-                return redirect(url_for('crm_fila_atendimento'))
+                    flash(f'Atendimento encaminhado para "{novo_setor_nome}"!', 'success')
+                    return redirect(url_for('crm_fila_atendimento'))
 
-            # --- AÇÃO 5: Mudar Responsável ---
-            elif acao == 'mudar_responsavel':
-                novo_responsavel_id = request.form.get('novo_responsavel')
-                if not novo_responsavel_id: raise Exception("Nenhum novo responsável selecionado.")
+                # --- AÇÃO 5: Mudar Responsável ---
+                elif acao == 'mudar_responsavel':
+                    novo_responsavel_id = request.form.get('novo_responsavel')
+                    if not novo_responsavel_id: raise Exception("Nenhum novo responsável selecionado.")
 
-                query_resp_antigo = "SELECT c.nome FROM atendimentos a JOIN colaboradores c ON a.responsavel_id = c.id WHERE a.id = %s"
-                resp_antigo_obj = db.execute_query(query_resp_antigo, (atendimento_id,), fetch='one')
-                resp_antigo_nome = resp_antigo_obj['nome'] if resp_antigo_obj else "Ninguém"
+                    query_resp_antigo = "SELECT c.nome FROM atendimentos a JOIN colaboradores c ON a.responsavel_id = c.id WHERE a.id = %s"
+                    resp_antigo_obj = tx.execute(query_resp_antigo, (atendimento_id,), fetch='one')
+                    resp_antigo_nome = resp_antigo_obj['nome'] if resp_antigo_obj else "Ninguém"
 
-                query_resp_novo = "SELECT nome FROM colaboradores WHERE id = %s"
-                resp_novo_obj = db.execute_query(query_resp_novo, (novo_responsavel_id,), fetch='one')
-                resp_novo_nome = resp_novo_obj['nome'] if resp_novo_obj else "Desconhecido"
+                    query_resp_novo = "SELECT nome FROM colaboradores WHERE id = %s"
+                    resp_novo_obj = tx.execute(query_resp_novo, (novo_responsavel_id,), fetch='one')
+                    resp_novo_nome = resp_novo_obj['nome'] if resp_novo_obj else "Desconhecido"
 
-                query_update_responsavel = "UPDATE atendimentos SET responsavel_id = %s, ultima_atualizacao = %s WHERE id = %s"
-                db.execute_query(query_update_responsavel, (novo_responsavel_id, datetime.now(), atendimento_id),
-                                 fetch=None)
+                    query_update_responsavel = "UPDATE atendimentos SET responsavel_id = %s, ultima_atualizacao = %s WHERE id = %s"
+                    tx.execute(query_update_responsavel, (novo_responsavel_id, datetime.now(), atendimento_id))
 
-                descricao_log = f"[RE-ATRIBUÍDO] {colaborador_nome} mudou o responsável de '{resp_antigo_nome}' para '{resp_novo_nome}'."
-                query_historico_reatribuir = "INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao) VALUES (%s, %s, 'Comentario', %s)"
-                db.execute_query(query_historico_reatribuir, (atendimento_id, colaborador_id, descricao_log),
-                                 fetch=None)
+                    descricao_log = f"[RE-ATRIBUÍDO] {colaborador_nome} mudou o responsável de '{resp_antigo_nome}' para '{resp_novo_nome}'."
+                    registrar_historico(tx, atendimento_id, colaborador_id, [descricao_log])
 
-                flash(f'Atendimento reatribuído para {resp_novo_nome} com sucesso!', 'success')
+                    flash(f'Atendimento reatribuído para {resp_novo_nome} com sucesso!', 'success')
 
-            # --- AÇÃO 6: Assumir ---
-            elif acao == 'assumir':
-                query_update_assumir = "UPDATE atendimentos SET status_fila = 'Em atendimento', responsavel_id = %s, ultima_atualizacao = %s WHERE id = %s"
-                db.execute_query(query_update_assumir, (colaborador_id, datetime.now(), atendimento_id), fetch=None)
+                # --- AÇÃO 6: Assumir ---
+                elif acao == 'assumir':
+                    query_update_assumir = "UPDATE atendimentos SET status_fila = 'Em atendimento', responsavel_id = %s, ultima_atualizacao = %s WHERE id = %s"
+                    tx.execute(query_update_assumir, (colaborador_id, datetime.now(), atendimento_id))
 
-                descricao_log = f"[ASSUMIU] {colaborador_nome} assumiu este atendimento."
-                query_historico_assumir = "INSERT INTO atendimento_historico (atendimento_id, colaborador_id, tipo_acao, descricao) VALUES (%s, %s, 'Comentario', %s)"
-                db.execute_query(query_historico_assumir, (atendimento_id, colaborador_id, descricao_log), fetch=None)
+                    descricao_log = f"[ASSUMIU] {colaborador_nome} assumiu este atendimento."
+                    registrar_historico(tx, atendimento_id, colaborador_id, [descricao_log])
 
-                flash('Você assumiu este atendimento!', 'success')
+                    flash('Você assumiu este atendimento!', 'success')
 
         except Exception as e:
             flash(f'Erro ao processar a ação: {e}', 'danger')
@@ -2059,9 +2025,8 @@ def crm_detalhe_atendimento(atendimento_id):
     if user_profile == 'Administrador':
         pode_ver = True
     elif user_profile == 'Gestor':
-        query_setores_gestor = "SELECT id FROM setores WHERE gestor_id = %s"
-        setores_do_gestor_raw = db.execute_query(query_setores_gestor, (colaborador_id,), fetch='all')
-        setores_visiveis = {s['id'] for s in setores_do_gestor_raw}
+        escopo = user_scopes.get(colaborador_id)
+        setores_visiveis = set(escopo.ids_setores_gerenciados) if escopo else set()
         setores_visiveis.add(user_setor_id)
         if atendimento['setor_responsavel_id'] in setores_visiveis: pode_ver = True
     elif user_profile == 'Colaborador':
@@ -2079,16 +2044,14 @@ def crm_detalhe_atendimento(atendimento_id):
         WHERE h.atendimento_id = %s
         ORDER BY h.timestamp ASC
     """
-    historico = db.execute_query(query_historico, (atendimento_id,), fetch='all') or []
-
-    # Listas para formulários
-    lista_setores = db.execute_query("SELECT id, nome_setor FROM setores ORDER BY nome_setor", fetch='all') or []
-    lista_colaboradores_setor = db.execute_query(
-        "SELECT id, nome FROM colaboradores WHERE setor_id = %s AND status = 'Ativo' ORDER BY nome",
-        (atendimento['setor_responsavel_id'],), fetch='all'
-    ) or []
 
-    pds_info = None
+    # Histórico, lista do formulário e PDS são independentes: rodam em paralelo.
+    consultas = [
+        (query_historico, (atendimento_id,), 'all'),
+        # Lista para o formulário (os setores vêm do cache de dados de referência)
+        ("SELECT id, nome FROM colaboradores WHERE setor_id = %s AND status = 'Ativo' ORDER BY nome",
+         (atendimento['setor_responsavel_id'],), 'all'),
+    ]
     if atendimento['pds_gerar'] == 1:
         query_pds = """
             SELECT token, status, q1_demanda_atendida, q2_nota_atendimento 
@@ -2096,7 +2059,13 @@ def crm_detalhe_atendimento(atendimento_id):
             WHERE atendimento_id = %s 
             LIMIT 1
         """
-        pds_info = db.execute_query(query_pds, (atendimento_id,), fetch='one')
+        consultas.append((query_pds, (atendimento_id,), 'one'))
+
+    historico, lista_colaboradores_setor, *resto = db.gather(*consultas)
+    historico = historico or []
+    lista_setores = reference_data.get('setores')
+    lista_colaboradores_setor = lista_colaboradores_setor or []
+    pds_info = resto[0] if resto else None
 
     return render_template('crm_detalhe_atendimento.html',
                            atendimento=atendimento,
@@ -2127,6 +2096,7 @@ def admin_gestao_clientes():
                     raise Exception("O nome do grupo não pode estar vazio.")
                 query = "INSERT INTO cliente_grupos (nome) VALUES (%s)"
                 db.execute_query(query, (nome_grupo,), fetch=None)
+                reference_data.invalidate('cliente_grupos')
                 flash(f"Grupo '{nome_grupo}' criado com sucesso!", 'success')
 
             # --- Criar Tipo ---
@@ -2137,6 +2107,7 @@ def admin_gestao_clientes():
                     raise Exception("Campos obrigatórios não preenchidos.")
                 query = "INSERT INTO cliente_tipos (nome, grupo_id) VALUES (%s, %s)"
                 db.execute_query(query, (nome_tipo, grupo_id), fetch=None)
+                reference_data.invalidate('cliente_tipos')
                 flash(f"Tipo '{nome_tipo}' criado com sucesso!", 'success')
 
             # --- Excluir Grupo ---
@@ -2146,6 +2117,7 @@ def admin_gestao_clientes():
                     raise Exception("ID do grupo não informado.")
                 query = "DELETE FROM cliente_grupos WHERE id = %s"
                 db.execute_query(query, (grupo_id,), fetch=None)
+                reference_data.invalidate('cliente_grupos')  # Os tipos do grupo também dependem dele
                 flash("Grupo excluído com sucesso!", 'success')
 
             # --- Excluir Tipo ---
@@ -2155,6 +2127,7 @@ def admin_gestao_clientes():
                     raise Exception("ID do tipo não informado.")
                 query = "DELETE FROM cliente_tipos WHERE id = %s"
                 db.execute_query(query, (tipo_id,), fetch=None)
+                reference_data.invalidate('cliente_tipos')
                 flash("Tipo excluído com sucesso!", 'success')
 
         except Exception as e:
@@ -2200,6 +2173,7 @@ def admin_gestao_origens():
                     raise Exception("O nome da origem não pode estar vazio.")
                 query = "INSERT INTO origens (nome) VALUES (%s)"
                 db.execute_query(query, (nome_origem,), fetch=None)
+                reference_data.invalidate('origens')
                 flash(f"Origem '{nome_origem}' criada com sucesso!", 'success')
 
             # --- Editar ---
@@ -2210,6 +2184,7 @@ def admin_gestao_origens():
                     raise Exception("Dados insuficientes para editar.")
                 query = "UPDATE origens SET nome = %s WHERE id = %s"
                 db.execute_query(query, (nome_origem, origem_id), fetch=None)
+                reference_data.invalidate('origens')
                 flash(f"Origem atualizada para '{nome_origem}'!", 'success')
 
             # --- Excluir ---
@@ -2219,6 +2194,7 @@ def admin_gestao_origens():
                     raise Exception("ID da origem não informado.")
                 query = "DELETE FROM origens WHERE id = %s"
                 db.execute_query(query, (origem_id,), fetch=None)
+                reference_data.invalidate('origens')
                 flash("Origem excluída com sucesso!", 'success')
 
         except Exception as e:
@@ -2256,7 +2232,7 @@ def crm_historico_cliente():
     msg_alerta_titulo = ""
     msg_alerta_desc = ""
 
-    lista_setores_todos = db.execute_query("SELECT id, nome_setor FROM setores ORDER BY nome_setor", fetch='all') or []
+    lista_setores_todos = reference_data.get('setores')
 
     try:
         # =====================================================================
@@ -2487,13 +2463,12 @@ def crm_lista_clientes():
     offset = (pagina - 1) * itens_por_pagina
 
     # 2. Carregar listas para os Dropdowns
-    lista_grupos = db.execute_query("SELECT id, nome FROM cliente_grupos ORDER BY nome", fetch='all') or []
+    lista_grupos = reference_data.get('cliente_grupos')
 
     # Se já tiver um grupo selecionado (após filtrar), carregamos os tipos dele para o dropdown não vir vazio
     lista_tipos_preenchidos = []
     if filtro_grupo:
-        lista_tipos_preenchidos = db.execute_query(
-            "SELECT id, nome FROM cliente_tipos WHERE grupo_id = %s ORDER BY nome", (filtro_grupo,), fetch='all') or []
+        lista_tipos_preenchidos = reference_data.cliente_tipos(filtro_grupo)
 
     # 3. Montagem da Query de Clientes
     # Precisamos do JOIN com cliente_tipos para filtrar pelo Grupo
@@ -2560,13 +2535,15 @@ def crm_lista_clientes():
 
 @app.route('/api/tipos_por_grupo/<int:grupo_id>')
 @login_required
+@conditional_get('cliente_tipos', 'cliente_grupos', cache_control=CACHE_REFERENCIA)
 def api_tipos_por_grupo(grupo_id):
     """
     Retorna JSON com os tipos de cliente pertencentes a um grupo.
     Usado pelo Javascript do filtro em cascata.
     """
-    query = "SELECT id, nome FROM cliente_tipos WHERE grupo_id = %s ORDER BY nome"
-    tipos = db.execute_query(query, (grupo_id,), fetch='all') or []
+    tipos = reference_data.cliente_tipos(grupo_id)
+    if not tipos:
+        uncacheable()  # Grupo sem tipos ou falha no banco: não vale um ETag
     return jsonify(tipos)
 
 
@@ -2625,7 +2602,10 @@ def kanban():
 
 # --- 1. ROTAS AUXILIARES (SETORES/TIPOS/COLABORADORES) ---
 
+# Respostas com ETag (ver `conditional_get`): o kanban.js chama estas rotas
+# repetidamente; se nada mudou, a resposta é um 304 sem ida ao banco.
 @app.route('/api/kanban/setores')
+@conditional_get('setores', 'colaboradores')
 def api_get_setores():
     print("--- ROTA SETORES ACIONADA ---")  # Debug para ver no terminal
     try:
@@ -2642,8 +2622,9 @@ def api_get_setores():
         # Debug: ver o que o banco devolveu
         print(f"Resultado do Banco: {resultado}")
 
-        # Se vier None, retorna lista vazia
+        # Se vier None (falha no banco), retorna lista vazia, sem ETag
         if resultado is None:
+            uncacheable()
             return jsonify([])
 
         return jsonify(resultado)
@@ -2652,15 +2633,21 @@ def api_get_setores():
         print(f"!!! ERRO FATAL AO BUSCAR SETORES: {e}")
         import traceback
         traceback.print_exc()  # Isso força o erro a aparecer detalhado
+        uncacheable()
         return jsonify([])
 
 
 @app.route('/api/kanban/tipos_atendimento')
+@conditional_get('tipos_atendimento', cache_control=CACHE_REFERENCIA)
 def api_get_tipos():
-    return jsonify(db.execute_query("SELECT id, nome FROM tipos_atendimento ORDER BY nome ASC", fetch='all'))
+    tipos = reference_data.get('tipos_atendimento')
+    if not tipos:
+        uncacheable()  # `reference_data` devolve [] quando o banco falha
+    return jsonify(tipos)
 
 
 @app.route('/api/kanban/todos_colaboradores')
+@conditional_get('colaboradores', 'setores')
 def api_get_todos_colaboradores():
     try:
         query = """
@@ -2671,9 +2658,12 @@ def api_get_todos_colaboradores():
             ORDER BY c.nome ASC
         """
         dados = db.execute_query(query, fetch='all')
+        if dados is None:
+            uncacheable()  # Falha no banco: lista vazia, sem ETag
         return jsonify(dados if dados else [])
     except Exception as e:
         print(f"Erro ao buscar colaboradores: {e}")
+        uncacheable()
         return jsonify([])
 
 
@@ -2769,45 +2759,25 @@ def api_criar_tarefa():
             VALUES (%s, %s, 'a_fazer', %s, %s, %s, %s, %s, %s, NOW())
         """
 
-        # Query para buscar o ID REAL que acabou de ser gerado (Auto Increment)
-        query_get_id = """
-            SELECT id FROM tarefas 
-            WHERE vinculo_id = %s AND atribuido_para_id = %s 
-            ORDER BY id DESC LIMIT 1
-        """
-
         query_anexo = """
             INSERT INTO tarefa_anexos (tarefa_id, nome_arquivo, caminho_arquivo, data_upload) 
             VALUES (%s, %s, %s, NOW())
         """
 
-        # 5. Loop de Inserção
-        for resp_id in responsaveis_ids:
-            # A) Insere a Tarefa (Ignoramos o retorno aqui para evitar o erro do 'int object')
-            db.execute_query(query_tarefa, params=(
-                titulo, descricao, prioridade, prazo, criado_por, resp_id, tipo_id, vinculo_id
-            ))
-
-            # B) Busca o ID real gerado pelo banco
-            # Como usamos vinculo_id + atribuido_para_id, é impossível pegar a tarefa errada
-            resultado = db.execute_query(query_get_id, params=(vinculo_id, resp_id), fetch='one')
-
-            nova_tarefa_id = None
-
-            # Tratamento robusto do retorno (seja dict, tupla ou valor direto)
-            if resultado:
-                if isinstance(resultado, dict):
-                    nova_tarefa_id = resultado.get('id')
-                elif isinstance(resultado, (list, tuple)):
-                    nova_tarefa_id = resultado[0]
-                elif isinstance(resultado, int):
-                    nova_tarefa_id = resultado
-
-            # C) Insere o Anexo usando o ID real validado
-            if caminho_anexo_db and nova_tarefa_id:
-                # Agora temos certeza que nova_tarefa_id existe na tabela 'tarefas'
-                # A constraint foreign key não vai falhar
-                db.execute_query(query_anexo, params=(nova_tarefa_id, nome_original_anexo, caminho_anexo_db))
+        # 5. Inserção em lote (uma única transação para todo o lote)
+        # Se qualquer INSERT falhar, nenhuma tarefa do lote fica "órfã" no banco.
+        with db.transaction() as tx:
+            # A) Todas as tarefas num INSERT multi-linha; recebe os IDs REAIS gerados (Auto Increment)
+            novas_tarefas_ids = tx.execute_many(query_tarefa, [
+                (titulo, descricao, prioridade, prazo, criado_por, resp_id, tipo_id, vinculo_id)
+                for resp_id in responsaveis_ids
+            ]).ids
+
+            # B) Insere o Anexo de cada tarefa usando os IDs reais gerados
+            if caminho_anexo_db and novas_tarefas_ids:
+                tx.execute_many(query_anexo, [
+                    (tarefa_id, nome_original_anexo, caminho_anexo_db) for tarefa_id in novas_tarefas_ids
+                ])
 
         return jsonify({'sucesso': True})
 
@@ -3031,63 +3001,67 @@ def api_kanban_master():
         WHERE t.status != 'arquivado'
         ORDER BY t.data_prazo ASC
     """
-    todas_tarefas = db.execute_query(query, fetch='all')
     tarefas_agrupadas = {}
     hoje = datetime.now().date()
 
-    if not todas_tarefas:
+    # As tarefas são lidas em lotes (stream), sem materializar a lista inteira.
+    # row_format='record': cada linha é um objeto leve (t.titulo), sem um dict por linha.
+    # Como antes do stream, uma falha do banco devolve a lista vazia (e não um 500).
+    try:
+        with closing(db.stream(query, row_format='record')) as todas_tarefas:
+            for t in todas_tarefas:
+                # Agrupa pelo vinculo_id se existir, senão pelo id único
+                chave = t.vinculo_id if t.vinculo_id else str(t.id)
+
+                # --- NOVO: Lógica da Foto ---
+                link_foto = None
+                if t.foto_perfil:
+                    link_foto = url_for('static', filename=t.foto_perfil)
+                # ----------------------------
+
+                responsavel = {
+                    'id': t.responsavel_id,
+                    'nome': t.responsavel_nome or '?',
+                    'foto': link_foto # Agora enviamos a URL pronta
+                }
+
+                if chave not in tarefas_agrupadas:
+                    # Formatação de data (igual ao individual)
+                    prazo_fmt = '-'
+                    atrasada = False
+                    if t.data_prazo:
+                        d = t.data_prazo
+                        if isinstance(d, str):
+                            try:
+                                d = datetime.strptime(d, '%Y-%m-%d').date()
+                            except:
+                                pass
+
+                        if hasattr(d, 'strftime'):
+                            prazo_fmt = d.strftime('%d/%m')
+                            if hasattr(d, 'year') and d < hoje and t.status != 'concluido':
+                                atrasada = True
+
+                    tarefas_agrupadas[chave] = {
+                        'id': t.id,
+                        'vinculo_id': t.vinculo_id,
+                        'titulo': t.titulo,
+                        'descricao': t.descricao,
+                        'prioridade': t.prioridade,
+                        'status': t.status,
+                        'prazo_fmt': prazo_fmt,
+                        'atrasada': atrasada,
+                        'equipe': [responsavel]
+                    }
+                else:
+                    # Verifica se esse responsável já não está na lista (evita duplicados visuais)
+                    ids_existentes = [m['id'] for m in tarefas_agrupadas[chave]['equipe']]
+                    if responsavel['id'] not in ids_existentes:
+                        tarefas_agrupadas[chave]['equipe'].append(responsavel)
+    except Exception:
+        current_app.logger.exception("Erro ao montar o kanban master")
         return jsonify([])
 
-    for t in todas_tarefas:
-        # Agrupa pelo vinculo_id se existir, senão pelo id único
-        chave = t['vinculo_id'] if t.get('vinculo_id') else str(t['id'])
-
-        # --- NOVO: Lógica da Foto ---
-        link_foto = None
-        if t.get('foto_perfil'):
-            link_foto = url_for('static', filename=t['foto_perfil'])
-        # ----------------------------
-
-        responsavel = {
-            'id': t['responsavel_id'],
-            'nome': t['responsavel_nome'] or '?',
-            'foto': link_foto # Agora enviamos a URL pronta
-        }
-
-        if chave not in tarefas_agrupadas:
-            # Formatação de data (igual ao individual)
-            prazo_fmt = '-'
-            atrasada = False
-            if t.get('data_prazo'):
-                d = t['data_prazo']
-                if isinstance(d, str):
-                    try:
-                        d = datetime.strptime(d, '%Y-%m-%d').date()
-                    except:
-                        pass
-
-                if hasattr(d, 'strftime'):
-                    prazo_fmt = d.strftime('%d/%m')
-                    if hasattr(d, 'year') and d < hoje and t['status'] != 'concluido':
-                        atrasada = True
-
-            tarefas_agrupadas[chave] = {
-                'id': t['id'],
-                'vinculo_id': t.get('vinculo_id'),
-                'titulo': t['titulo'],
-                'descricao': t['descricao'],
-                'prioridade': t['prioridade'],
-                'status': t['status'],
-                'prazo_fmt': prazo_fmt,
-                'atrasada': atrasada,
-                'equipe': [responsavel]
-            }
-        else:
-            # Verifica se esse responsável já não está na lista (evita duplicados visuais)
-            ids_existentes = [m['id'] for m in tarefas_agrupadas[chave]['equipe']]
-            if responsavel['id'] not in ids_existentes:
-                tarefas_agrupadas[chave]['equipe'].append(responsavel)
-
     return jsonify(list(tarefas_agrupadas.values()))
 
 
@@ -3172,9 +3146,12 @@ def api_excluir_tarefa():
 # =============================================================================
 # ROTAS DE NOTIFICAÇÕES (BASEADO EM PENDÊNCIAS)
 # =============================================================================
+# Consultadas por polling em TODAS as páginas: são `async def` e usam o
+# `async_db` (utils/db_async.py), para não prender uma thread do worker
+# enquanto esperam o MySQL.
 
 @app.route('/api/notificacoes/contar')
-def api_notificacoes_contar():
+async def api_notificacoes_contar():
     colab_id = session.get('colaborador_id')
     if not colab_id:
         return jsonify({'total': 0, 'criticas': 0})
@@ -3194,7 +3171,7 @@ def api_notificacoes_contar():
               AND status IN ('a_fazer', 'em_andamento')
         """
 
-        resultado = db.execute_query(query, params=(colab_id,), fetch='one')
+        resultado = await async_db.execute_query(query, params=(colab_id,), fetch='one')
 
         total = resultado['total'] if resultado else 0
         criticas = resultado['criticas'] if resultado and resultado['criticas'] else 0
@@ -3211,7 +3188,7 @@ def api_notificacoes_contar():
 
 
 @app.route('/api/notificacoes/listar')
-def api_notificacoes_listar():
+async def api_notificacoes_listar():
     colab_id = session.get('colaborador_id')
     if not colab_id:
         return jsonify([])
@@ -3230,7 +3207,7 @@ def api_notificacoes_listar():
             LIMIT 7
         """
 
-        tarefas = db.execute_query(query, params=(colab_id,), fetch='all')
+        tarefas = await async_db.execute_query(query, params=(colab_id,), fetch='all')
 
         # Tratamento de datas para JSON (ISO format YYYY-MM-DD para o JS ler)
         lista_formatada = []
@@ -3252,4 +3229,123 @@ def api_notificacoes_listar():
 
     except Exception as e:
         print(f"Erro ao listar notificacoes: {e}")
-        return jsonify([])
\ No newline at end of file
+        return jsonify([])
+
+# =============================================================================
+# Bloco 8: Infraestrutura do Banco de Dados (Pool e Observabilidade)
+# =============================================================================
+
+@app.errorhandler(PoolExhaustedError)
+def handle_pool_exhausted(e):
+    """
+    Load shedding: quando o pool de conexões está esgotado, responde
+    imediatamente com 503 + Retry-After em vez de derrubar a rota.
+
+    As rotas NÃO precisam relançar a exceção nos seus `except Exception`:
+    se alguma a engolir, `responder_503_se_pool_esgotou` troca a resposta.
+    """
+    app.logger.warning(f"⚠️ 503 por pool esgotado em {request.path}: {e}")
+    headers = {'Retry-After': str(e.retry_after)}
+
+    if request.path.startswith('/api/'):
+        return jsonify({'erro': 'Servidor ocupado. Tente novamente em instantes.'}), 503, headers
+    return 'Servidor ocupado no momento. Tente novamente em instantes.', 503, headers
+
+
+@app.before_request
+def iniciar_metricas_banco():
+    """Começa a contar as consultas ao banco desta requisição."""
+    query_stats.start_request()
+
+
+@app.after_request
+def publicar_metricas_banco(response):
+    """
+    Publica as métricas de banco da requisição:
+    [1] Cabeçalho Server-Timing (aba Network do navegador).
+    [2] Aviso de N+1 quando a mesma consulta se repete demais.
+    [3] Linha de log estruturada (JSON), se DB_QUERY_LOG=1.
+    """
+    stats = query_stats.current()
+    if stats is None:
+        return response
+
+    response.headers.add('Server-Timing', stats.server_timing())
+
+    repetidas = stats.repeated()
+    if repetidas:
+        app.logger.warning(f"⚠️ Possível N+1 em {request.method} {request.path}: {repetidas}")
+
+    if query_stats.LOG_REQUESTS:
+        app.logger.info(json.dumps({
+            'event': 'db_request_stats',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            **stats.as_dict(),
+        }, ensure_ascii=False, default=str))
+
+    return response
+
+
+@app.after_request
+def responder_503_se_pool_esgotou(response):
+    """
+    Se o pool esgotou durante a requisição (utils/db.py, `registrar_pool_esgotado`)
+    e a rota capturou o erro num `except Exception`, a resposta dela (ex: um
+    `200 []` ou um redirect com "Erro ao ...") vira o 503 + Retry-After.
+
+    Registrada DEPOIS de `publicar_metricas_banco` para rodar antes dela (o
+    Flask chama os after_request na ordem inversa): o 503 também leva as métricas.
+    """
+    erro = pool_esgotado_na_requisicao()
+    if erro is None or response.status_code == 503:
+        return response
+    session.pop('_flashes', None)  # A mensagem de erro da rota não vale mais
+    return make_response(handle_pool_exhausted(erro))
+
+
+@app.teardown_request
+def liberar_conexoes_da_requisicao(exc):
+    """Devolve ao pool as conexões presas à requisição (DB_REQUEST_AFFINITY=1)."""
+    db.release_request_connections()
+
+
+@app.route('/admin/db/pool')
+@admin_required
+def admin_db_pool_stats():
+    """
+    [Admin] Estatísticas ao vivo do pool de conexões DESTE worker
+    (em uso, ociosas, fila de espera, timeouts e histograma de espera).
+    """
+    return jsonify(db.pool_stats() or {})
+
+
+@app.route('/admin/db/slow_queries', methods=['GET', 'POST'])
+@admin_required
+def admin_slow_queries():
+    """
+    [Admin] Consultas lentas capturadas por ESTE worker, com o plano do
+    EXPLAIN e os alertas (full scan, filesort, tabela temporária).
+    POST: Limpa o buffer.
+    """
+    if request.method == 'POST':
+        slow_query_log.clear()
+        flash('Buffer de consultas lentas limpo.', 'success')
+        return redirect(url_for('admin_slow_queries'))
+
+    return render_template('admin_slow_queries.html',
+                           consultas=slow_query_log.entries(),
+                           limite_ms=slow_query_log.threshold_ms)
+
+
+@app.route('/admin/db/slow_queries.json')
+@admin_required
+def admin_slow_queries_download():
+    """[Admin] Download do buffer de consultas lentas (JSON)."""
+    conteudo = json.dumps(slow_query_log.entries(), ensure_ascii=False, indent=2, default=str)
+    nome_arquivo = f"slow_queries_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    return current_app.response_class(
+        conteudo, mimetype='application/json',
+        headers={'Content-Disposition': f'attachment; filename={nome_arquivo}'})
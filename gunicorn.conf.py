@@ -0,0 +1,25 @@
+"""
+Configuração do Gunicorn (carregada automaticamente a partir da raiz do projeto).
+
+Apenas ganchos (hooks) de ciclo de vida dos workers; as demais opções
+(workers, threads, bind, --preload) continuam vindo da linha de comando.
+
+O pool de conexões do MySQL é criado preguiçosamente em cada worker
+(ver `Database._ensure_pool` em utils/db.py), então é seguro usar
+`--preload`: nenhum socket do processo mestre é compartilhado.
+"""
+
+
+def post_worker_init(worker):
+    """
+    Executado em cada worker logo após carregar a aplicação.
+
+    Se DB_POOL_WARMUP=N estiver definido, abre N conexões antes da primeira
+    requisição, eliminando o pico de latência após um deploy/reload.
+    """
+    from utils.db import db
+
+    try:
+        db.warm_up()
+    except Exception as e:
+        worker.log.warning(f"Aquecimento do pool de conexões falhou: {e}")
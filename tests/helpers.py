@@ -0,0 +1,118 @@
+"""Utilitários compartilhados pelos testes."""
+
+from utils.pool import ConnectionPool
+
+
+def login(client, **sessao):
+    """Abre uma sessão de teste (padrão: Administrador)."""
+    dados = {'colaborador_id': 1, 'colaborador_nome': 'Admin', 'colaborador_perfil': 'Administrador',
+             'colaborador_setor_id': 1}
+    dados.update(sessao)
+    with client.session_transaction() as s:
+        s.update(dados)
+
+
+class CursorFalso:
+    """
+    Cursor mínimo: registra as instruções na conexão e simula o AUTO_INCREMENT
+    (um INSERT multi-linha recebe IDs consecutivos; `lastrowid` é o primeiro).
+    SELECTs devolvem `conexao.linhas`.
+    """
+
+    def __init__(self, conexao, dictionary=False):
+        self.conexao = conexao
+        self.dictionary = dictionary
+        self.lastrowid = None
+        self.rowcount = -1
+        self.column_names = tuple(conexao.colunas)
+        self._pendentes = []
+
+    def execute(self, query, params=()):
+        self.conexao.executadas.append((query, tuple(params or ())))
+        if self.conexao.falha is not None:
+            raise self.conexao.falha
+        if query.lstrip()[:6].upper() == 'INSERT':
+            linhas = max(query.count('(%s'), 1)
+            if self.conexao.confirmar is not None:
+                linhas = min(linhas, self.conexao.confirmar)
+            self.lastrowid = self.conexao.proximo_id
+            self.conexao.proximo_id += linhas
+            self.rowcount = linhas
+        else:
+            self._pendentes = [dict(zip(self.column_names, l)) if self.dictionary else l
+                               for l in self.conexao.linhas]
+            self.rowcount = len(self._pendentes)
+
+    def executemany(self, query, seq_of_params):
+        total = 0
+        for params in seq_of_params:
+            self.execute(query, params)
+            total += self.rowcount
+        self.rowcount = total
+
+    def fetchone(self):
+        return self._pendentes.pop(0) if self._pendentes else None
+
+    def fetchall(self):
+        linhas, self._pendentes = self._pendentes, []
+        return linhas
+
+    def fetchmany(self, size):
+        linhas, self._pendentes = self._pendentes[:size], self._pendentes[size:]
+        return linhas
+
+    def close(self):
+        pass
+
+
+class ConexaoFalsa:
+    """
+    Conexão MySQL mínima: guarda o autocommit, conta commits/rollbacks e
+    registra as instruções executadas pelos seus cursores.
+
+    :ivar linhas: Tuplas devolvidas pelos SELECTs (colunas em `colunas`).
+    :ivar falha: Exceção levantada por toda instrução (None = sem falha).
+    :ivar confirmar: Limite de linhas que um INSERT "confirma" (None = todas).
+    """
+
+    def __init__(self):
+        self.autocommit = False
+        self.in_transaction = False
+        self.executadas = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.pings = 0
+        self.fechada = False
+        self.proximo_id = 1
+        self.linhas = []
+        self.colunas = ()
+        self.falha = None
+        self.confirmar = None
+
+    def cursor(self, dictionary=False, buffered=False, **kwargs):
+        return CursorFalso(self, dictionary)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+
+    def close(self):
+        self.fechada = True
+
+
+class PoolFalso(ConnectionPool):
+    """Pool que abre `ConexaoFalsa`s (guardadas em `abertas`)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.abertas = []
+
+    def _connect(self):
+        conexao = ConexaoFalsa()
+        self.abertas.append(conexao)
+        return conexao
@@ -0,0 +1,196 @@
+"""Testes dos caches LRU/TTL e da coalescência de cálculos (utils/cache.py)."""
+
+import threading
+import time
+
+import pytest
+
+from utils import cache as cache_module
+from utils.cache import MemoryCache, SingleFlight, SQLiteCache, create_cache, get_or_build
+
+
+class Relogio:
+    """Relógio controlado pelo teste (substitui `time` no módulo do cache)."""
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+    def time(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(cache_module, 'time', relogio)
+    return relogio
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def novo_cache(request, tmp_path):
+    """Fábrica de caches no backend do parâmetro."""
+    def criar(**opcoes):
+        if request.param == 'sqlite':
+            return SQLiteCache(str(tmp_path / 'cache.sqlite3'), **opcoes)
+        return MemoryCache(**opcoes)
+    return criar
+
+
+def test_descarta_a_entrada_usada_ha_mais_tempo(novo_cache, relogio):
+    cache = novo_cache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    relogio.agora += 1
+    cache.set('b', 2)
+    relogio.agora += 1
+    assert cache.get('a') == 1  # 'a' passa a ser a mais recente
+    relogio.agora += 1
+
+    cache.set('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.stats()['entries'] == 2
+
+
+def test_entrada_passa_de_fresca_a_vencida_e_expira(novo_cache, relogio):
+    cache = novo_cache(ttl=60, stale_ttl=30)
+    cache.set('chave', {'total': 5})
+
+    assert cache.get_entry('chave') == ({'total': 5}, False)
+
+    relogio.agora += 61
+    assert cache.get_entry('chave') == ({'total': 5}, True)
+    assert cache.get('chave') is None  # `get` só devolve entradas frescas
+
+    relogio.agora += 30
+    assert cache.get_entry('chave') is None
+
+
+def test_ttl_por_entrada(novo_cache, relogio):
+    cache = novo_cache(ttl=60)
+    cache.set('curta', 1, ttl=5)
+
+    relogio.agora += 6
+
+    assert cache.get('curta') is None
+
+
+def test_delete_e_clear(novo_cache, relogio):
+    cache = novo_cache()
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    cache.delete('a')
+    assert (cache.get('a'), cache.get('b')) == (None, 2)
+
+    cache.clear()
+    assert cache.get('b') is None
+
+
+def test_sqlite_e_compartilhado_entre_instancias(tmp_path):
+    # Cada worker abre o seu SQLiteCache sobre o mesmo arquivo.
+    caminho = str(tmp_path / 'cache.sqlite3')
+    SQLiteCache(caminho).set('dashboard', [1, 2, 3])
+
+    assert SQLiteCache(caminho).get('dashboard') == [1, 2, 3]
+
+
+def test_falha_do_sqlite_vira_falta_no_cache(tmp_path):
+    # O "arquivo" do cache é um diretório: o SQLite não consegue abri-lo.
+    cache = SQLiteCache(str(tmp_path))
+
+    cache.set('a', 1)
+
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] is None
+
+
+def test_create_cache_escolhe_o_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, 'SHARED_DIR', str(tmp_path))
+
+    assert isinstance(create_cache('teste', backend='memory'), MemoryCache)
+    assert create_cache('teste', backend='sqlite').path == str(tmp_path / 'cache_teste.sqlite3')
+    with pytest.raises(ValueError):
+        create_cache('teste', backend='redis')
+
+
+def chamar_em_paralelo(funcao, vezes):
+    """Roda `funcao()` em `vezes` threads e devolve os resultados (ou exceções)."""
+    resultados = [None] * vezes
+
+    def rodar(i):
+        try:
+            resultados[i] = funcao()
+        except Exception as e:
+            resultados[i] = e
+
+    threads = [threading.Thread(target=rodar, args=(i,)) for i in range(vezes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return resultados
+
+
+def calculo_lento(chamadas, resultado=None, erro=None):
+    """Cálculo que demora o bastante para as demais threads chegarem durante ele."""
+    def calcular():
+        chamadas.append(1)
+        time.sleep(0.1)
+        if erro is not None:
+            raise erro
+        return resultado
+    return calcular
+
+
+def test_single_flight_roda_um_calculo_para_chamadas_concorrentes():
+    flight = SingleFlight('teste')
+    chamadas = []
+    calcular = calculo_lento(chamadas, resultado={'total': 5})
+
+    resultados = chamar_em_paralelo(lambda: flight.do('chave', calcular), 8)
+
+    assert chamadas == [1]
+    assert resultados == [{'total': 5}] * 8
+
+
+def test_single_flight_repassa_a_excecao_a_quem_esperava():
+    flight = SingleFlight('teste')
+    chamadas = []
+    calcular = calculo_lento(chamadas, erro=RuntimeError('banco fora'))
+
+    resultados = chamar_em_paralelo(lambda: flight.do('chave', calcular), 4)
+
+    assert chamadas == [1]
+    assert all(isinstance(r, RuntimeError) for r in resultados)
+    # Terminado o cálculo, a chave fica livre para uma nova tentativa.
+    assert flight.do('chave', lambda: 'ok') == 'ok'
+
+
+def test_get_or_build_calcula_uma_vez_na_falta():
+    cache, flight, chamadas = MemoryCache(ttl=60), SingleFlight('teste'), []
+    calcular = calculo_lento(chamadas, resultado=[1, 2])
+
+    resultados = chamar_em_paralelo(lambda: get_or_build(cache, 'chave', calcular, flight), 6)
+
+    assert chamadas == [1]
+    assert resultados == [[1, 2]] * 6
+    assert cache.get('chave') == [1, 2]
+
+
+def test_get_or_build_serve_a_entrada_vencida_e_recalcula_em_segundo_plano(relogio):
+    cache, flight = MemoryCache(ttl=60, stale_ttl=60), SingleFlight('teste')
+    cache.set('chave', 'antigo')
+    relogio.agora += 61
+    recalculado = threading.Event()
+
+    def calcular():
+        recalculado.set()
+        return 'novo'
+
+    assert get_or_build(cache, 'chave', calcular, flight) == 'antigo'
+    assert recalculado.wait(timeout=5)
+    flight._executor.shutdown(wait=True)
+    assert cache.get('chave') == 'novo'
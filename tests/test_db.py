@@ -0,0 +1,229 @@
+"""Testes do `Database` (utils/db.py) sobre o pool de conexões falsas."""
+
+import time
+
+import mysql.connector
+import pytest
+
+import utils.db as db_module
+from utils.db import Database, db, _em_lotes, _executar_lote
+
+from helpers import ConexaoFalsa, PoolFalso
+
+INSERT_TAREFA = """
+    INSERT INTO tarefas (titulo, atribuido_para_id, data_criacao)
+    VALUES (%s, %s, NOW())
+"""
+
+
+def test_em_lotes_divide_pelo_tamanho():
+    assert list(_em_lotes(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_insert_simples_vira_um_insert_multilinha():
+    conexao = ConexaoFalsa()
+    conexao.proximo_id = 40
+
+    ids, linhas = _executar_lote(conexao.cursor(), INSERT_TAREFA, [('a', 1), ('b', 2), ('c', 3)])
+
+    assert ids == [40, 41, 42]
+    assert linhas == 3
+    (sql, params), = conexao.executadas
+    assert sql.count('NOW()') == 3
+    assert params == ('a', 1, 'b', 2, 'c', 3)
+
+
+def test_insert_nao_reescrevivel_roda_linha_a_linha():
+    # Com ON DUPLICATE KEY, o lastrowid de um lote não diz nada sobre as
+    # demais linhas: cada uma é executada e tem o seu próprio ID.
+    conexao = ConexaoFalsa()
+    conexao.proximo_id = 7
+    query = "INSERT INTO t (a) VALUES (%s) ON DUPLICATE KEY UPDATE a = VALUES(a)"
+
+    ids, linhas = _executar_lote(conexao.cursor(), query, [(1,), (2,), (3,)])
+
+    assert ids == [7, 8, 9]
+    assert linhas == 3
+    assert len(conexao.executadas) == 3
+
+
+@pytest.mark.parametrize('query', [
+    "INSERT IGNORE INTO t (a) VALUES (%s)",
+    "INSERT INTO t (a) SELECT a FROM u WHERE id = %s",
+])
+def test_outros_inserts_tambem_rodam_linha_a_linha(query):
+    conexao = ConexaoFalsa()
+
+    ids, _ = _executar_lote(conexao.cursor(), query, [(1,), (2,)])
+
+    assert ids == [1, 2]
+    assert len(conexao.executadas) == 2
+
+
+def test_insert_multilinha_sem_todas_as_linhas_levanta_erro():
+    conexao = ConexaoFalsa()
+    conexao.confirmar = 2  # O servidor confirmou menos linhas que o lote
+
+    with pytest.raises(mysql.connector.DatabaseError):
+        _executar_lote(conexao.cursor(), INSERT_TAREFA, [('a', 1), ('b', 2), ('c', 3)])
+
+
+def test_update_em_lote_nao_tem_ids():
+    conexao = ConexaoFalsa()
+
+    ids, _ = _executar_lote(conexao.cursor(), "UPDATE t SET a = %s WHERE id = %s", [(1, 1), (2, 2)])
+
+    assert ids == []
+    assert len(conexao.executadas) == 2
+
+
+def test_execute_many_faz_um_commit_por_lote(pool):
+    resultado = db.execute_many(INSERT_TAREFA, [(f"t{i}", i) for i in range(5)], chunk_size=2)
+
+    conexao, = pool.abertas
+    assert resultado.ids == [1, 2, 3, 4, 5]
+    assert resultado.rowcount == 5
+    assert len(conexao.executadas) == 3
+    assert conexao.commits == 3
+    assert pool.stats()['in_use'] == 0
+
+
+def test_execute_many_na_transacao_devolve_os_ids_em_ordem(pool):
+    with db.transaction() as tx:
+        ids = tx.execute_many(INSERT_TAREFA, [('a', 1), ('b', 2), ('c', 3)], chunk_size=2).ids
+
+    conexao, = pool.abertas
+    assert ids == [1, 2, 3]
+    assert conexao.commits == 1
+
+
+def test_transacao_confirma_uma_vez_no_fim_do_bloco(pool):
+    with db.transaction() as tx:
+        tx.execute("UPDATE tarefas SET status = %s WHERE id = %s", ('Concluída', 1))
+        tx.execute("DELETE FROM tarefas WHERE id = %s", (2,))
+
+    conexao, = pool.abertas
+    assert len(conexao.executadas) == 2
+    assert (conexao.commits, conexao.rollbacks) == (1, 0)
+    assert pool.stats()['in_use'] == 0
+
+
+def test_transacao_desfaz_tudo_se_o_bloco_falha(pool):
+    with pytest.raises(RuntimeError):
+        with db.transaction() as tx:
+            tx.execute("UPDATE tarefas SET status = %s WHERE id = %s", ('Concluída', 1))
+            raise RuntimeError('falha no meio do bloco')
+
+    conexao, = pool.abertas
+    assert (conexao.commits, conexao.rollbacks) == (0, 1)
+    assert pool.stats()['in_use'] == 0
+
+
+def test_erro_do_banco_na_transacao_sobe_sem_virar_none(pool):
+    with pytest.raises(mysql.connector.Error):
+        with db.transaction() as tx:
+            tx.execute("UPDATE tarefas SET status = %s WHERE id = %s", ('Concluída', 1))
+            pool.abertas[0].falha = mysql.connector.Error('falha simulada')
+            tx.execute("DELETE FROM tarefas WHERE id = %s", (2,))
+
+    conexao, = pool.abertas
+    assert (conexao.commits, conexao.rollbacks) == (0, 1)
+
+
+def test_insert_devolve_o_id_gerado(pool):
+    db.execute_query("UPDATE tarefas SET status = 'Pendente'")  # Abre a conexão do pool
+    conexao, = pool.abertas
+    conexao.proximo_id = 42
+
+    resultado = db.insert(INSERT_TAREFA, ('nova', 1))
+
+    assert (resultado.lastrowid, resultado.rowcount) == (42, 1)
+    assert conexao.commits == 2
+    assert pool.stats()['in_use'] == 0
+
+
+def test_insert_com_falha_devolve_none_e_desfaz(pool):
+    db.execute_query("UPDATE tarefas SET status = 'Pendente'")
+    conexao, = pool.abertas
+    conexao.falha = mysql.connector.Error('falha simulada')
+
+    assert db.insert(INSERT_TAREFA, ('nova', 1)) is None
+    assert conexao.rollbacks == 1
+    assert pool.stats()['in_use'] == 0
+
+
+def test_insert_na_transacao_devolve_o_id_sem_commit(pool):
+    with db.transaction() as tx:
+        primeiro = tx.insert(INSERT_TAREFA, ('a', 1))
+        segundo = tx.insert(INSERT_TAREFA, ('b', 1))
+        assert pool.abertas[0].commits == 0
+
+    assert (primeiro.lastrowid, segundo.lastrowid) == (1, 2)
+    assert pool.abertas[0].commits == 1
+
+
+@pytest.fixture
+def replica(pool, monkeypatch):
+    """Pool falso de réplica ao lado do pool primário do `pool`."""
+    replica = PoolFalso('replica', size=1, timeout=0.1, max_waiters=0, retry_after=7)
+    monkeypatch.setattr(Database, '_replica_pool', replica)
+    return replica
+
+
+def test_leituras_vao_para_a_replica(app, pool, replica):
+    with app.test_request_context():
+        db.execute_query("SELECT id FROM tarefas", fetch='all')
+
+    assert len(replica.abertas) == 1
+    assert pool.abertas == []
+
+
+def test_leituras_ficam_no_primario_logo_apos_uma_escrita(app, pool, replica, monkeypatch):
+    with app.test_request_context():
+        db.execute_query("UPDATE tarefas SET status = 'Pendente'")
+        db.execute_query("SELECT id FROM tarefas", fetch='all')
+        assert replica.abertas == []
+        assert len(pool.abertas[0].executadas) == 2
+
+        # Passada a janela, a leitura volta para a réplica.
+        monkeypatch.setattr(db_module, 'REPLICA_STICKY_SECONDS', 0)
+        db.execute_query("SELECT id FROM tarefas", fetch='all')
+        assert len(replica.abertas) == 1
+
+
+def test_replica_fora_do_ar_le_do_primario(app, pool, replica, monkeypatch):
+    def sem_conexao():
+        raise ConnectionError('réplica fora do ar')
+
+    monkeypatch.setattr(replica, '_connect', sem_conexao)
+
+    with app.test_request_context():
+        db.execute_query("SELECT id FROM tarefas", fetch='all')
+
+    assert len(pool.abertas) == 1
+
+
+def test_gather_devolve_na_ordem_das_tarefas():
+    def tarefa(valor, espera):
+        def executar():
+            time.sleep(espera)
+            return valor
+        return executar
+
+    # A primeira tarefa é a mais lenta: termina por último, mas vem primeiro.
+    assert db.gather(tarefa('a', 0.05), tarefa('b', 0.01), tarefa('c', 0)) == ['a', 'b', 'c']
+
+
+def test_gather_repassa_as_tuplas_ao_execute_query(monkeypatch):
+    monkeypatch.setattr(db, 'execute_query', lambda query, *args: (query, args), raising=False)
+
+    assert db.gather(("SELECT 1", None, 'one'), ("SELECT 2", (5,), 'all', 'tuple')) == [
+        ("SELECT 1", (None, 'one')), ("SELECT 2", ((5,), 'all', 'tuple'))]
+
+
+def test_gather_propaga_a_excecao_de_uma_tarefa():
+    def falha():
+        raise ValueError('falha na tarefa')
+
+    with pytest.raises(ValueError, match='falha na tarefa'):
+        db.gather(lambda: 1, falha)
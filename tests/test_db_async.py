@@ -0,0 +1,51 @@
+"""Testes do cliente assíncrono (utils/db_async.py), sem MySQL."""
+
+import asyncio
+import threading
+
+import pytest
+
+from utils.db import pool_esgotado_na_requisicao
+from utils.db_async import AsyncDatabase
+from utils.pool import PoolExhaustedError
+
+
+@pytest.fixture
+def async_db(monkeypatch):
+    """`AsyncDatabase` cujo `_executar` responde sem banco (e registra a thread)."""
+    banco = AsyncDatabase()
+    banco.threads = set()
+
+    async def executar(query, params, fetch):
+        banco.threads.add(threading.current_thread().name)
+        if query == 'falha':
+            raise RuntimeError('falha simulada')
+        if query == 'esgotado':
+            raise PoolExhaustedError('pool esgotado', 3)
+        await asyncio.sleep(params[0])
+        return query
+
+    monkeypatch.setattr(banco, '_executar', executar)
+    return banco
+
+
+def test_consultas_rodam_no_loop_de_fundo(async_db):
+    assert asyncio.run(async_db.execute_query('a', (0,), 'one')) == 'a'
+    assert async_db.threads == {'db-async-loop'}
+
+
+def test_gather_devolve_na_ordem_das_tarefas(async_db):
+    resultado = asyncio.run(async_db.gather(('lenta', (0.05,), 'one'), ('rapida', (0,), 'one')))
+
+    assert resultado == ['lenta', 'rapida']
+
+
+def test_erro_na_consulta_vira_none(async_db):
+    assert asyncio.run(async_db.execute_query('falha', None, 'all')) is None
+
+
+def test_pool_esgotado_sobe_e_marca_a_requisicao(app, async_db):
+    with app.test_request_context():
+        with pytest.raises(PoolExhaustedError):
+            asyncio.run(async_db.execute_query('esgotado', None, 'all'))
+        assert pool_esgotado_na_requisicao() is not None
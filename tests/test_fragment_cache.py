@@ -0,0 +1,49 @@
+"""Testes do cache de fragmentos de template (utils/fragment_cache.py)."""
+
+from utils import fragment_cache
+from utils.permissions import permissions
+
+
+def renderizar(app, fonte, **contexto):
+    return app.jinja_env.from_string(fonte).render(**contexto)
+
+
+def test_fragmento_guardado_nao_e_renderizado_de_novo(app):
+    chamadas = []
+    fonte = "{% cache ('teste-simples', 1) %}{{ contar() }}{% endcache %}"
+    contar = lambda: chamadas.append(1) or len(chamadas)  # noqa: E731
+
+    assert renderizar(app, fonte, contar=contar) == '1'
+    assert renderizar(app, fonte, contar=contar) == '1'
+    assert len(chamadas) == 1
+
+
+def test_menu_muda_com_a_matriz_de_permissoes(app):
+    chamadas = []
+    fonte = "{% cache ('teste-menu', 'Gestor', permissions_version()) %}{{ contar() }}{% endcache %}"
+    contar = lambda: chamadas.append(1) or len(chamadas)  # noqa: E731
+
+    assert renderizar(app, fonte, contar=contar) == '1'
+    permissions.invalidate()  # Ex: `flask reload-permissions`
+    assert renderizar(app, fonte, contar=contar) == '2'
+
+
+def test_invalidate_user_descarta_so_os_fragmentos_do_usuario(app):
+    chamadas = []
+    fonte = "{% cache ('teste-usuario', uid, fragment_version(uid)) %}{{ contar() }}{% endcache %}"
+    contar = lambda: chamadas.append(1) or len(chamadas)  # noqa: E731
+
+    assert renderizar(app, fonte, uid=10, contar=contar) == '1'
+    assert renderizar(app, fonte, uid=11, contar=contar) == '2'
+
+    fragment_cache.invalidate_user(10)  # Ex: troca da foto de perfil
+
+    assert renderizar(app, fonte, uid=10, contar=contar) == '3'
+    assert renderizar(app, fonte, uid=11, contar=contar) == '2'
+
+
+def test_html_do_fragmento_nao_e_escapado_de_novo(app):
+    fonte = "{% cache ('teste-html',) %}<b>{{ nome }}</b>{% endcache %}"
+
+    assert renderizar(app, fonte, nome='<i>') == '<b>&lt;i&gt;</b>'
+    assert renderizar(app, fonte, nome='<i>') == '<b>&lt;i&gt;</b>'
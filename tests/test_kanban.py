@@ -0,0 +1,67 @@
+"""Testes das APIs do kanban."""
+
+import mysql.connector
+import pytest
+
+from utils.reference_data import reference_data
+
+from helpers import ConexaoFalsa, login
+
+
+def test_kanban_master_devolve_lista_vazia_se_o_banco_falha(client, pool, monkeypatch, caplog):
+    def cursor_com_falha(self, *args, **kwargs):
+        raise mysql.connector.Error('falha simulada')
+
+    monkeypatch.setattr(ConexaoFalsa, 'cursor', cursor_com_falha, raising=False)
+
+    resposta = client.get('/api/kanban/master')
+
+    assert resposta.status_code == 200
+    assert resposta.get_json() == []
+    assert pool.stats()['in_use'] == 0
+    erro, = [r for r in caplog.records if r.getMessage() == 'Erro ao montar o kanban master']
+    assert erro.exc_info is not None
+
+
+@pytest.mark.parametrize('url', ['/api/kanban/setores', '/api/kanban/tipos_atendimento',
+                                 '/api/kanban/todos_colaboradores'])
+def test_falha_no_banco_nao_recebe_etag(client, pool, monkeypatch, url):
+    def cursor_com_falha(self, *args, **kwargs):
+        raise mysql.connector.Error('falha simulada')
+
+    monkeypatch.setattr(ConexaoFalsa, 'cursor', cursor_com_falha, raising=False)
+    reference_data.clear()
+
+    resposta = client.get(url)
+
+    assert resposta.status_code == 200
+    assert resposta.get_json() == []
+    assert 'ETag' not in resposta.headers
+    assert resposta.headers['Cache-Control'] == 'no-store'
+
+
+def test_lista_de_setores_recebe_etag_e_304(client, fake_db):
+    fake_db.responses = {'FROM setores s': [{'nome': 'Suporte', 'qtd_colaboradores': 3}]}
+
+    resposta = client.get('/api/kanban/setores')
+    assert resposta.get_json() == [{'nome': 'Suporte', 'qtd_colaboradores': 3}]
+    etag = resposta.headers['ETag']
+
+    fake_db.reset()
+    resposta = client.get('/api/kanban/setores', headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+    assert fake_db.query_count == 0
+
+
+def test_etag_de_um_usuario_nao_vale_para_outro(client, fake_db):
+    fake_db.responses = {'FROM setores s': [{'nome': 'Suporte', 'qtd_colaboradores': 3}]}
+    login(client, colaborador_id=1)
+    etag = client.get('/api/kanban/setores').headers['ETag']
+
+    login(client, colaborador_id=2)
+    fake_db.reset()
+    resposta = client.get('/api/kanban/setores', headers={'If-None-Match': etag})
+
+    assert resposta.status_code == 200
+    assert resposta.headers['ETag'] != etag
+    assert fake_db.query_count == 1
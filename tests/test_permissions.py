@@ -0,0 +1,49 @@
+"""Testes do `permission_required` (app/decorators.py)."""
+
+from helpers import login
+
+MATRIZ = [{'perfil': 'Administrador', 'permissao': 'editar_atividade'}]
+
+
+def test_perfil_vem_do_banco_e_nao_da_sessao(client, fake_db):
+    # Rebaixado a Colaborador depois do login: a sessão ainda diz Administrador.
+    fake_db.responses = {
+        'FROM colaboradores AS c': {'id': 1, 'nome_perfil': 'Colaborador', 'status': 'Ativo', 'setor_id': 1},
+        'FROM perfil_permissoes': MATRIZ,
+    }
+    login(client)
+
+    resposta = client.get('/editar_atividade/1')
+
+    # Negado antes de buscar a atividade.
+    assert resposta.status_code == 302
+    assert not any('FROM atividades' in c.sql for c in fake_db.calls)
+
+
+def test_perfil_com_permissao_acessa(client, fake_db):
+    fake_db.responses = {
+        'FROM colaboradores AS c': {'id': 1, 'nome_perfil': 'Administrador', 'status': 'Ativo', 'setor_id': 1},
+        'FROM perfil_permissoes': MATRIZ,
+        'FROM atividades WHERE id': None,
+    }
+    login(client, colaborador_perfil='Colaborador')
+
+    resposta = client.get('/editar_atividade/1')
+
+    # Passou pela permissão e caiu no "atividade não encontrada".
+    assert resposta.status_code == 302
+    assert any('FROM atividades' in c.sql for c in fake_db.calls)
+
+
+def test_usuario_inativado_perde_as_permissoes(client, fake_db):
+    # Administrador inativado depois do login: a sessão continua válida.
+    fake_db.responses = {
+        'FROM colaboradores AS c': {'id': 1, 'nome_perfil': 'Administrador', 'status': 'Inativo', 'setor_id': 1},
+        'FROM perfil_permissoes': MATRIZ,
+    }
+    login(client)
+
+    resposta = client.get('/editar_atividade/1')
+
+    assert resposta.status_code == 302
+    assert not any('FROM atividades' in c.sql for c in fake_db.calls)
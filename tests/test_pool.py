@@ -0,0 +1,160 @@
+"""Testes do pool de conexões e da afinidade conexão/requisição (utils/pool.py, utils/db.py)."""
+
+import mysql.connector
+
+from utils import db as db_module
+from utils.db import Database, db
+
+from helpers import ConexaoFalsa, PoolFalso, login
+
+
+def conexao_ociosa(pool, ociosa=0, criada=0):
+    """Empresta e devolve uma conexão, como se estivesse ociosa/aberta há tantos segundos."""
+    conn = pool.get_connection()
+    entry = conn.entry
+    conn.close()
+    entry.last_used -= ociosa
+    entry.created_at -= criada
+    return entry.raw
+
+
+def test_atribuicao_no_proxy_chega_a_conexao_real(pool):
+    conn = pool.get_connection()
+    conn.autocommit = True
+    assert conn.entry.raw.autocommit is True
+    assert 'autocommit' not in vars(conn)
+    conn.close()
+
+
+def test_conexao_da_requisicao_fica_em_autocommit_e_e_restaurada(app, pool, monkeypatch):
+    monkeypatch.setattr(db_module, 'REQUEST_AFFINITY', True)
+    db = Database()
+
+    with app.test_request_context('/'):
+        vinculada = db._conexao(leitura=True)
+        raw = vinculada._conn.entry.raw
+        assert raw.autocommit is True
+
+        db.release_request_connections()
+        assert raw.autocommit is False
+
+    assert pool.stats()['in_use'] == 0
+
+
+def test_pool_esgotado_vira_503_mesmo_em_rota_com_except_generico(client, pool):
+    # A rota trata qualquer Exception como 500 JSON; o pool esgotado precisa passar.
+    login(client)
+    ocupada = pool.get_connection()
+    try:
+        resposta = client.get('/api/colaboradores_setor?setor=TI')
+    finally:
+        ocupada.close()
+
+    assert resposta.status_code == 503
+    assert resposta.headers['Retry-After'] == '7'
+
+
+def test_pool_esgotado_vira_503_em_rota_que_responde_lista_vazia(client, pool):
+    # `api_get_todos_colaboradores` responde `200 []` em qualquer falha.
+    login(client)
+    ocupada = pool.get_connection()
+    try:
+        resposta = client.get('/api/kanban/todos_colaboradores')
+    finally:
+        ocupada.close()
+
+    assert resposta.status_code == 503
+    assert resposta.headers['Retry-After'] == '7'
+
+
+def test_pool_esgotado_descarta_a_mensagem_de_erro_da_rota(client, pool):
+    # POST do registro de atividade: o except genérico faz flash + redirect.
+    login(client, colaborador_perfil='Colaborador')
+    ocupada = pool.get_connection()
+    try:
+        resposta = client.post('/registrar', data={'tipo_atendimento': '1', 'status': 'Finalizado',
+                                                   'data_atendimento': '2026-01-01', 'descricao': 'x'})
+    finally:
+        ocupada.close()
+
+    assert resposta.status_code == 503
+    with client.session_transaction() as sessao:
+        assert '_flashes' not in sessao
+
+
+def test_conexao_ociosa_recebe_ping_antes_do_emprestimo():
+    pool = PoolFalso('teste', size=1, timeout=0.1, max_waiters=0, retry_after=7, pre_ping_after=30)
+    raw = conexao_ociosa(pool, ociosa=60)
+
+    conn = pool.get_connection()
+
+    assert conn.entry.raw is raw
+    assert raw.pings == 1
+    conn.close()
+
+
+def test_conexao_usada_ha_pouco_nao_recebe_ping():
+    pool = PoolFalso('teste', size=1, timeout=0.1, max_waiters=0, retry_after=7, pre_ping_after=30)
+    raw = conexao_ociosa(pool, ociosa=5)
+
+    pool.get_connection().close()
+
+    assert raw.pings == 0
+
+
+def test_conexao_sem_resposta_ao_ping_e_reaberta(monkeypatch):
+    pool = PoolFalso('teste', size=1, timeout=0.1, max_waiters=0, retry_after=7, pre_ping_after=30)
+    morta = conexao_ociosa(pool, ociosa=60)
+
+    def ping_sem_resposta(reconnect=False):
+        raise mysql.connector.errors.InterfaceError('servidor sumiu')
+
+    monkeypatch.setattr(morta, 'ping', ping_sem_resposta)
+
+    conn = pool.get_connection()
+
+    assert conn.entry.raw is not morta and morta.fechada
+    stats = pool.stats()
+    assert (stats['ping_failures'], stats['open']) == (1, 1)
+    conn.close()
+
+
+def test_conexao_velha_demais_e_reciclada():
+    pool = PoolFalso('teste', size=1, timeout=0.1, max_waiters=0, retry_after=7, max_age=3600)
+    velha = conexao_ociosa(pool, criada=7200)
+
+    conn = pool.get_connection()
+
+    assert conn.entry.raw is not velha and velha.fechada
+    assert pool.stats()['recycled'] == 1
+    conn.close()
+
+
+def test_leitura_em_conexao_perdida_e_repetida_numa_nova(pool, monkeypatch):
+    cursor_original = ConexaoFalsa.cursor
+
+    def cursor(self, *args, **kwargs):
+        # A primeira conexão aberta "caiu" (ex: wait_timeout do servidor).
+        if self is pool.abertas[0]:
+            self.falha = mysql.connector.errors.OperationalError('Lost connection', errno=2013)
+        return cursor_original(self, *args, **kwargs)
+
+    monkeypatch.setattr(ConexaoFalsa, 'cursor', cursor)
+
+    assert db.execute_query("SELECT id FROM tarefas", fetch='all') == []
+    assert len(pool.abertas) == 2
+    assert pool.stats()['in_use'] == 0
+
+
+def test_escrita_em_conexao_perdida_nao_e_repetida(pool, monkeypatch):
+    cursor_original = ConexaoFalsa.cursor
+
+    def cursor(self, *args, **kwargs):
+        self.falha = mysql.connector.errors.OperationalError('Lost connection', errno=2013)
+        return cursor_original(self, *args, **kwargs)
+
+    monkeypatch.setattr(ConexaoFalsa, 'cursor', cursor)
+
+    assert db.execute_query("UPDATE tarefas SET status = 'Pendente'") is None
+    assert len(pool.abertas) == 1
+    assert pool.stats()['open'] == 0
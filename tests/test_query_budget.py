@@ -0,0 +1,64 @@
+import pytest
+
+from app.commands import BUDGETS
+from utils.query_budget import Budget, RecordingDatabase, run_budgets
+
+
+@pytest.mark.parametrize('budget', BUDGETS, ids=lambda b: b.name)
+def test_rota_dentro_do_orcamento(app, budget):
+    resultado, = run_budgets(app, [budget])
+
+    consultas = '\n'.join(f"[{c.kind}] {c.sql[:120]}" for c in resultado.calls)
+    assert resultado.status_code == budget.status, consultas
+    assert resultado.queries <= budget.max_queries, consultas
+    if budget.max_rows is not None:
+        assert resultado.rows <= budget.max_rows, consultas
+
+
+def test_status_diferente_do_esperado_reprova(app):
+    # Sem sessão, a rota redireciona para o login (e não faz consultas).
+    resultado, = run_budgets(app, [Budget('historico sem login', '/historico', {}, max_queries=5)])
+
+    assert resultado.status_code == 302
+    assert not resultado.ok
+
+
+def test_rotas_async_sao_contadas(app):
+    fake = RecordingDatabase()
+    resultado, = run_budgets(app, [Budget('contar', '/api/notificacoes/contar', {'colaborador_id': 3},
+                                          max_queries=1)], fake)
+
+    assert [c.kind for c in resultado.calls] == ['async']
+
+
+def test_resposta_do_cenario_substitui_a_resposta_base(app):
+    # O `fake` diz que a atividade existe; o cenário diz que não.
+    fake = RecordingDatabase({'FROM atividades WHERE id': {'id': 5}})
+    budget = Budget('nao encontrada', '/editar_atividade/5', {'colaborador_id': 1}, max_queries=4, status=302,
+                    responses={
+                        'FROM colaboradores AS c': {'nome_perfil': 'Administrador', 'status': 'Ativo'},
+                        'FROM perfil_permissoes': [{'perfil': 'Administrador', 'permissao': 'editar_atividade'}],
+                        'FROM atividades WHERE id': None,
+                    })
+
+    resultado, = run_budgets(app, [budget], fake)
+
+    assert resultado.ok
+    atividade, = [c for c in resultado.calls if 'FROM atividades' in c.sql]
+    assert atividade.rows == 0
+    assert fake.responses == {'FROM atividades WHERE id': {'id': 5}}  # Restaurado ao final
+
+
+def test_trecho_do_cenario_e_testado_antes_do_trecho_base(app):
+    fake = RecordingDatabase({'FROM atividades': {'id': 5}})
+    budget = Budget('mais especifico', '/editar_atividade/5', {'colaborador_id': 1}, max_queries=4, status=302,
+                    responses={
+                        'FROM colaboradores AS c': {'nome_perfil': 'Administrador', 'status': 'Ativo'},
+                        'FROM perfil_permissoes': [{'perfil': 'Administrador', 'permissao': 'editar_atividade'}],
+                        'FROM atividades WHERE id': None,
+                    })
+
+    resultado, = run_budgets(app, [budget], fake)
+
+    atividade, = [c for c in resultado.calls if 'FROM atividades' in c.sql]
+    assert atividade.rows == 0
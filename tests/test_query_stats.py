@@ -0,0 +1,40 @@
+"""Testes das métricas de banco por requisição (utils/query_stats.py)."""
+
+from utils import query_stats
+from utils.db import db
+from utils.query_stats import RequestQueryStats, fingerprint
+
+
+def test_fingerprint_agrupa_consultas_iguais():
+    assert fingerprint("SELECT * FROM t WHERE id = 7 AND nome = 'Ana'") == \
+        fingerprint("SELECT *  FROM t\n WHERE id = %s AND nome = %s") == \
+        "SELECT * FROM t WHERE id = ? AND nome = ?"
+    assert fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3)") == "SELECT * FROM t WHERE id IN (?+)"
+
+
+def test_repeticoes_acima_do_limite_sao_suspeitas_de_n_mais_1():
+    stats = RequestQueryStats()
+    for i in range(3):
+        stats.record(f"SELECT * FROM tarefas WHERE id = {i}", 0.001)
+    stats.record("SELECT COUNT(*) FROM setores", 0.004)
+
+    assert stats.count == 4
+    assert stats.slowest_query == "SELECT COUNT(*) FROM setores"
+    assert stats.repeated(threshold=3) == {"SELECT * FROM tarefas WHERE id = ?": 3}
+
+
+def test_consultas_da_requisicao_sao_contadas(app, pool):
+    with app.test_request_context():
+        query_stats.start_request()
+        db.execute_query("SELECT id FROM tarefas", fetch='all')
+        db.execute_query("UPDATE tarefas SET status = 'Pendente'")
+
+        stats = query_stats.current()
+        assert stats.count == 2
+        assert 'desc="2 queries"' in stats.server_timing()
+
+
+def test_resposta_recebe_o_cabecalho_server_timing(client, fake_db):
+    resposta = client.get('/login')
+
+    assert resposta.headers['Server-Timing'].startswith('db;dur=')
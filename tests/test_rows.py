@@ -0,0 +1,85 @@
+"""Testes dos formatos compactos de linhas (utils/rows.py)."""
+
+import timeit
+
+import pytest
+
+from utils.db import db
+from utils.rows import Columns, Rows, format_rows, record_class
+
+COLUNAS = ('id', 'titulo', 'COUNT(*)')
+LINHAS = [(1, 'a', 3), (2, 'b', 0)]
+
+
+def test_tuple_compartilha_o_indice_das_colunas():
+    linhas = format_rows(LINHAS, COLUNAS, 'tuple')
+
+    assert isinstance(linhas, Rows)
+    assert linhas == LINHAS
+    assert linhas[1][linhas.index['titulo']] == 'b'
+
+
+def test_record_da_acesso_por_atributo_e_por_posicao():
+    primeira, segunda = format_rows(LINHAS, COLUNAS, 'record')
+
+    assert (primeira.id, primeira.titulo) == (1, 'a')
+    assert primeira._2 == 3  # 'COUNT(*)' não é um identificador válido
+    assert segunda == (2, 'b', 0)
+    assert type(primeira)._fields == ('id', 'titulo', '_2')
+    assert repr(primeira) == "Record(id=1, titulo='a', _2=3)"
+
+
+def test_record_nao_aceita_atributos_novos():
+    registro, = format_rows(LINHAS[:1], COLUNAS, 'record')
+
+    with pytest.raises(AttributeError):
+        registro.outro = 1
+
+
+def test_classe_de_registro_e_reaproveitada_por_colunas():
+    assert record_class(COLUNAS) is record_class(list(COLUNAS))
+    assert record_class(COLUNAS) is not record_class(('id',))
+
+
+def test_columns_conta_linhas_e_nao_colunas():
+    resultado = format_rows(LINHAS, COLUNAS, 'columns')
+
+    assert isinstance(resultado, Columns)
+    assert resultado['titulo'] == ['a', 'b']
+    assert len(resultado) == 2
+    assert not format_rows([], COLUNAS, 'columns')
+
+
+def test_formato_invalido_levanta_erro():
+    with pytest.raises(ValueError):
+        format_rows(LINHAS, COLUNAS, 'xml')
+    with pytest.raises(ValueError):
+        db.execute_query("SELECT 1", fetch='all', row_format='xml')
+
+
+def test_execute_query_aplica_o_formato(pool):
+    db.execute_query("UPDATE tarefas SET status = 'Concluída'")  # Abre a conexão do pool
+    conexao, = pool.abertas
+    conexao.colunas, conexao.linhas = COLUNAS, LINHAS
+
+    assert db.execute_query("SELECT id, titulo, COUNT(*) FROM tarefas", fetch='one', row_format='record').titulo == 'a'
+    assert db.execute_query("SELECT id, titulo, COUNT(*) FROM tarefas", fetch='all', row_format='tuple').index['id'] == 0
+    assert db.execute_query("SELECT id, titulo, COUNT(*) FROM tarefas", fetch='all', row_format='columns')['id'] == [1, 2]
+
+
+def test_montar_registros_nao_e_mais_lento_que_dicionarios():
+    # O cursor `dictionary=True` monta um dict(zip(colunas, linha)) por linha;
+    # o registro tem de custar no máximo isso (melhor de 5 medições).
+    colunas = tuple(f"coluna_{i}" for i in range(8))
+    linhas = [tuple(range(i, i + 8)) for i in range(2000)]
+
+    def como_dicts():
+        return [dict(zip(colunas, linha)) for linha in linhas]
+
+    def como_registros():
+        return format_rows(linhas, colunas, 'record')
+
+    tempo_dicts = min(timeit.repeat(como_dicts, number=20, repeat=5))
+    tempo_registros = min(timeit.repeat(como_registros, number=20, repeat=5))
+
+    assert tempo_registros <= tempo_dicts
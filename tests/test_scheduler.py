@@ -0,0 +1,23 @@
+"""Testes do agendador (utils/scheduler.py)."""
+
+from utils.scheduler import PeriodicJob
+
+
+def test_so_um_processo_e_lider(tmp_path):
+    trava = str(tmp_path / 'locks' / 'job.lock')
+    # Cada job abre o seu próprio arquivo: como dois workers disputando a trava.
+    lider = PeriodicJob('job', lambda: None, interval=60, lock_path=trava)
+    outro = PeriodicJob('job', lambda: None, interval=60, lock_path=trava)
+
+    assert lider.is_leader()
+    assert not outro.is_leader()
+    assert lider.is_leader()  # Continua líder nas próximas rodadas
+
+    # O líder saiu (ex: worker reciclado): o outro assume.
+    lider._lock_file.close()
+    assert outro.is_leader()
+    outro._lock_file.close()
+
+
+def test_sem_trava_todo_processo_executa():
+    assert PeriodicJob('job', lambda: None, interval=60).is_leader()
@@ -0,0 +1,89 @@
+"""Testes do log de consultas lentas (utils/slow_queries.py)."""
+
+import json
+
+from utils.slow_queries import SlowQueryLog, analyze_plan
+
+PLANO = {'query_block': {'ordering_operation': {
+    'using_filesort': True,
+    'table': {'table_name': 'atividades', 'access_type': 'ALL'},
+}}}
+
+
+def aguardar_explains(log):
+    """A fila do EXPLAIN tem uma só thread: uma tarefa vazia roda depois das demais."""
+    log._get_executor().submit(lambda: None).result()
+
+
+def test_plano_marca_full_scan_e_filesort():
+    assert analyze_plan(PLANO) == ['filesort', 'full_scan:atividades']
+
+
+def test_consulta_rapida_nao_entra_no_log():
+    log = SlowQueryLog(explain=lambda query, params: json.dumps(PLANO), threshold_ms=100)
+
+    log.record("SELECT * FROM atividades", None, 0.05)
+
+    assert log.entries() == []
+
+
+def test_consulta_lenta_recebe_o_explain_em_segundo_plano():
+    log = SlowQueryLog(explain=lambda query, params: json.dumps(PLANO), threshold_ms=100)
+
+    log.record("SELECT * FROM atividades WHERE id = %s", (7,), 0.25)
+    aguardar_explains(log)
+
+    entrada, = log.entries()
+    assert entrada['duration_ms'] == 250.0
+    assert entrada['fingerprint'] == "SELECT * FROM atividades WHERE id = ?"
+    assert entrada['params'] == ['7']
+    assert entrada['plan'] == PLANO
+    assert entrada['flags'] == ['filesort', 'full_scan:atividades']
+
+
+def test_explain_roda_uma_vez_por_fingerprint():
+    chamadas = []
+
+    def explain(query, params):
+        chamadas.append(params)
+        return json.dumps(PLANO)
+
+    log = SlowQueryLog(explain=explain, threshold_ms=100)
+    log.record("SELECT * FROM atividades WHERE id = %s", (1,), 0.2)
+    aguardar_explains(log)
+    log.record("SELECT * FROM atividades WHERE id = %s", (2,), 0.2)
+    aguardar_explains(log)
+
+    assert chamadas == [(1,)]
+    assert [e['flags'] for e in log.entries()] == [['filesort', 'full_scan:atividades']] * 2
+
+
+def test_insert_lento_nao_passa_pelo_explain():
+    chamadas = []
+    log = SlowQueryLog(explain=lambda query, params: chamadas.append(query), threshold_ms=100)
+
+    log.record("INSERT INTO tarefas (titulo) VALUES (%s)", ('a',), 0.2)
+    aguardar_explains(log)
+
+    assert chamadas == []
+    assert log.entries()[0]['plan'] is None
+
+
+def test_falha_no_explain_fica_registrada_na_entrada():
+    def explain(query, params):
+        raise RuntimeError('sem permissão')
+
+    log = SlowQueryLog(explain=explain, threshold_ms=100)
+    log.record("SELECT * FROM atividades", None, 0.2)
+    aguardar_explains(log)
+
+    assert log.entries()[0]['explain_error'] == 'sem permissão'
+
+
+def test_buffer_guarda_so_as_mais_recentes():
+    log = SlowQueryLog(explain=lambda query, params: json.dumps({}), threshold_ms=100, capacity=2)
+
+    for tabela in ('a', 'b', 'c'):
+        log.record(f"INSERT INTO {tabela} VALUES (1)", None, 0.2)
+
+    assert [e['sql'] for e in log.entries()] == ["INSERT INTO c VALUES (1)", "INSERT INTO b VALUES (1)"]
@@ -0,0 +1,27 @@
+"""Testes do cache de bytecode e da pré-compilação dos templates (app/__init__.py)."""
+
+import os
+
+import pytest
+
+from app import JINJA_CACHE_DIR, precompile_templates
+
+
+def test_precompilacao_carrega_todos_os_templates(app):
+    nomes = app.jinja_env.list_templates(extensions=['html'])
+
+    assert precompile_templates() == len(nomes) > 0
+    assert any(arquivo.endswith('.cache') for arquivo in os.listdir(JINJA_CACHE_DIR))
+
+
+def test_novo_worker_carrega_o_bytecode_sem_recompilar(app, monkeypatch):
+    precompile_templates()
+    # Um ambiente novo (como o de outro worker) sobre o mesmo cache em disco.
+    ambiente = app.create_jinja_environment()
+
+    def compilar(*args, **kwargs):
+        pytest.fail('template recompilado apesar do bytecode em cache')
+
+    monkeypatch.setattr(ambiente, 'compile', compilar)
+
+    assert ambiente.get_template('login.html') is not None
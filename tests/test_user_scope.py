@@ -0,0 +1,47 @@
+"""Testes do escopo do usuário (utils/user_scope.py)."""
+
+from utils.user_scope import user_scopes
+
+from helpers import login
+
+GESTOR_SEM_SETOR = {'id': 2, 'nome': 'Gestor Novo', 'nome_perfil': 'Gestor', 'status': 'Ativo',
+                    'setor_id': None, 'nome_setor': None, 'nome_gestor': None}
+
+
+def test_colaborador_sem_setor_tem_escopo(fake_db):
+    fake_db.responses = {
+        'FROM colaboradores AS c': {'id': 3, 'nome': 'Novo', 'nome_perfil': 'Colaborador', 'status': 'Ativo',
+                                    'setor_id': None, 'nome_setor': None, 'nome_gestor': None},
+        'FROM setores WHERE gestor_id': [],
+    }
+
+    escopo = user_scopes.get(3)
+
+    assert escopo is not None
+    assert escopo.colaborador_id == 3
+    assert escopo.perfil == 'Colaborador'
+    assert escopo.setor_id is None and escopo.nome_setor is None
+    assert escopo.setores_visiveis == set()
+
+
+def test_gestor_sem_setor_tem_escopo(fake_db):
+    fake_db.responses = {
+        'FROM colaboradores AS c': GESTOR_SEM_SETOR,
+        'FROM setores WHERE gestor_id': [{'id': 5, 'nome_setor': 'Suporte'}],
+    }
+
+    escopo = user_scopes.get(2)
+
+    assert escopo.perfil == 'Gestor'
+    assert escopo.nome_setor is None
+    assert escopo.setores_visiveis == {5}
+
+
+def test_perfil_de_gestor_sem_setor(client, fake_db):
+    fake_db.responses = {'FROM colaboradores AS c': GESTOR_SEM_SETOR}
+    login(client, colaborador_id=2, colaborador_perfil='Gestor', colaborador_setor_id=None)
+
+    resposta = client.get('/perfil')
+
+    assert resposta.status_code == 200
+    assert 'Sem setor' in resposta.get_data(as_text=True)
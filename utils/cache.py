@@ -0,0 +1,317 @@
+"""
+Módulo de Cache Chave/Valor com Limite de Tamanho (LRU) e Validade (TTL).
+
+Dois backends com a mesma interface (get/set/delete/clear/stats):
+
+1. `MemoryCache`: na memória do processo (OrderedDict). O mais rápido, mas
+   cada worker do Gunicorn tem o seu: com N workers, a taxa de acerto cai.
+2. `SQLiteCache`: um arquivo SQLite (modo WAL) no diretório compartilhado
+   (APP_SHARED_DIR, o mesmo dos carimbos de versão). Todos os workers da
+   máquina leem e escrevem as mesmas entradas. Os valores são serializados
+   com pickle.
+
+Ambos descartam as entradas usadas há mais tempo ao passar de
+`max_entries`. Uma entrada é "fresca" até o TTL; depois disso, durante mais
+`stale_ttl` segundos, ela ainda pode ser servida "vencida" (stale) enquanto
+é recalculada em segundo plano (`get_entry` + `get_or_build`).
+
+A escolha é feita pela variável de ambiente CACHE_BACKEND ('memory', o
+padrão, ou 'sqlite'):
+    dashboard_cache = create_cache('dashboard', max_entries=500, ttl=3600, stale_ttl=3600)
+
+`SingleFlight` evita o "estouro de boiada": várias requisições que erram o
+cache na mesma chave ao mesmo tempo esperam UM único cálculo (por processo).
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.versions import SHARED_DIR
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+
+
+class MemoryCache:
+    """
+    Cache LRU + TTL na memória do processo (thread-safe).
+
+    O valor devolvido é o MESMO objeto guardado: quem precisar alterá-lo
+    deve trabalhar numa cópia.
+    """
+
+    def __init__(self, max_entries=1000, ttl=300, stale_ttl=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # chave -> (fresca_ate, expira_em, valor)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_entry(self, key):
+        """
+        Entrada da chave como (valor, vencida), ou None se não existe ou
+        passou também da janela de `stale_ttl`.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entries.get(key)
+            if entrada is None or entrada[1] <= agora:
+                if entrada is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entrada[2], entrada[0] <= agora
+
+    def get(self, key):
+        """Valor da chave, ou None se não existe ou não está mais fresca."""
+        entrada = self.get_entry(key)
+        return None if entrada is None or entrada[1] else entrada[0]
+
+    def set(self, key, value, ttl=None):
+        """Guarda o valor (fresco por `ttl` segundos; padrão: o do cache)."""
+        fresca_ate = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (fresca_ate, fresca_ate + self.stale_ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self._hits, 'misses': self._misses}
+
+
+class SQLiteCache:
+    """
+    Cache LRU + TTL num arquivo SQLite, compartilhado entre processos.
+
+    Uma conexão por thread (e por processo, após fork). Qualquer erro do
+    SQLite é logado e tratado como "não está no cache": o cache nunca
+    derruba a rota.
+    """
+
+    def __init__(self, path, max_entries=1000, ttl=300, stale_ttl=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._local = threading.local()
+        self._hits = 0
+        self._misses = 0
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # isolation_level=None: cada instrução é sua própria transação (autocommit).
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    fresh_until REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_last_access ON cache_entries (last_access)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get_entry(self, key):
+        """
+        Entrada da chave como (valor, vencida), ou None se não existe, passou
+        da janela de `stale_ttl` ou o SQLite falhou.
+        """
+        agora = time.time()  # Relógio de parede: comparável entre processos
+        try:
+            conn = self._conexao()
+            linha = conn.execute("SELECT value, fresh_until, expires_at FROM cache_entries WHERE key = ?",
+                                 (key,)).fetchone()
+            if linha is None or linha[2] <= agora:
+                self._misses += 1
+                return None
+            conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (agora, key))
+            valor = pickle.loads(linha[0])
+        except Exception as e:
+            logging.warning(f"⚠️ Falha ao ler o cache '{self.path}' ({key}): {e}")
+            self._misses += 1
+            return None
+        self._hits += 1
+        return valor, linha[1] <= agora
+
+    def get(self, key):
+        """Valor da chave, ou None se não existe, não está mais fresca ou o SQLite falhou."""
+        entrada = self.get_entry(key)
+        return None if entrada is None or entrada[1] else entrada[0]
+
+    def set(self, key, value, ttl=None):
+        """Guarda o valor (fresco por `ttl` segundos) e poda as entradas vencidas/excedentes."""
+        agora = time.time()
+        fresca_ate = agora + (self.ttl if ttl is None else ttl)
+        try:
+            dados = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            conn = self._conexao()
+            conn.execute("INSERT OR REPLACE INTO cache_entries (key, value, fresh_until, expires_at, last_access) "
+                         "VALUES (?, ?, ?, ?, ?)", (key, dados, fresca_ate, fresca_ate + self.stale_ttl, agora))
+            conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (agora,))
+            # LRU: mantém só as `max_entries` acessadas mais recentemente.
+            conn.execute("""
+                DELETE FROM cache_entries WHERE key IN (
+                    SELECT key FROM cache_entries ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+        except Exception as e:
+            logging.warning(f"⚠️ Falha ao gravar no cache '{self.path}' ({key}): {e}")
+
+    def delete(self, key):
+        try:
+            self._conexao().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        except Exception as e:
+            logging.warning(f"⚠️ Falha ao remover do cache '{self.path}' ({key}): {e}")
+
+    def clear(self):
+        try:
+            self._conexao().execute("DELETE FROM cache_entries")
+        except Exception as e:
+            logging.warning(f"⚠️ Falha ao limpar o cache '{self.path}': {e}")
+
+    def stats(self):
+        try:
+            entradas = self._conexao().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        except Exception:
+            entradas = None
+        # hits/misses são DESTE processo; as entradas são as de todos.
+        return {'backend': 'sqlite', 'path': self.path, 'entries': entradas, 'max_entries': self.max_entries,
+                'hits': self._hits, 'misses': self._misses}
+
+
+def create_cache(name, max_entries=1000, ttl=300, stale_ttl=0, backend=None):
+    """
+    Cria o cache `name` no backend configurado (CACHE_BACKEND).
+
+    :param name: Nome do cache (no SQLite, vira o arquivo cache_<name>.sqlite3).
+    :param stale_ttl: Por quantos segundos, após o TTL, a entrada ainda pode ser servida vencida.
+    :param backend: 'memory' ou 'sqlite' (padrão: CACHE_BACKEND).
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == 'sqlite':
+        return SQLiteCache(os.path.join(SHARED_DIR, f"cache_{name}.sqlite3"), max_entries, ttl, stale_ttl)
+    if backend != 'memory':
+        raise ValueError(f"CACHE_BACKEND inválido: {backend!r}. Use 'memory' ou 'sqlite'.")
+    return MemoryCache(max_entries, ttl, stale_ttl)
+
+
+class SingleFlight:
+    """
+    Coalescência de cálculos por chave (dentro do processo).
+
+    A primeira chamada de `do(chave, fn)` roda `fn`; as que chegarem com a
+    mesma chave enquanto ela roda apenas esperam e recebem o mesmo resultado
+    (ou a mesma exceção). Entre workers não há coordenação: no pior caso,
+    um cálculo por worker.
+    """
+
+    def __init__(self, name, workers=2):
+        self.name = name
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._em_andamento = {}  # chave -> Future
+        self._executor = None
+        self._pid = None
+
+    def _verificar_fork(self):
+        """Após um fork, os cálculos "em andamento" herdados não existem no filho (chamado com o lock)."""
+        if self._pid != os.getpid():
+            self._em_andamento, self._executor, self._pid = {}, None, os.getpid()
+
+    def do(self, key, fn):
+        """Roda `fn()` uma única vez por chave entre as chamadas concorrentes."""
+        with self._lock:
+            self._verificar_fork()
+            futuro = self._em_andamento.get(key)
+            lider = futuro is None
+            if lider:
+                futuro = self._em_andamento[key] = Future()
+
+        if not lider:
+            return futuro.result()
+
+        try:
+            resultado = fn()
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                self._em_andamento.pop(key, None)
+
+    def refresh(self, key, fn):
+        """
+        Agenda `fn()` numa thread de fundo (se a chave já não estiver sendo
+        calculada). Erros são apenas logados.
+        """
+        with self._lock:
+            self._verificar_fork()
+            if key in self._em_andamento:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix=f"refresh-{self.name}")
+            executor = self._executor
+        executor.submit(self._atualizar, key, fn)
+
+    def _atualizar(self, key, fn):
+        try:
+            self.do(key, fn)
+        except Exception as e:
+            logging.error(f"❌ Falha ao recalcular '{key}' em segundo plano: {e}")
+
+
+def get_or_build(cache, key, builder, flight):
+    """
+    Lê `key` do cache; se faltar, calcula com `builder()` (uma vez só entre
+    as requisições concorrentes, via `flight`) e guarda.
+
+    Entrada vencida (mas dentro do `stale_ttl`): é devolvida na hora e
+    recalculada em segundo plano (stale-while-revalidate). Por isso o
+    `builder` não pode depender da requisição (request/session).
+    """
+    def construir():
+        # Outra requisição pode ter acabado de guardar o valor.
+        valor = cache.get(key)
+        if valor is None:
+            valor = builder()
+            cache.set(key, valor)
+        return valor
+
+    entrada = cache.get_entry(key)
+    if entrada is not None:
+        valor, vencida = entrada
+        if vencida:
+            flight.refresh(key, construir)
+        return valor
+    return flight.do(key, construir)
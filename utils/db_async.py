@@ -0,0 +1,166 @@
+"""
+Módulo de Acesso Assíncrono ao Banco de Dados (asyncio).
+
+Contraparte assíncrona do `Database` (utils/db.py) para as views
+`async def` do Flask. O contrato é o mesmo:
+
+    linhas = await async_db.execute_query(query, params, fetch='all')
+
+O Flask roda cada view assíncrona num event loop próprio e descartável,
+mas um pool do aiomysql fica preso ao loop em que foi criado. Por isso o
+pool vive num event loop de FUNDO (uma thread por processo), e cada
+consulta é enviada a ele; a view apenas aguarda o resultado. Assim várias
+esperas pelo MySQL podem correr ao mesmo tempo (ex: `asyncio.gather`) sem
+ocupar uma thread do worker por consulta.
+
+Configuração: a mesma DATABASE_URL do pool síncrono (mesmo parser), com
+DB_ASYNC_POOL_SIZE conexões no máximo.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+
+import aiomysql
+
+from utils import query_stats
+from utils.db import parse_database_url, registrar_pool_esgotado, slow_query_log
+from utils.pool import PoolExhaustedError
+
+
+class AsyncDatabase:
+    """
+    Cliente assíncrono do MySQL, com pool próprio (aiomysql).
+
+    O event loop de fundo e o pool são criados no primeiro uso em cada
+    processo (e recriados após um fork, como o pool síncrono).
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._pid = None
+        self._pool = None
+        self._pool_lock = None  # asyncio.Lock, criado dentro do loop de fundo
+        self._lock = threading.Lock()
+        self.pool_size = int(os.environ.get('DB_ASYNC_POOL_SIZE', 10))
+        self.timeout = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+        self.retry_after = int(os.environ.get('DB_POOL_RETRY_AFTER', 2))
+
+    # --- Event loop de fundo e pool --------------------------------------
+
+    def _get_loop(self):
+        """Retorna o event loop de fundo deste processo (criando-o se preciso)."""
+        pid = os.getpid()
+        if self._loop is not None and self._pid == pid:
+            return self._loop
+
+        with self._lock:
+            if self._loop is None or self._pid != pid:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='db-async-loop', daemon=True).start()
+                # Um pool herdado de outro processo é abandonado (os sockets são do pai).
+                self._loop, self._pid, self._pool, self._pool_lock = loop, pid, None, None
+        return self._loop
+
+    async def _get_pool(self):
+        """Cria o pool do aiomysql no primeiro uso (roda no loop de fundo)."""
+        if self._pool is not None:
+            return self._pool
+        if self._pool_lock is None:
+            self._pool_lock = asyncio.Lock()
+
+        async with self._pool_lock:
+            if self._pool is None:
+                connection_url = os.environ.get('DATABASE_URL')
+                if not connection_url:
+                    raise ValueError("A variável de ambiente DATABASE_URL não foi definida.")
+                config = parse_database_url(connection_url)
+                logging.info("🔧 Inicializando pool assíncrono de conexões com MySQL...")
+                self._pool = await aiomysql.create_pool(
+                    host=config['host'], port=config['port'], user=config['user'],
+                    password=config['password'], db=config['database'],
+                    minsize=0, maxsize=self.pool_size,
+                    # Mesma vida máxima das conexões do pool síncrono (-1 desativa).
+                    pool_recycle=int(os.environ.get('DB_POOL_MAX_AGE', 3600)) or -1,
+                    # Autocommit: uma leitura não deixa transação aberta na conexão
+                    # (o aiomysql descarta conexões devolvidas com transação pendente).
+                    autocommit=True, charset='utf8mb4')
+                logging.info("✅ Pool assíncrono MySQL inicializado com sucesso.")
+        return self._pool
+
+    async def _submeter(self, coro):
+        """Executa a corrotina no loop de fundo e aguarda o resultado no loop atual."""
+        loop = self._get_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    # --- API pública -----------------------------------------------------
+
+    async def execute_query(self, query, params=None, fetch=None):
+        """
+        Versão assíncrona do `Database.execute_query` (mesmo contrato).
+
+        :param query: A string da consulta SQL (com placeholders %s).
+        :param params: Uma tupla de parâmetros para a consulta.
+        :param fetch: 'one', 'all' ou None (INSERT/UPDATE/DELETE).
+        :return: Linha, lista de linhas, linhas afetadas ou None em caso de falha.
+        :raises PoolExhaustedError: Nenhuma conexão livre dentro do tempo limite.
+        """
+        inicio = time.perf_counter()
+        try:
+            return await self._submeter(self._executar(query, params, fetch))
+        except PoolExhaustedError as e:
+            registrar_pool_esgotado(e)  # Aqui, e não no loop de fundo: só aqui há requisição
+            raise
+        except Exception as e:
+            logging.error(f"❌ Erro ao executar query assíncrona: {query[:150]}... Erro: {e}")
+            return None
+        finally:
+            segundos = time.perf_counter() - inicio
+            query_stats.record(query, segundos)
+            slow_query_log.record(query, params, segundos)
+
+    async def gather(self, *tasks):
+        """
+        Executa várias consultas ao mesmo tempo e devolve os resultados na
+        ordem das tarefas. Cada tarefa é uma tupla (query, params, fetch).
+        """
+        return await asyncio.gather(*(self.execute_query(*tarefa) for tarefa in tasks))
+
+    def pool_stats(self):
+        """Retrato do pool assíncrono deste processo, ou None se ainda não existe."""
+        if self._pool is None or self._pid != os.getpid():
+            return None
+        return {
+            'maxsize': self._pool.maxsize,
+            'open': self._pool.size,
+            'idle': self._pool.freesize,
+            'in_use': self._pool.size - self._pool.freesize,
+        }
+
+    async def _executar(self, query, params, fetch):
+        """Executa a instrução numa conexão do pool (roda no loop de fundo)."""
+        pool = await self._get_pool()
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolExhaustedError(
+                f"Pool assíncrono esgotado: nenhuma conexão livre em {self.timeout}s.", self.retry_after)
+
+        try:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params or ())
+                if fetch == 'one':
+                    return await cursor.fetchone()
+                elif fetch == 'all':
+                    return await cursor.fetchall()
+                return cursor.rowcount
+        finally:
+            pool.release(conn)
+
+
+# Instância compartilhada, importada pelas rotas assíncronas (ex: routes.py).
+async_db = AsyncDatabase()
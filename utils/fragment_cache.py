@@ -0,0 +1,92 @@
+"""
+Módulo de Cache de Fragmentos de Template (Jinja).
+
+Partes do `base.html` que só dependem do perfil ou do usuário (ex: o menu
+lateral) eram montadas de novo a cada página. A tag `{% cache %}` guarda o
+HTML já renderizado de um trecho no backend de cache configurado
+(utils/cache.py: memória ou SQLite compartilhado entre os workers):
+
+    {% cache ('menu', perfil, request.endpoint, permissions_version()), 3600 %}
+        ... HTML ...
+    {% endcache %}
+
+O primeiro argumento é a chave (qualquer valor com repr estável: texto,
+número, tupla); o segundo, opcional, é o TTL em segundos. A chave final
+inclui ainda:
+- o template, a linha e um checksum do código-fonte: alterar o template
+  (ex: deploy) descarta os fragmentos antigos;
+- o carimbo de versão 'fragmentos' (`invalidate_all`).
+
+A chave precisa conter TUDO de que o trecho depende. Para fragmentos por
+usuário, use `fragment_version(colaborador_id)`; `invalidate_user(colaborador_id)`
+descarta os fragmentos dele em todos os workers (ex: após trocar a foto ou
+editar o usuário). Para fragmentos que dependem do que o perfil pode fazer
+(ex: o menu), use `permissions_version()`: muda junto com a matriz de
+permissões (utils/permissions.py, `flask reload-permissions`).
+"""
+
+import os
+import hashlib
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from utils import versions
+from utils.cache import create_cache
+from utils.permissions import permissions
+
+FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 3600))
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 2000))
+
+fragment_cache = create_cache('fragments', max_entries=FRAGMENT_CACHE_MAX_ENTRIES, ttl=FRAGMENT_CACHE_TTL)
+
+
+def fragment_version(colaborador_id):
+    """Versão dos fragmentos de um usuário (para compor a chave no template)."""
+    return versions.current(f"fragmentos_usuario_{colaborador_id}")
+
+
+def invalidate_user(colaborador_id):
+    """Descarta os fragmentos de um usuário (neste e nos demais processos)."""
+    versions.bump(f"fragmentos_usuario_{colaborador_id}")
+
+
+def invalidate_all():
+    """Descarta todos os fragmentos (neste e nos demais processos)."""
+    versions.bump('fragmentos')
+
+
+class FragmentCacheExtension(Extension):
+    """Extensão Jinja da tag `{% cache chave[, ttl] %}...{% endcache %}`."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.globals['fragment_version'] = fragment_version
+        environment.globals['permissions_version'] = permissions.version
+        self._checksums = {}  # nome do template -> checksum do código-fonte
+
+    def preprocess(self, source, name, filename=None):
+        # Chamado antes de compilar: o checksum entra na chave dos fragmentos.
+        self._checksums[name] = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+        return source
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        chave = parser.parse_expression()
+        ttl = parser.parse_expression() if parser.stream.skip_if('comma') else nodes.Const(None)
+        origem = nodes.Const(f"{parser.name}:{lineno}:{self._checksums.get(parser.name, '')}")
+
+        corpo = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_renderizar', [origem, chave, ttl]), [], [], corpo).set_lineno(lineno)
+
+    def _renderizar(self, origem, chave, ttl, caller):
+        chave_final = f"{origem}|{chave!r}|{versions.current('fragmentos')}"
+        html = fragment_cache.get(chave_final)
+        if html is None:
+            html = str(caller())
+            fragment_cache.set(chave_final, html, ttl)
+        # Já é HTML renderizado (e escapado): não pode ser escapado de novo.
+        return Markup(html)
@@ -0,0 +1,91 @@
+"""
+Módulo da Matriz de Permissões (perfil -> permissões).
+
+As rotas com permissão granular (ex: 'editar_atividade') faziam, a cada GET
+e POST, um JOIN de três tabelas (perfil_permissoes/colaboradores/permissoes)
+só para saber se o perfil tem UMA permissão.
+
+Aqui a matriz inteira é carregada uma vez por processo e a pergunta
+"o perfil X pode Y?" é respondida na memória. Como os dados de referência
+(utils/reference_data.py), a matriz guarda o carimbo de versão
+(utils/versions.py) das tabelas de que depende e expira após
+PERMISSIONS_TTL segundos. Quem alterar as permissões (ex: script SQL) roda
+`flask reload-permissions` para que todos os workers recarreguem.
+
+Uso (ver `permission_required` em app/decorators.py):
+    escopo = user_scopes.get(session['colaborador_id'])  # Perfil atual, não o do login
+    if permissions.can(escopo.perfil, 'excluir_atividade'): ...
+"""
+
+import os
+import time
+import logging
+
+from utils import versions
+from utils.db import db
+
+PERMISSIONS_TTL = float(os.environ.get('PERMISSIONS_TTL', 300))
+
+# Tabelas (carimbos de versão) das quais a matriz depende.
+TABELAS = ('perfil_permissoes', 'permissoes', 'perfis')
+
+QUERY_MATRIZ = """
+    SELECT pr.nome AS perfil, p.nome AS permissao
+    FROM perfil_permissoes pp
+    JOIN perfis pr ON pr.id = pp.perfil_id
+    JOIN permissoes p ON p.id = pp.permissao_id
+"""
+
+
+class PermissionMatrix:
+    """Matriz perfil -> conjunto de permissões, em memória."""
+
+    def __init__(self, ttl=PERMISSIONS_TTL):
+        self.ttl = ttl
+        self._carimbos = None
+        self._expira_em = 0
+        self._matriz = {}  # nome do perfil -> frozenset de nomes de permissão
+
+    def _atual(self):
+        """Retorna a matriz, recarregando-a se mudou ou expirou."""
+        carimbos = self.version()
+        if carimbos == self._carimbos and self._expira_em > time.monotonic():
+            return self._matriz
+
+        linhas = db.execute_query(QUERY_MATRIZ, fetch='all')
+        if linhas is None:
+            # Falha no banco: nega tudo agora e tenta de novo na próxima chamada.
+            logging.error("❌ Não foi possível carregar a matriz de permissões.")
+            return {}
+
+        matriz = {}
+        for linha in linhas:
+            matriz.setdefault(linha['perfil'], set()).add(linha['permissao'])
+        self._matriz = {perfil: frozenset(nomes) for perfil, nomes in matriz.items()}
+        self._carimbos, self._expira_em = carimbos, time.monotonic() + self.ttl
+        return self._matriz
+
+    def can(self, perfil, permissao):
+        """True se o perfil (nome, ex: 'Gestor') possui a permissão (nome)."""
+        if not perfil:
+            return False
+        return permissao in self._atual().get(perfil, ())
+
+    def version(self):
+        """Carimbos de versão da matriz (ex: para compor a chave de um fragmento de template)."""
+        return tuple(versions.current(t) for t in TABELAS)
+
+    def invalidate(self):
+        """Força a releitura da matriz em todos os processos."""
+        versions.bump(*TABELAS)
+        self._carimbos = None
+        logging.info("🔄 Matriz de permissões invalidada.")
+
+    def clear(self):
+        """Esvazia a matriz DESTE processo (sem mexer nos carimbos)."""
+        self._carimbos = None
+        self._matriz = {}
+
+
+# Instância compartilhada (usada pelo decorator `permission_required`).
+permissions = PermissionMatrix()
@@ -0,0 +1,320 @@
+"""
+Módulo do Pool de Conexões Bloqueante e Instrumentado.
+
+O pool nativo do mysql-connector (`MySQLConnectionPool`) levanta `PoolError`
+imediatamente quando todas as conexões estão em uso. Sob o Gunicorn com
+várias threads, isso vira um erro aleatório na rota.
+
+Este pool substitui aquele comportamento por:
+1. Tamanho configurável (variável de ambiente DB_POOL_SIZE).
+2. Fila de espera limitada (DB_POOL_MAX_WAITERS) com tempo máximo de
+   espera por conexão (DB_POOL_TIMEOUT).
+3. Descarte de carga (load shedding): quando a fila está cheia ou o tempo
+   estoura, levanta `PoolExhaustedError`, que a aplicação converte em
+   HTTP 503 com o cabeçalho Retry-After.
+4. Estatísticas ao vivo: conexões em uso, ociosas, esperando, timeouts e
+   um histograma do tempo de espera.
+5. Validação no empréstimo: uma conexão ociosa há mais de
+   DB_POOL_PRE_PING_AFTER segundos recebe um ping antes de ser entregue, e
+   uma conexão com mais de DB_POOL_MAX_AGE segundos de vida é reaberta.
+   Assim o `wait_timeout` do MySQL (ou um failover) não derruba a primeira
+   consulta depois de um período ocioso.
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+
+import mysql.connector
+
+# Limites (em milissegundos) das faixas do histograma de tempo de espera.
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolExhaustedError(ConnectionError):
+    """
+    Levantada quando não há conexão disponível dentro do tempo limite
+    (ou quando a fila de espera já está cheia).
+
+    `retry_after` é a sugestão, em segundos, para o cabeçalho Retry-After.
+    """
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PoolEntry:
+    """
+    Uma conexão física mantida pelo pool, com os dados que vivem junto
+    com ela entre um empréstimo e outro (ex: cache de statements preparados).
+    """
+    __slots__ = ('raw', 'statement_cache', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.statement_cache = None  # Preenchido sob demanda pelo Database
+        self.created_at = self.last_used = time.monotonic()
+
+
+class PooledConnection:
+    """
+    Proxy de uma conexão emprestada pelo pool.
+
+    Repassa tudo para a conexão real, exceto o `close()`, que NÃO fecha
+    a conexão: ele a devolve ao pool (mesma semântica do pool nativo).
+    Atribuições (ex: `conn.autocommit = True`) também vão para a conexão
+    real; só `entry` e os atributos com "_" ficam no proxy.
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self.entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self.entry.raw, name)
+
+    def __setattr__(self, name, value):
+        if name == 'entry' or name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.entry.raw, name, value)
+
+    def close(self):
+        """Devolve a conexão ao pool. Chamadas repetidas são ignoradas."""
+        if self.entry is not None:
+            entry, self.entry = self.entry, None
+            self._pool._release(entry)
+
+    def discard(self):
+        """
+        Fecha de fato a conexão (ex: servidor desconectou) em vez de
+        devolvê-la ao pool. A vaga é liberada para uma conexão nova.
+        """
+        if self.entry is not None:
+            entry, self.entry = self.entry, None
+            self._pool._discard(entry)
+
+
+class ConnectionPool:
+    """
+    Pool de conexões MySQL com espera limitada e métricas.
+
+    As conexões são criadas sob demanda, até `size`. Quando todas estão em
+    uso, as threads esperam (no máximo `timeout` segundos) numa fila de até
+    `max_waiters` posições.
+
+    `pre_ping_after`: segundos de ociosidade a partir dos quais a conexão é
+    testada (ping) antes do empréstimo (None desativa).
+    `max_age`: segundos de vida após os quais a conexão é reaberta (None desativa).
+    """
+
+    def __init__(self, name, size, timeout, max_waiters, retry_after,
+                 pre_ping_after=None, max_age=None, **connect_kwargs):
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        self.retry_after = retry_after
+        self.pre_ping_after = pre_ping_after
+        self.max_age = max_age
+        self._connect_kwargs = connect_kwargs
+
+        self._idle = deque()  # PoolEntry livres
+        self._created = 0  # Conexões abertas (em uso + ociosas)
+        self._waiting = 0  # Threads aguardando na fila
+        self._cond = threading.Condition()
+
+        # Contadores de observabilidade
+        self._checkouts = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._recycled = 0  # Reabertas por idade (max_age)
+        self._ping_failures = 0  # Mortas detectadas pelo pre-ping
+        self._wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def _connect(self):
+        """Abre uma nova conexão física com o MySQL."""
+        return mysql.connector.connect(**self._connect_kwargs)
+
+    def get_connection(self, timeout=None):
+        """
+        Empresta uma conexão do pool, esperando se necessário.
+
+        :param timeout: Espera máxima em segundos (padrão: o do pool).
+        :return: Um `PooledConnection` (chame `close()` para devolver).
+        :raises PoolExhaustedError: Fila cheia ou tempo de espera esgotado.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        entry = None
+        criar_nova = False
+
+        with self._cond:
+            if not self._idle and self._created >= self.size:
+                # [1] Pool cheio: entra na fila (se houver vaga) e espera.
+                if self._waiting >= self.max_waiters:
+                    self._rejected += 1
+                    raise PoolExhaustedError(
+                        f"Pool '{self.name}' esgotado: fila de espera cheia ({self.max_waiters}).",
+                        self.retry_after)
+
+                self._waiting += 1
+                try:
+                    limite = inicio + timeout
+                    while not self._idle and self._created >= self.size:
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            self._timeouts += 1
+                            raise PoolExhaustedError(
+                                f"Pool '{self.name}' esgotado: nenhuma conexão livre em {timeout}s.",
+                                self.retry_after)
+                        self._cond.wait(restante)
+                finally:
+                    self._waiting -= 1
+
+            # [2] Há conexão ociosa ou vaga para abrir uma nova.
+            if self._idle:
+                entry = self._idle.pop()
+            else:
+                self._created += 1
+                criar_nova = True
+
+            self._checkouts += 1
+            self._registrar_espera(time.monotonic() - inicio)
+
+        if criar_nova:
+            # A conexão é aberta FORA do lock para não travar as outras threads.
+            try:
+                entry = PoolEntry(self._connect())
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+        else:
+            entry = self._validar(entry)
+
+        return PooledConnection(self, entry)
+
+    def _validar(self, entry):
+        """
+        Confere uma conexão ociosa antes de emprestá-la (fora do lock).
+
+        Velha demais (max_age) ou sem resposta ao ping: é fechada e, na
+        MESMA vaga, uma conexão nova é aberta no lugar.
+        """
+        agora = time.monotonic()
+        if self.max_age is not None and agora - entry.created_at > self.max_age:
+            motivo = 'idade máxima'
+        elif self.pre_ping_after is not None and agora - entry.last_used > self.pre_ping_after:
+            try:
+                entry.raw.ping(reconnect=False)
+                return entry
+            except Exception:
+                motivo = 'ping sem resposta'
+        else:
+            return entry
+
+        with self._cond:
+            if motivo == 'idade máxima':
+                self._recycled += 1
+            else:
+                self._ping_failures += 1
+        logging.info(f"♻️ Reabrindo conexão do pool '{self.name}' ({motivo}).")
+
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+        try:
+            return PoolEntry(self._connect())
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def warm_up(self, count):
+        """
+        Abre até `count` conexões ociosas de antemão (limitado a `size`).
+
+        :return: Quantas conexões novas foram abertas.
+        """
+        abertas = 0
+        while abertas < count:
+            with self._cond:
+                if self._created >= min(count, self.size):
+                    break
+                self._created += 1
+            try:
+                entry = PoolEntry(self._connect())
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+            abertas += 1
+        return abertas
+
+    def _release(self, entry):
+        """Recebe de volta uma conexão emprestada."""
+        try:
+            # Só desfaz se ficou algo pendente (evita um round trip por devolução).
+            if getattr(entry.raw, 'in_transaction', False):
+                entry.raw.rollback()
+        except Exception as e:
+            logging.warning(f"Conexão descartada ao voltar para o pool '{self.name}': {e}")
+            self._discard(entry)
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def _discard(self, entry):
+        """Fecha de fato uma conexão defeituosa e libera sua vaga no pool."""
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def _registrar_espera(self, segundos):
+        """Contabiliza o tempo de espera no histograma (chamado com o lock)."""
+        ms = segundos * 1000
+        for i, limite in enumerate(WAIT_BUCKETS_MS):
+            if ms <= limite:
+                self._wait_histogram[i] += 1
+                return
+        self._wait_histogram[-1] += 1
+
+    def stats(self):
+        """
+        Retorna um retrato instantâneo do pool (para dimensionamento).
+        """
+        with self._cond:
+            idle = len(self._idle)
+            faixas = [f"<={b}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                'name': self.name,
+                'size': self.size,
+                'open': self._created,
+                'in_use': self._created - idle,
+                'idle': idle,
+                'waiting': self._waiting,
+                'max_waiters': self.max_waiters,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'rejected': self._rejected,
+                'recycled': self._recycled,
+                'ping_failures': self._ping_failures,
+                'wait_histogram': dict(zip(faixas, self._wait_histogram)),
+            }
@@ -0,0 +1,301 @@
+"""
+Módulo de Orçamento de Consultas (Query Budget).
+
+Permite verificar, SEM banco de dados, quantas consultas (e quantas linhas)
+cada rota faz. Uma mudança que transforme as 6 consultas do `historico` em
+60 passa a ser detectada antes do deploy.
+
+Peças:
+1. `RecordingDatabase`: substituto do `Database` que não abre conexões.
+   Cada chamada é registrada e respondida com dados "neutros" (ou com
+   respostas configuradas por trecho de SQL).
+2. `swap_database()`: troca o `db` por um substituto em TODOS os módulos
+   que guardam uma instância do `Database` (ex: `app.routes.db`) ou do
+   `AsyncDatabase` (`async_db`, das rotas `async def`) e restaura as
+   originais depois. Os caches (utils/cache.py) também são trocados por
+   caches vazios em memória: os dados falsos nunca chegam a um cache
+   compartilhado (CACHE_BACKEND=sqlite) de verdade.
+3. `Budget` + `run_budgets()`: executa as rotas pelo test client do Flask
+   e compara com o status HTTP esperado e com o orçamento de consultas e
+   de linhas.
+
+Uso (ver o comando `flask db-budget` em app/commands.py e
+tests/test_query_budget.py, que roda os mesmos orçamentos no pytest):
+    resultados = run_budgets(app, BUDGETS)
+"""
+
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+from utils.cache import MemoryCache, SQLiteCache
+from utils.db import Database, InsertResult, BatchResult
+from utils.db_async import AsyncDatabase
+from utils.permissions import permissions
+from utils.query_stats import fingerprint
+from utils.reference_data import reference_data
+from utils.user_scope import user_scopes
+
+# Uma chamada registrada pelo RecordingDatabase.
+RecordedCall = namedtuple('RecordedCall', ['kind', 'sql', 'params', 'rows'])
+
+
+class Budget(namedtuple('Budget', ['name', 'path', 'method', 'session', 'max_queries', 'max_rows',
+                                   'warmup', 'data', 'status', 'responses'])):
+    """
+    Orçamento de uma rota.
+
+    :param name: Nome exibido no relatório (ex: 'dashboard (cache hit)').
+    :param path: URL requisitada (ex: '/dashboard').
+    :param method: 'GET' ou 'POST'.
+    :param session: Dados de sessão do usuário simulado.
+    :param max_queries: Máximo de consultas permitidas.
+    :param max_rows: Máximo de linhas lidas (None = sem limite).
+    :param warmup: Se True, faz uma requisição antes (não contada), ex: para
+                   medir a rota com o cache já preenchido.
+    :param data: Corpo do formulário (POST).
+    :param status: Status HTTP esperado. Um redirect para o login ou uma
+                   página de erro costuma fazer MENOS consultas: sem conferir
+                   o status, ela passaria no orçamento.
+    :param responses: Respostas do banco só deste cenário (ver `RecordingDatabase`),
+                      ex: {'FROM atividades WHERE id': None} para "não encontrado".
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, path, session, max_queries, max_rows=None, method='GET', warmup=False, data=None,
+                status=200, responses=None):
+        return super().__new__(cls, name, path, method, session, max_queries, max_rows, warmup, data, status,
+                               responses)
+
+
+BudgetResult = namedtuple('BudgetResult', ['budget', 'status_code', 'queries', 'rows', 'calls', 'ok'])
+
+
+class FakeRow(dict):
+    """
+    Linha "neutra": qualquer coluna ausente vale 0.
+
+    Permite que código como `db.execute_query(...)['total']` e templates
+    (`linha.nome`) rodem sem um banco de verdade. Como um dict comum, a
+    linha vazia é falsa.
+    """
+
+    def __missing__(self, key):
+        return 0
+
+
+# Linha devolvida por fetch='one' sem resposta configurada: existe (não desvia
+# para o "não encontrado") e as demais colunas valem 0.
+LINHA_PADRAO = {'id': 1}
+
+
+class RecordingDatabase:
+    """
+    Substituto do `Database` que registra as chamadas e não acessa a rede.
+
+    :param responses: {trecho_do_sql: resposta}. A primeira entrada cujo
+                      trecho aparecer na consulta define o retorno (uma linha
+                      para fetch='one' ou uma lista para fetch='all'); None
+                      simula "nenhuma linha". Linhas dadas como dict viram
+                      `FakeRow` (colunas omitidas valem 0). Sem resposta configurada,
+                      fetch='one' devolve uma linha existente (`LINHA_PADRAO`)
+                      e fetch='all', uma lista vazia.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.calls = []
+
+    # --- Registro -------------------------------------------------------
+
+    def reset(self):
+        """Esquece as chamadas registradas."""
+        self.calls = []
+
+    @property
+    def query_count(self):
+        return len(self.calls)
+
+    @property
+    def row_count(self):
+        return sum(call.rows for call in self.calls)
+
+    def _responder(self, kind, query, params, fetch):
+        configurada, resposta = False, None
+        for trecho, valor in self.responses.items():
+            if trecho in query:
+                configurada, resposta = True, valor
+                break
+
+        if fetch == 'one':
+            resultado = resposta if configurada else FakeRow(LINHA_PADRAO)
+            if isinstance(resultado, list):
+                resultado = resultado[0] if resultado else None
+            if isinstance(resultado, dict):
+                resultado = FakeRow(resultado)
+            linhas = 1 if resultado is not None else 0
+        elif fetch == 'all':
+            resultado = [FakeRow(r) if isinstance(r, dict) else r for r in resposta] if resposta is not None else []
+            linhas = len(resultado)
+        else:
+            resultado = resposta if resposta is not None else 1  # linhas afetadas
+            linhas = 0
+
+        self.calls.append(RecordedCall(kind, fingerprint(query), params, linhas))
+        return resultado
+
+    # --- API do Database ------------------------------------------------
+
+    def execute_query(self, query, params=None, fetch=None, row_format='dict'):
+        return self._responder('query', query, params, fetch)
+
+    def stream(self, query, params=None, batch_size=500, row_format='dict'):
+        # Gerador (como o original), para funcionar com `contextlib.closing`.
+        yield from self._responder('stream', query, params, 'all')
+
+    def insert(self, query, params=None):
+        self._responder('insert', query, params, None)
+        return InsertResult(1, 1)
+
+    def execute_many(self, query, seq_of_params, chunk_size=500):
+        return _responder_lote(self, 'batch', query, seq_of_params, chunk_size)
+
+    def gather(self, *tasks):
+        # Em série: o que importa aqui é a contagem, não o paralelismo.
+        resultados = []
+        for tarefa in tasks:
+            if callable(tarefa):
+                resultados.append(tarefa())
+            else:
+                query, *args = tarefa
+                resultados.append(self.execute_query(query, *args))
+        return resultados
+
+    @contextmanager
+    def transaction(self):
+        yield _RecordingTransaction(self)
+
+    def pool_stats(self):
+        return None
+
+    def release_request_connections(self):
+        pass
+
+    def warm_up(self, connections=None):
+        return 0
+
+    def explain(self, query, params=None):
+        return '{}'
+
+
+class RecordingAsyncDatabase:
+    """Substituto do `AsyncDatabase`: registra no mesmo `RecordingDatabase`."""
+
+    def __init__(self, fake):
+        self._fake = fake
+
+    async def execute_query(self, query, params=None, fetch=None):
+        return self._fake._responder('async', query, params, fetch)
+
+    async def gather(self, *tasks):
+        return [await self.execute_query(*tarefa) for tarefa in tasks]
+
+    def pool_stats(self):
+        return None
+
+
+class _RecordingTransaction:
+    """Transação do RecordingDatabase (mesmas chamadas do `Transaction`)."""
+
+    def __init__(self, fake):
+        self._fake = fake
+
+    def execute(self, query, params=None, fetch=None):
+        return self._fake._responder('tx', query, params, fetch)
+
+    def insert(self, query, params=None):
+        self._fake._responder('tx', query, params, None)
+        return InsertResult(1, 1)
+
+    def execute_many(self, query, seq_of_params, chunk_size=500):
+        return _responder_lote(self._fake, 'tx', query, seq_of_params, chunk_size)
+
+
+def _responder_lote(fake, kind, query, seq_of_params, chunk_size):
+    """Registra um lote como UMA chamada por `chunk_size` linhas (como o driver faz)."""
+    params = list(seq_of_params)
+    for i in range(0, len(params), chunk_size):
+        fake._responder(kind, query, params[i:i + 1], None)
+    return BatchResult(list(range(1, len(params) + 1)), len(params))
+
+
+@contextmanager
+def swap_database(fake):
+    """
+    Troca por `fake` toda instância de `Database` guardada em variáveis
+    globais dos módulos carregados (ex: `utils.db.db` e o `db = Database()`
+    de app/routes.py), toda instância de `AsyncDatabase` por um
+    `RecordingAsyncDatabase` e cada cache por um `MemoryCache` vazio.
+    Restaura os originais ao sair.
+    """
+    fake_async = RecordingAsyncDatabase(fake)
+    trocados = []
+    for modulo in list(sys.modules.values()):
+        variaveis = getattr(modulo, '__dict__', None)
+        if not variaveis:
+            continue
+        for nome, valor in list(variaveis.items()):
+            if isinstance(valor, Database):
+                trocados.append((variaveis, nome, valor))
+                variaveis[nome] = fake
+            elif isinstance(valor, AsyncDatabase):
+                trocados.append((variaveis, nome, valor))
+                variaveis[nome] = fake_async
+            elif isinstance(valor, (MemoryCache, SQLiteCache)):
+                trocados.append((variaveis, nome, valor))
+                variaveis[nome] = MemoryCache(valor.max_entries, valor.ttl, valor.stale_ttl)
+    try:
+        yield fake
+    finally:
+        for variaveis, nome, original in trocados:
+            variaveis[nome] = original
+
+
+def run_budgets(app, budgets, fake=None):
+    """
+    Executa cada rota com o `RecordingDatabase` e compara com o orçamento.
+
+    :return: Lista de `BudgetResult` (ok=False quando o status difere do
+             esperado ou o orçamento estourou).
+    """
+    fake = fake or RecordingDatabase()
+    respostas_base = dict(fake.responses)
+    resultados = []
+
+    with swap_database(fake):
+        for budget in budgets:
+            # Cada rota parte dos caches de referência, de escopo e de permissões
+            # vazios (pior caso), para a contagem não depender da ordem dos orçamentos.
+            reference_data.clear()
+            user_scopes.clear()
+            permissions.clear()
+            # As respostas do cenário têm prioridade sobre as do `fake`: substituem
+            # o mesmo trecho e são testadas antes (a primeira que casa é a usada).
+            cenario = budget.responses or {}
+            fake.responses = {**cenario, **{t: r for t, r in respostas_base.items() if t not in cenario}}
+            cliente = app.test_client()
+            with cliente.session_transaction() as sessao:
+                sessao.update(budget.session)
+
+            if budget.warmup:
+                cliente.open(budget.path, method=budget.method, data=budget.data)
+
+            fake.reset()
+            resposta = cliente.open(budget.path, method=budget.method, data=budget.data)
+
+            ok = resposta.status_code == budget.status and fake.query_count <= budget.max_queries and \
+                (budget.max_rows is None or fake.row_count <= budget.max_rows)
+            resultados.append(BudgetResult(budget, resposta.status_code, fake.query_count,
+                                           fake.row_count, list(fake.calls), ok))
+        fake.responses = respostas_base
+    return resultados
@@ -0,0 +1,116 @@
+"""
+Módulo de Métricas de Banco por Requisição.
+
+Conta, para cada requisição do Flask, quantas consultas foram feitas, o
+tempo total gasto no banco, a consulta mais lenta e quantas vezes cada
+"forma" de consulta (fingerprint) se repetiu. Repetições acima do limite
+indicam o padrão N+1 (uma consulta por item de uma lista).
+
+O `Database` chama `record()` após cada instrução; fora de uma requisição
+(ou com DB_QUERY_STATS=0) a chamada não faz nada.
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+from flask import g, has_app_context
+
+# Liga/desliga a coleta (o custo é um perf_counter e um Counter por consulta).
+ENABLED = os.environ.get('DB_QUERY_STATS', '1') == '1'
+
+# Se '1', grava uma linha de log estruturada (JSON) por requisição.
+LOG_REQUESTS = os.environ.get('DB_QUERY_LOG', '0') == '1'
+
+# A partir de quantas repetições da mesma consulta consideramos N+1.
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('DB_N_PLUS_ONE_THRESHOLD', 3))
+
+_RE_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=512)
+def fingerprint(query):
+    """
+    Normaliza uma consulta para agrupar execuções "iguais".
+
+    Ex: "SELECT * FROM t WHERE id = 7" e "SELECT * FROM t WHERE id = %s"
+    viram "SELECT * FROM t WHERE id = ?". Listas do IN viram "(?+)".
+    """
+    sql = query.replace('%s', '?')
+    sql = _RE_STRING.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(?+)', sql)
+    return _RE_ESPACOS.sub(' ', sql).strip()
+
+
+class RequestQueryStats:
+    """
+    Métricas de banco de UMA requisição.
+
+    Protegido por lock porque o `db.gather` registra consultas de várias
+    threads na mesma requisição.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0  # Segundos
+        self.slowest = 0.0
+        self.slowest_query = None
+        self.fingerprints = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, query, seconds):
+        """Contabiliza uma instrução executada."""
+        chave = fingerprint(query)
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.fingerprints[chave] += 1
+            if seconds > self.slowest:
+                self.slowest = seconds
+                self.slowest_query = chave
+
+    def repeated(self, threshold=None):
+        """Retorna {fingerprint: vezes} das consultas repetidas (suspeitas de N+1)."""
+        threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return {sql: vezes for sql, vezes in self.fingerprints.items() if vezes >= threshold}
+
+    def server_timing(self):
+        """Valor do cabeçalho Server-Timing (visível na aba Network do navegador)."""
+        return (f'db;dur={self.total * 1000:.1f};desc="{self.count} queries", '
+                f'db-slowest;dur={self.slowest * 1000:.1f}')
+
+    def as_dict(self):
+        """Resumo serializável (para a linha de log estruturada)."""
+        return {
+            'queries': self.count,
+            'db_ms': round(self.total * 1000, 1),
+            'slowest_ms': round(self.slowest * 1000, 1),
+            'slowest_query': self.slowest_query[:200] if self.slowest_query else None,
+            'n_plus_one': self.repeated(),
+        }
+
+
+def start_request():
+    """Inicia a coleta para a requisição atual (chamado no before_request)."""
+    if ENABLED:
+        g.db_query_stats = RequestQueryStats()
+
+
+def current():
+    """Retorna as métricas da requisição atual, ou None."""
+    if not has_app_context():
+        return None
+    return g.get('db_query_stats')
+
+
+def record(query, seconds):
+    """Registra uma instrução na requisição atual (se houver uma)."""
+    stats = current()
+    if stats is not None:
+        stats.record(query, seconds)
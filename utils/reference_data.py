@@ -0,0 +1,108 @@
+"""
+Módulo de Cache de Dados de Referência (tabelas de consulta).
+
+Tipos de atendimento, setores, perfis, origens, grupos/tipos de cliente, a
+lista de colaboradores (id/nome) e as opções do ENUM 'cargo' mudam pouco,
+mas eram lidos do banco em quase toda página (só o `historico` fazia três
+dessas consultas antes da principal).
+
+Cada lista é carregada uma vez por processo e guardada com o carimbo de
+versão (utils/versions.py) das tabelas de que depende. As rotas que alteram
+essas tabelas chamam `reference_data.invalidate('setores', ...)`, o que
+invalida o cache em TODOS os workers. Um TTL (REFERENCE_DATA_TTL, em
+segundos) cobre alterações feitas fora da aplicação.
+
+Uso:
+    setores = reference_data.get('setores')
+    tipos = reference_data.cliente_tipos(grupo_id)
+"""
+
+import os
+import re
+import time
+import logging
+
+from utils import versions
+from utils.db import db
+
+REFERENCE_DATA_TTL = float(os.environ.get('REFERENCE_DATA_TTL', 300))
+
+
+def _opcoes_enum(linha):
+    """Converte a linha do SHOW COLUMNS de um ENUM em [{'cargo': 'Op1'}, ...]."""
+    tipo = str((linha or {}).get('Type') or '')  # Ex: "enum('Op1','Op2')"
+    return [{'cargo': opcao} for opcao in re.findall(r"'(.*?)'", tipo)]
+
+
+# nome -> (SQL, fetch, tabelas das quais depende, conversão do resultado)
+CONSULTAS = {
+    'tipos_atendimento': ("SELECT id, nome FROM tipos_atendimento ORDER BY nome", 'all',
+                          ('tipos_atendimento',), None),
+    'setores': ("SELECT id, nome_setor FROM setores ORDER BY nome_setor", 'all', ('setores',), None),
+    'perfis': ("SELECT id, nome FROM perfis ORDER BY nome", 'all', ('perfis',), None),
+    'origens': ("SELECT id, nome FROM origens ORDER BY nome", 'all', ('origens',), None),
+    'cliente_grupos': ("SELECT id, nome FROM cliente_grupos ORDER BY nome", 'all', ('cliente_grupos',), None),
+    'cliente_tipos': ("SELECT id, nome, grupo_id FROM cliente_tipos ORDER BY nome", 'all',
+                      ('cliente_tipos', 'cliente_grupos'), None),
+    'colaboradores': ("SELECT id, nome FROM colaboradores ORDER BY nome", 'all', ('colaboradores',), None),
+    # Só muda com ALTER TABLE: depende apenas do TTL (ou de um bump manual).
+    'cargos': ("SHOW COLUMNS FROM colaboradores LIKE 'cargo'", 'one', ('colaboradores_schema',), _opcoes_enum),
+}
+
+
+class ReferenceDataCache:
+    """
+    Cache, por processo, das listas de `CONSULTAS`.
+
+    As listas devolvidas são cópias: a rota pode alterá-las à vontade.
+    """
+
+    def __init__(self, ttl=REFERENCE_DATA_TTL):
+        self.ttl = ttl
+        self._entries = {}  # nome -> (carimbos, expira_em, linhas)
+
+    def get(self, nome):
+        """Lista `nome` (ver CONSULTAS), do cache ou do banco."""
+        query, fetch, tabelas, converter = CONSULTAS[nome]
+        carimbos = tuple(versions.current(t) for t in tabelas)
+
+        entrada = self._entries.get(nome)
+        if entrada is not None and entrada[0] == carimbos and entrada[1] > time.monotonic():
+            return [dict(linha) for linha in entrada[2]]
+
+        # O carimbo foi lido ANTES da consulta: um bump durante a leitura
+        # deixa a entrada já vencida, e a próxima chamada recarrega.
+        resultado = db.execute_query(query, fetch=fetch)
+        if resultado is None:
+            # Falha no banco: não guarda (tenta de novo na próxima chamada).
+            return []
+        linhas = converter(resultado) if converter else list(resultado)
+        self._entries[nome] = (carimbos, time.monotonic() + self.ttl, linhas)
+        return [dict(linha) for linha in linhas]
+
+    def cliente_tipos(self, grupo_id):
+        """Tipos de cliente de um grupo (filtrados da lista em cache)."""
+        try:
+            grupo_id = int(grupo_id)
+        except (TypeError, ValueError):
+            return []
+        return [{'id': t['id'], 'nome': t['nome']} for t in self.get('cliente_tipos') if t['grupo_id'] == grupo_id]
+
+    def invalidate(self, *tabelas):
+        """
+        Chamado após alterar `tabelas`: invalida as listas que dependem
+        delas neste processo e (via carimbo de versão) nos demais.
+        """
+        versions.bump(*tabelas)
+        for nome, (_, _, dependencias, _) in CONSULTAS.items():
+            if set(dependencias) & set(tabelas):
+                self._entries.pop(nome, None)
+        logging.info(f"🔄 Dados de referência invalidados: {', '.join(tabelas)}")
+
+    def clear(self):
+        """Esvazia o cache DESTE processo (sem mexer nos carimbos)."""
+        self._entries.clear()
+
+
+# Instância compartilhada pelas rotas.
+reference_data = ReferenceDataCache()
@@ -0,0 +1,107 @@
+"""
+Módulo de Formatos Compactos de Linhas.
+
+Por padrão o `Database.execute_query` devolve cada linha como um dicionário
+novo, repetindo as chaves (nomes das colunas) em todas as linhas. Para
+resultados grandes que só serão agregados, isso custa mais do que o próprio
+processamento. Este módulo oferece representações mais enxutas:
+
+- 'tuple':   `Rows`, uma lista de tuplas com UM índice de colunas compartilhado.
+- 'record':  tuplas nomeadas (acesso por atributo: `linha.nome`, ou por posição).
+- 'columns': `Columns`, um dicionário coluna -> lista de valores.
+- 'dict':    o formato tradicional (padrão).
+"""
+
+import keyword
+from operator import itemgetter
+
+ROW_FORMATS = ('dict', 'tuple', 'record', 'columns')
+
+# Classes de registro já criadas, por tupla de nomes de colunas (evita recriar).
+_record_classes = {}
+
+
+class Rows(list):
+    """
+    Lista de tuplas com o índice das colunas compartilhado por todas as linhas.
+
+    Ex: `linhas.index['total']` devolve a posição da coluna 'total'.
+    """
+
+    def __init__(self, rows, columns):
+        super().__init__(rows)
+        self.columns = tuple(columns)
+        self.index = {nome: i for i, nome in enumerate(self.columns)}
+
+
+class Columns(dict):
+    """
+    Resultado em formato de colunas: {'coluna': [valor_linha1, valor_linha2, ...]}.
+
+    `len(resultado)` devolve o número de LINHAS (não de colunas).
+    """
+
+    def __init__(self, rows, columns):
+        super().__init__((nome, [linha[i] for linha in rows]) for i, nome in enumerate(columns))
+        self.row_count = len(rows)
+
+    def __len__(self):
+        return self.row_count
+
+    def __bool__(self):
+        return self.row_count > 0
+
+
+def _nome_atributo(nome, posicao):
+    """Garante um nome de atributo válido (ex: 'COUNT(*)' vira '_2')."""
+    if not nome.isidentifier() or keyword.iskeyword(nome) or nome.startswith('__'):
+        return f"_{posicao}"
+    return nome
+
+
+def record_class(columns):
+    """
+    Retorna (criando na primeira vez) uma classe de registro para o conjunto de
+    colunas informado.
+
+    O registro é uma subclasse de `tuple` (como um namedtuple): os atributos são
+    `itemgetter`s sobre as posições, e cada linha do cursor vira registro com um
+    único `tuple.__new__`, sem um `setattr` por coluna.
+    """
+    columns = tuple(columns)
+    cls = _record_classes.get(columns)
+    if cls is None:
+        campos = tuple(_nome_atributo(nome, i) for i, nome in enumerate(columns))
+
+        def __repr__(self):
+            valores = ', '.join(f"{campo}={valor!r}" for campo, valor in zip(campos, self))
+            return f"Record({valores})"
+
+        atributos = {campo: property(itemgetter(i)) for i, campo in enumerate(campos)}
+        atributos.update({
+            '__slots__': (),
+            '__repr__': __repr__,
+            '_fields': campos,
+        })
+        cls = type('Record', (tuple,), atributos)
+        _record_classes[columns] = cls
+    return cls
+
+
+def format_rows(rows, columns, row_format):
+    """
+    Converte as linhas (tuplas) vindas do cursor para o formato pedido.
+
+    :param rows: Lista de tuplas.
+    :param columns: Nomes das colunas, na ordem do cursor.
+    :param row_format: 'tuple', 'record' ou 'columns'.
+    """
+    if row_format == 'tuple':
+        return Rows(rows, columns)
+    if row_format == 'record':
+        cls = record_class(columns)
+        novo = tuple.__new__
+        return [novo(cls, linha) for linha in rows]
+    if row_format == 'columns':
+        return Columns(rows, columns)
+    raise ValueError(f"row_format inválido: {row_format!r}. Use um de {ROW_FORMATS}.")
@@ -0,0 +1,138 @@
+"""
+Módulo de Tarefas Periódicas (agendador em thread de fundo).
+
+Uma `PeriodicJob` roda uma função a cada `interval` segundos, mas só dentro
+de uma janela diária (ex: das 07:00 às 19:00). Fora dela, dorme até o
+próximo início: assim a primeira execução do dia acontece ANTES do
+expediente.
+
+A thread é criada no primeiro `ensure_started()` de cada processo (como o
+event loop de utils/db_async.py): um worker do Gunicorn criado por fork
+inicia a sua própria. Com N workers, só um deles (o "líder") executa a
+tarefa: com `lock_path`, cada rodada só acontece no processo que detém a
+trava exclusiva (flock) desse arquivo. Os demais tentam de novo a cada
+intervalo; se o líder morrer (ou for reciclado pelo Gunicorn), o sistema
+operacional libera a trava e outro worker assume. Sem `fcntl` (Windows,
+onde não há workers criados por fork), o próprio processo é o líder.
+
+Uso:
+    job = PeriodicJob('aquecimento', aquecer, interval=3600, start='07:00', end='19:00',
+                      lock_path='/tmp/app_shared/locks/aquecimento.lock')
+    job.ensure_started()
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _hora(texto):
+    """'HH:MM' -> datetime.time."""
+    return datetime.strptime(texto, '%H:%M').time()
+
+
+def next_run(agora, start, end):
+    """
+    Próximo horário, a partir de `agora`, que cai dentro da janela diária.
+
+    :param start: Início da janela (datetime.time).
+    :param end: Fim da janela (datetime.time); se for igual ao início, a janela é o dia todo.
+    :return: Um datetime (>= agora).
+    """
+    inicio_hoje = datetime.combine(agora.date(), start)
+    fim_hoje = datetime.combine(agora.date(), end)
+    if start == end:
+        return agora
+    if start < end:
+        if agora < inicio_hoje:
+            return inicio_hoje
+        if agora <= fim_hoje:
+            return agora
+        return inicio_hoje + timedelta(days=1)
+    # Janela que vira a noite (ex: 22:00 às 06:00).
+    if agora >= inicio_hoje or agora <= fim_hoje:
+        return agora
+    return inicio_hoje
+
+
+class PeriodicJob:
+    """
+    Executa `fn()` periodicamente numa thread daemon (uma por processo).
+
+    :param lock_path: Arquivo de trava compartilhado pelos workers (ver
+                      `is_leader`). None = roda em todo processo.
+    """
+
+    def __init__(self, name, fn, interval, start='00:00', end='00:00', lock_path=None):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.start = _hora(start)
+        self.end = _hora(end)
+        self.lock_path = lock_path
+        self.last_result = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._lock_file = None  # Aberto (e travado) enquanto este processo for o líder
+
+    def ensure_started(self):
+        """Inicia a thread deste processo, se ainda não estiver rodando."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._loop, name=f"job-{self.name}", daemon=True).start()
+                self._pid = os.getpid()
+                logging.info(f"⏰ Tarefa '{self.name}' agendada (a cada {self.interval}s, "
+                             f"janela {self.start:%H:%M}-{self.end:%H:%M}).")
+
+    def is_leader(self):
+        """
+        True se este processo deve executar a tarefa.
+
+        A trava é tomada sem esperar (LOCK_NB) e mantida enquanto o processo
+        viver: o arquivo fica aberto em `_lock_file`.
+        """
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is not None:
+            return True
+
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        arquivo = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo.close()
+            return False
+
+        self._lock_file = arquivo
+        logging.info(f"👑 Processo {os.getpid()} assumiu a tarefa '{self.name}'.")
+        return True
+
+    def run_once(self):
+        """Executa a tarefa agora; erros são logados (a thread não morre)."""
+        try:
+            self.last_result = self.fn()
+        except Exception as e:
+            logging.error(f"❌ Falha na tarefa '{self.name}': {e}")
+        return self.last_result
+
+    def _loop(self):
+        while True:
+            agora = datetime.now()
+            espera = (next_run(agora, self.start, self.end) - agora).total_seconds()
+            if espera > 0:
+                time.sleep(espera)
+            inicio = time.monotonic()
+            if self.is_leader():
+                self.run_once()
+            # O intervalo conta a partir do início da execução.
+            time.sleep(max(0.0, self.interval - (time.monotonic() - inicio)))
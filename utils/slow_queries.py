@@ -0,0 +1,156 @@
+"""
+Módulo de Captura de Consultas Lentas (Slow Query Log).
+
+Toda instrução que passar de DB_SLOW_QUERY_MS milissegundos é guardada num
+buffer circular (as DB_SLOW_QUERY_BUFFER mais recentes), com o fingerprint,
+os parâmetros, a duração e a rota de origem.
+
+Em seguida, numa thread de fundo (sem atrasar a requisição), roda-se um
+`EXPLAIN FORMAT=JSON` da consulta e o plano é analisado para marcar:
+- 'full_scan':  leitura da tabela inteira (access_type = ALL);
+- 'full_index_scan': leitura do índice inteiro (access_type = index);
+- 'filesort':   ordenação sem índice (using_filesort);
+- 'temporary':  tabela temporária (using_temporary_table).
+
+O EXPLAIN é feito uma única vez por fingerprint (o plano fica em cache).
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import has_request_context, request
+
+from utils.query_stats import fingerprint
+
+# Limite (ms) a partir do qual a consulta é considerada lenta. 0 desativa.
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 500))
+
+# Quantas consultas lentas ficam guardadas (as mais antigas saem primeiro).
+SLOW_QUERY_BUFFER = int(os.environ.get('DB_SLOW_QUERY_BUFFER', 200))
+
+# Quantos planos (por fingerprint) ficam em cache.
+_PLAN_CACHE_SIZE = 256
+
+# Só estes comandos aceitam EXPLAIN (e o EXPLAIN não os executa de fato).
+_RE_EXPLICAVEL = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+def analyze_plan(plan):
+    """
+    Percorre o plano do `EXPLAIN FORMAT=JSON` e devolve a lista de alertas.
+
+    Ex: ['full_scan:atividades', 'filesort']
+    """
+    flags = []
+
+    def visitar(no):
+        if isinstance(no, dict):
+            tipo_acesso = no.get('access_type')
+            tabela = no.get('table_name', '?')
+            if tipo_acesso == 'ALL':
+                flags.append(f"full_scan:{tabela}")
+            elif tipo_acesso == 'index':
+                flags.append(f"full_index_scan:{tabela}")
+            if no.get('using_filesort'):
+                flags.append('filesort')
+            if no.get('using_temporary_table'):
+                flags.append('temporary')
+            for valor in no.values():
+                visitar(valor)
+        elif isinstance(no, list):
+            for item in no:
+                visitar(item)
+
+    visitar(plan)
+    # Remove repetidos mantendo a ordem.
+    return list(dict.fromkeys(flags))
+
+
+class SlowQueryLog:
+    """
+    Buffer circular de consultas lentas com EXPLAIN assíncrono.
+
+    :param explain: Função (query, params) -> texto JSON do EXPLAIN.
+                    Roda numa thread de fundo.
+    """
+
+    def __init__(self, explain, threshold_ms=SLOW_QUERY_MS, capacity=SLOW_QUERY_BUFFER):
+        self.threshold_ms = threshold_ms
+        self._explain = explain
+        self._entries = deque(maxlen=capacity)
+        self._plans = OrderedDict()  # fingerprint -> (plano, flags, erro)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    def record(self, query, params, seconds):
+        """Registra a instrução se ela passou do limite (chamado pelo Database)."""
+        duracao_ms = seconds * 1000
+        if self.threshold_ms <= 0 or duracao_ms < self.threshold_ms:
+            return
+
+        chave = fingerprint(query)
+        entrada = {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': round(duracao_ms, 1),
+            'fingerprint': chave,
+            'sql': query.strip(),
+            'params': [repr(p)[:100] for p in (params or ())],
+            'endpoint': request.endpoint if has_request_context() else None,
+            'plan': None,
+            'flags': [],
+            'explain_error': None,
+        }
+
+        with self._lock:
+            plano_em_cache = self._plans.get(chave)
+            if plano_em_cache is not None:
+                entrada['plan'], entrada['flags'], entrada['explain_error'] = plano_em_cache
+            self._entries.append(entrada)
+
+        logging.warning(f"🐢 Consulta lenta ({entrada['duration_ms']} ms) em {entrada['endpoint']}: {chave[:150]}")
+
+        if plano_em_cache is None and _RE_EXPLICAVEL.match(query):
+            self._get_executor().submit(self._explicar, entrada, query, params)
+
+    def _explicar(self, entrada, query, params):
+        """Roda o EXPLAIN (thread de fundo) e anota o plano na entrada."""
+        plano, flags, erro = None, [], None
+        try:
+            plano = json.loads(self._explain(query, params))
+            flags = analyze_plan(plano)
+        except Exception as e:
+            erro = str(e)
+            logging.warning(f"Não foi possível rodar o EXPLAIN da consulta lenta: {e}")
+
+        with self._lock:
+            entrada['plan'], entrada['flags'], entrada['explain_error'] = plano, flags, erro
+            self._plans[entrada['fingerprint']] = (plano, flags, erro)
+            if len(self._plans) > _PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+
+    def _get_executor(self):
+        """Uma única thread de fundo por processo (recriada após fork)."""
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+                self._executor_pid = pid
+            return self._executor
+
+    def entries(self):
+        """Cópia das consultas lentas guardadas (da mais recente para a mais antiga)."""
+        with self._lock:
+            return [dict(entrada) for entrada in reversed(self._entries)]
+
+    def clear(self):
+        """Esvazia o buffer e o cache de planos."""
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
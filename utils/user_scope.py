@@ -0,0 +1,130 @@
+"""
+Módulo do Escopo do Usuário (identidade + setores visíveis).
+
+Várias rotas descobriam, a cada requisição, quais setores um Gestor
+gerencia (`SELECT id FROM setores WHERE gestor_id = %s`), e a página de
+perfil juntava quatro tabelas só para montar o cartão do próprio usuário.
+
+O `UserScope` reúne esses dados num só lugar: é resolvido no primeiro uso
+(duas consultas, em paralelo) e guardado por processo com os carimbos de
+versão (utils/versions.py) de:
+- 'setores' e 'colaboradores': já incrementados pelas rotas de gestão
+  (criar/editar setor, criar/editar usuário) via `reference_data.invalidate`;
+- 'usuario_<id>': incrementado por `user_scopes.invalidate(id)` quando só
+  aquele usuário muda (ex: upload da foto de perfil).
+Assim um gestor nunca enxerga um escopo antigo, em nenhum worker.
+
+Uso:
+    escopo = user_scopes.get(session['colaborador_id'])
+    ids = escopo.ids_setores_gerenciados
+"""
+
+import os
+import time
+from collections import namedtuple
+
+from utils import versions
+from utils.db import db
+
+USER_SCOPE_TTL = float(os.environ.get('USER_SCOPE_TTL', 300))
+
+QUERY_PERFIL = """
+    SELECT
+        c.id, c.nome, c.email, c.usuario, c.foto_perfil, c.status, c.setor_id,
+        p.nome AS nome_perfil,
+        s.nome_setor,
+        gestor.nome AS nome_gestor
+    FROM colaboradores AS c
+    LEFT JOIN setores AS s ON c.setor_id = s.id  -- Colaborador sem setor (ex: gestor recém-criado) também tem escopo
+    JOIN perfis AS p ON c.perfil_id = p.id
+    LEFT JOIN colaboradores AS gestor ON s.gestor_id = gestor.id
+    WHERE c.id = %s
+"""
+
+QUERY_SETORES_GERENCIADOS = "SELECT id, nome_setor FROM setores WHERE gestor_id = %s ORDER BY id"
+
+
+class UserScope(namedtuple('UserScope', ['colaborador_id', 'perfil', 'status', 'setor_id', 'nome_setor',
+                                         'foto_perfil', 'setores_gerenciados', 'cartao'])):
+    """
+    Escopo de um colaborador.
+
+    :param perfil: Nome do perfil (ex: 'Gestor').
+    :param status: 'Ativo' ou 'Inativo' (o `permission_required` nega tudo ao inativo).
+    :param setor_id: Setor do colaborador (None se ele não tiver setor);
+                     `nome_setor` também fica None nesse caso.
+    :param setores_gerenciados: Tupla de {'id', 'nome_setor'} dos setores em
+                                que ele é o gestor (ordenados por id).
+    :param cartao: Linha completa do perfil (nome, e-mail, gestor do setor...),
+                   usada pela página de perfil.
+    """
+    __slots__ = ()
+
+    @property
+    def ids_setores_gerenciados(self):
+        return [s['id'] for s in self.setores_gerenciados]
+
+    @property
+    def setores_visiveis(self):
+        """Setores gerenciados mais o próprio setor do colaborador (se tiver)."""
+        visiveis = set(self.ids_setores_gerenciados)
+        if self.setor_id is not None:
+            visiveis.add(self.setor_id)
+        return visiveis
+
+
+class UserScopeCache:
+    """Cache, por processo, do `UserScope` de cada colaborador."""
+
+    def __init__(self, ttl=USER_SCOPE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # colaborador_id -> (carimbos, expira_em, UserScope)
+
+    @staticmethod
+    def _carimbos(colaborador_id):
+        return (versions.current('setores'), versions.current('colaboradores'),
+                versions.current(f"usuario_{colaborador_id}"))
+
+    def get(self, colaborador_id):
+        """
+        Escopo do colaborador (do cache ou do banco).
+
+        :return: Um `UserScope`, ou None se o colaborador não existe (ou o banco falhou).
+        """
+        carimbos = self._carimbos(colaborador_id)
+        entrada = self._entries.get(colaborador_id)
+        if entrada is not None and entrada[0] == carimbos and entrada[1] > time.monotonic():
+            return entrada[2]
+
+        cartao, gerenciados = db.gather(
+            (QUERY_PERFIL, (colaborador_id,), 'one'),
+            (QUERY_SETORES_GERENCIADOS, (colaborador_id,), 'all'),
+        )
+        if not cartao or gerenciados is None:
+            return None
+
+        escopo = UserScope(
+            colaborador_id=colaborador_id,
+            perfil=cartao['nome_perfil'],
+            status=cartao['status'],
+            setor_id=cartao['setor_id'],
+            nome_setor=cartao['nome_setor'],
+            foto_perfil=cartao['foto_perfil'],
+            setores_gerenciados=tuple(dict(s) for s in gerenciados),
+            cartao=dict(cartao),
+        )
+        self._entries[colaborador_id] = (carimbos, time.monotonic() + self.ttl, escopo)
+        return escopo
+
+    def invalidate(self, colaborador_id):
+        """Descarta o escopo de um colaborador (neste e nos demais processos)."""
+        versions.bump(f"usuario_{colaborador_id}")
+        self._entries.pop(colaborador_id, None)
+
+    def clear(self):
+        """Esvazia o cache DESTE processo (sem mexer nos carimbos)."""
+        self._entries.clear()
+
+
+# Instância compartilhada pelas rotas.
+user_scopes = UserScopeCache()
@@ -0,0 +1,54 @@
+"""
+Módulo de Carimbos de Versão Compartilhados (entre processos).
+
+Cada worker do Gunicorn guarda seus caches na própria memória. Para que uma
+alteração feita num worker invalide o cache dos OUTROS, cada assunto (ex:
+'setores') tem um arquivo de versão num diretório compartilhado
+(APP_SHARED_DIR). Quem altera o dado chama `bump('setores')`; quem guarda
+um cache anota `current('setores')` e, ao ler, compara com o atual.
+
+Conferir a versão custa um `os.stat` (sem ida ao banco). O diretório precisa
+ser o mesmo para todos os workers (o padrão fica no diretório temporário
+da máquina, o que basta para um servidor só).
+"""
+
+import os
+import logging
+import tempfile
+
+SHARED_DIR = os.environ.get('APP_SHARED_DIR') or os.path.join(tempfile.gettempdir(), 'app_shared')
+
+_VERSIONS_DIR = os.path.join(SHARED_DIR, 'versions')
+
+
+def _caminho(nome):
+    return os.path.join(_VERSIONS_DIR, f"{nome}.version")
+
+
+def current(nome):
+    """
+    Versão atual de `nome`. Muda a cada `bump(nome)`, em qualquer processo.
+
+    :return: Um valor comparável por igualdade (0 se nunca houve bump).
+    """
+    try:
+        st = os.stat(_caminho(nome))
+    except OSError:
+        return 0
+    # O arquivo é substituído (novo inode) a cada bump; o mtime desempata.
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def bump(*nomes):
+    """Marca `nomes` como alterados (invalida os caches de todos os processos)."""
+    for nome in nomes:
+        caminho = _caminho(nome)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(_VERSIONS_DIR, exist_ok=True)
+            with open(temporario, 'w') as f:
+                f.write(str(os.getpid()))
+            # Troca atômica: quem lê vê a versão antiga ou a nova, nunca um arquivo pela metade.
+            os.replace(temporario, caminho)
+        except OSError as e:
+            logging.warning(f"⚠️ Não foi possível atualizar a versão de '{nome}' em {_VERSIONS_DIR}: {e}")